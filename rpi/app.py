@@ -1,30 +1,48 @@
 #!/usr/bin/env python3
+# Only what the SOS button needs is imported up here; the web stack follows BOOT
 import os
+import sys
 import time
 import threading
 import platform
 import subprocess
 import socket
-from datetime import datetime
-from flask import Flask, Response, jsonify, send_from_directory, request, abort
-from flask_cors import CORS
-from picamzero import Camera
+from datetime import datetime, timezone
 from gpiozero import Button, LED
-import geocoder
 from dotenv import load_dotenv
-import requests
+from urllib.parse import urlsplit, parse_qs
 from collections import deque
-import qrcode
+from contextlib import contextmanager
 from io import BytesIO
 import json
+import gzip
+import re
+import random
+import sqlite3
+import hashlib
+import queue
+import heapq
+import bisect
+import shutil
+import struct
+import base64
+import math
+
+MODULE_LOADED_AT = time.monotonic()
 
 # Check if running on Raspberry Pi
 IS_RPI = platform.machine() in ['armv7l', 'aarch64']
-if IS_RPI:
-    from picamzero import Camera
-else:
+if not IS_RPI:
     print("⚠️ Running in demo mode (no camera)")
-    Camera = None
+    if not os.getenv("GPIOZERO_PIN_FACTORY"):
+        # No GPIO header here: simulated pins keep Button/LED working
+        from gpiozero import Device
+        from gpiozero.pins.mock import MockFactory
+        Device.pin_factory = MockFactory()
+
+# Imported by load_media_modules() once the device is up (None if not installed)
+cv2 = None  # scales and encodes /camera frames
+np = None  # motion detection on preview frames
 
 # ---------------- CONFIG ---------------- #
 
@@ -33,6 +51,7 @@ load_dotenv()
 DEVICE_ID = os.getenv("DEVICE_ID", "raspi")
 HELP_PIN = int(os.getenv("HELP_BUTTON_PIN", "17"))
 LED_PIN = int(os.getenv("LED_PIN", "27"))
+HELP_DEBOUNCE = float(os.getenv("HELP_DEBOUNCE_MS", "50")) / 1000
 PORT = int(os.getenv("STREAM_PORT", "8000"))
 
 # Sync configuration
@@ -40,18 +59,105 @@ SYNC_BASE_URL = os.getenv("SYNC_BASE_URL", "https://your-vercel-app.vercel.app")
 USER_ID = os.getenv("USER_ID")  # UUID of the user this device belongs to
 DEMO_MODE = os.getenv("DEMO_MODE", "false").lower() == "true"
 
-# Upload queue for retry
-upload_queue = deque()
-
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-VIDEOS_DIR = os.path.join(BASE_DIR, "videos")
-PREVIEW_FILE = os.path.join(BASE_DIR, "preview.jpg")
+VIDEOS_DIR = os.getenv("VIDEOS_DIR", os.path.join(BASE_DIR, "videos"))
+
+# Preview capture cadence for the live /camera stream
+PREVIEW_INTERVAL = float(os.getenv("PREVIEW_INTERVAL", "0.15"))
+# Requested /camera width and JPEG quality snap to these tiers; each tier is encoded once per frame
+STREAM_WIDTHS = sorted(int(w) for w in os.getenv("STREAM_WIDTHS", "320,640,1280").split(","))
+STREAM_QUALITIES = sorted(int(q) for q in os.getenv("STREAM_QUALITIES", "40,60,80").split(","))
+
+# Motion detection on preview frames: "off", "tag" (log an incident) or "record" (start a routine recording)
+MOTION_DETECT = os.getenv("MOTION_DETECT", "off").lower()
+MOTION_WIDTH = int(os.getenv("MOTION_WIDTH", "160"))  # frames are subsampled to about this width
+MOTION_PIXEL_THRESHOLD = float(os.getenv("MOTION_PIXEL_THRESHOLD", "25"))  # grey levels a cell must change by
+MOTION_AREA = float(os.getenv("MOTION_AREA", "0.02"))  # fraction of cells that must change
+MOTION_FRAMES = int(os.getenv("MOTION_FRAMES", "2"))  # consecutive analysed frames over MOTION_AREA
+MOTION_FRAME_SKIP = int(os.getenv("MOTION_FRAME_SKIP", "1"))  # frames skipped after each analysed one
+MOTION_CPU_BUDGET = float(os.getenv("MOTION_CPU_BUDGET", "0.05"))  # share of one core the detector may use
+MOTION_COOLDOWN = float(os.getenv("MOTION_COOLDOWN", "60"))
+MOTION_LEARNING_RATE = float(os.getenv("MOTION_LEARNING_RATE", "0.05"))
+
+# Pre-event buffer: encoded video kept in RAM so SOS clips start before the press
+PREBUFFER_SECONDS = float(os.getenv("PREBUFFER_SECONDS", "15"))  # 0 disables
+PREBUFFER_MAX_BYTES = int(float(os.getenv("PREBUFFER_MAX_MB", "16")) * 1024 * 1024)
+VIDEO_BITRATE = int(os.getenv("VIDEO_BITRATE", "2000000"))
+# H.264 profile for recordings; baseline/main/high all play in browsers, so the cloud stores them as-is
+VIDEO_PROFILE = os.getenv("VIDEO_PROFILE", "high")
+
+# Files appearing/disappearing in VIDEOS_DIR are picked up by the catalog within this many seconds
+CATALOG_SCAN_INTERVAL = float(os.getenv("CATALOG_SCAN_INTERVAL", "30"))
+
+# Poster frames and sprite strips rendered after each recording, at idle CPU/IO priority
+THUMBNAILS_ENABLED = os.getenv("THUMBNAILS", "true").lower() == "true"
+THUMBS_DIR = os.path.join(VIDEOS_DIR, "thumbs")
+THUMB_WIDTH = int(os.getenv("THUMB_WIDTH", "320"))
+SPRITE_FRAMES = int(os.getenv("SPRITE_FRAMES", "10"))
+SPRITE_WIDTH = int(os.getenv("SPRITE_WIDTH", "160"))
+THUMB_WORKERS = int(os.getenv("THUMB_WORKERS", "1"))
+THUMB_QUEUE_MAX = int(os.getenv("THUMB_QUEUE_MAX", "64"))
+
+# Retention: recordings are kept within a disk budget, trimmed from the high to the low watermark
+RETENTION_QUOTA = int(float(os.getenv("RETENTION_QUOTA_MB", "0")) * 1024 * 1024)  # 0 = whatever the card holds
+RETENTION_MIN_FREE = int(float(os.getenv("RETENTION_MIN_FREE_MB", "500")) * 1024 * 1024)  # left for the OS, logs, DBs
+RETENTION_HIGH_WATERMARK = float(os.getenv("RETENTION_HIGH_WATERMARK", "0.9"))
+RETENTION_LOW_WATERMARK = float(os.getenv("RETENTION_LOW_WATERMARK", "0.75"))
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", "60"))
+
+# Timelines of this many recent incidents (triggers) are kept for /incidents
+INCIDENTS_KEEP = int(os.getenv("INCIDENTS_KEEP", "200"))
+
+# Recordings roll over into segments of this length so upload can start early (0 = one file)
+SEGMENT_SECONDS = float(os.getenv("SEGMENT_SECONDS", "10"))
+
+# The camera opens in the background at boot; a recording triggered before then waits this long for it
+CAMERA_START_TIMEOUT = float(os.getenv("CAMERA_START_TIMEOUT", "30"))
 
 os.makedirs(VIDEOS_DIR, exist_ok=True)
 
 UPLOAD_URL = os.getenv("UPLOAD_URL", f"{SYNC_BASE_URL}/api/recordings/upload")
 
-def get_local_ip():
+# Outbound HTTP: one keep-alive pool for all sync and upload traffic
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "4"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "20"))
+SYNC_GZIP = os.getenv("SYNC_GZIP", "false").lower() == "true"
+
+# "threaded" runs Flask's threaded server; "asgi" serves streams as coroutines under uvicorn
+SERVER_MODE = os.getenv("SERVER_MODE", "threaded").lower()
+ASGI_WSGI_WORKERS = int(os.getenv("ASGI_WSGI_WORKERS", "8"))
+
+# Location sampling/flush cadence in seconds: tight while recording or after an SOS, sparse when idle
+LOCATION_ACTIVE_INTERVAL = float(os.getenv("LOCATION_ACTIVE_INTERVAL", "15"))
+LOCATION_IDLE_INTERVAL = float(os.getenv("LOCATION_IDLE_INTERVAL", "300"))
+LOCATION_ACTIVE_FLUSH = float(os.getenv("LOCATION_ACTIVE_FLUSH", "30"))
+LOCATION_ACTIVE_WINDOW = float(os.getenv("LOCATION_ACTIVE_WINDOW", "600"))  # stay active this long after a recording starts
+LOCATION_BATCH_SIZE = int(os.getenv("LOCATION_BATCH_SIZE", "50"))
+LOCATION_BUFFER_MAX = int(os.getenv("LOCATION_BUFFER_MAX", "10000"))
+
+# Cached lookups: fresh for TTL seconds, then served stale while refreshing in the background
+LOCATION_CACHE_TTL = float(os.getenv("LOCATION_CACHE_TTL", "120"))
+LOCAL_IP_CACHE_TTL = float(os.getenv("LOCAL_IP_CACHE_TTL", "60"))
+NETWORK_WATCH_INTERVAL = float(os.getenv("NETWORK_WATCH_INTERVAL", "5"))
+CACHE_RETRY_BASE = float(os.getenv("CACHE_RETRY_BASE", "5"))  # after a failed lookup; doubles per failure, up to the TTL
+
+# WiFi scans: /wifi/scan answers from a cache this fresh; background scans only run with WIFI_MANAGER
+WIFI_INTERFACE = os.getenv("WIFI_INTERFACE", "wlan0")
+WIFI_SCAN_TTL = float(os.getenv("WIFI_SCAN_TTL", "30"))
+WIFI_SCAN_INTERVAL = float(os.getenv("WIFI_SCAN_INTERVAL", "60"))
+WIFI_MANAGER = os.getenv("WIFI_MANAGER", "false").lower() == "true"  # scan in the background, join open networks
+
+# Resumable uploads send files in checksummed chunks of this size
+UPLOAD_CHUNKED = os.getenv("UPLOAD_CHUNKED", "true").lower() == "true"
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_KB", "256")) * 1024
+
+# Upload queue: parallel workers and retry backoff (seconds)
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+UPLOAD_BACKOFF_BASE = float(os.getenv("UPLOAD_BACKOFF_BASE", "2"))
+UPLOAD_BACKOFF_MAX = float(os.getenv("UPLOAD_BACKOFF_MAX", "300"))
+
+def lookup_local_ip():
     """Get the local IP address of the RPi"""
     try:
         # Create a socket to get the local IP
@@ -70,72 +176,2090 @@ if sync_enabled:
 else:
     print("Warning: Sync disabled - SYNC_BASE_URL or USER_ID not set")
 
-# ---------------- APP ---------------- #
+# ---------------- BOOT ---------------- #
+
+# Startup stages, timed from process start by boot_profile:
+#   armed    the help button is claimed and presses are latched (right here, before the heavy imports)
+#   ready    the module has loaded, HelpButton has taken over and replayed latched presses
+#   camera   the camera is open and the pre-event encoder runs; record_video waits for this
+#   media    cv2 and NumPy are loaded for /camera frames and motion detection
+#   serving  the HTTP server is starting
+BOOT_DEFERRED_MODULES = ("flask", "requests", "cv2", "numpy", "geocoder", "qrcode", "picamzero")
+
+def process_age():
+    """Seconds since this process started (since this module started loading if /proc is unavailable)"""
+    try:
+        with open("/proc/self/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        started = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - started
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.monotonic() - MODULE_LOADED_AT
+
+class BootProfile:
+    """Time from process start to each startup stage.
+
+    Process start is read from /proc, so interpreter start-up and imports
+    are included. /status reports the stages, /metrics exports them, and
+    rpi/check_boot.py holds time-to-armed to a budget.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic() - process_age()
+        self.stages = {}
+        self.loaded_when_armed = []
+        self._lock = threading.Lock()
+
+    def mark(self, stage):
+        with self._lock:
+            if stage in self.stages:
+                return
+            self.stages[stage] = time.monotonic() - self.started
+            if stage == "armed":
+                self.loaded_when_armed = [m for m in BOOT_DEFERRED_MODULES if m in sys.modules]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "stages_ms": {stage: round(seconds * 1000, 1) for stage, seconds in self.stages.items()},
+                "loaded_when_armed": list(self.loaded_when_armed)
+            }
+
+class PressLatch:
+    """Holds help button presses until HelpButton exists.
+
+    Claiming the pin takes a few milliseconds; loading the rest of the app
+    (Flask, requests, the stores) takes far longer on a Pi. Presses in
+    between are timestamped here and replayed by hand_over(), so a press
+    while the device is still booting starts a recording instead of being
+    lost.
+    """
+
+    def __init__(self, button):
+        self.button = button
+        self.presses = []
+        button.when_pressed = self._pressed
+
+    def _pressed(self):
+        self.presses.append(time.monotonic())
+
+    def hand_over(self, handler):
+        """Send presses to handler(pressed_at) from now on, replaying latched ones"""
+        self.button.when_pressed = handler
+        presses, self.presses = self.presses, []
+        for pressed_at in presses:
+            handler(pressed_at)
+
+boot_profile = BootProfile()
+sos_latch = PressLatch(Button(HELP_PIN))
+boot_profile.mark("armed")
+
+# Deferred until presses are latched: together these take longer to import than everything above
+import asyncio
+import requests
+from requests.adapters import HTTPAdapter
+from flask import Flask, Response, jsonify, request, abort
+from flask_cors import CORS
+from werkzeug.http import http_date
+from werkzeug.security import safe_join
+
+# ---------------- APP ---------------- #
+
+app = Flask(__name__)
+CORS(app)
+
+# ---------------- METRICS ---------------- #
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+class Metric:
+    """One Prometheus metric family, with samples keyed by label values.
+
+    Updates are a dict lookup and an add under a per-metric lock; histogram
+    buckets are stored non-cumulative and only summed when scraped. Gauges
+    may instead be given fn, which is called at scrape time and returns a
+    number (or a dict of label tuples to numbers, or None to skip).
+    """
+
+    def __init__(self, name, kind, help, labels=(), buckets=None, fn=None):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) if buckets else None
+        self.fn = fn
+        self._lock = threading.Lock()
+        self._values = {}
+        if not self.labels and fn is None:
+            # Unlabelled series are exported as zero before the first update
+            self._values[()] = [[0] * (len(self.buckets) + 1), 0.0, 0] if self.buckets else 0
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _labels(self, key, extra=""):
+        pairs = [f'{name}="{value}"' for name, value in zip(self.labels, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self):
+        if self.fn:
+            try:
+                value = self.fn()
+            except Exception:
+                value = None
+            if value is None:
+                return []
+            values = value if isinstance(value, dict) else {(): value}
+        else:
+            with self._lock:
+                values = {k: (list(v[0]), v[1], v[2]) if self.buckets else v for k, v in self._values.items()}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in values.items():
+            if not self.buckets:
+                lines.append(f"{self.name}{self._labels(key)} {value}")
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), counts):
+                cumulative += n
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{self._labels(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {total}")
+            lines.append(f"{self.name}_count{self._labels(key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """In-process metrics rendered in the Prometheus text format by /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._add(Metric(name, "counter", help, labels))
+
+    def gauge(self, name, help, labels=(), fn=None):
+        return self._add(Metric(name, "gauge", help, labels, fn=fn))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Metric(name, "histogram", help, labels, buckets=buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+def read_cpu_temperature():
+    with open("/sys/class/thermal/thermal_zone0/temp") as f:
+        return int(f.read()) / 1000
+
+def read_throttled():
+    # Firmware throttling flags (under-voltage, frequency capped, ...); 0 means healthy
+    with open("/sys/devices/platform/soc/soc:firmware/get_throttled") as f:
+        return int(f.read(), 16)
+
+metrics = MetricsRegistry()
+metrics.gauge("rpi_device_info", "Device identity", ("device_id",), fn=lambda: {(DEVICE_ID,): 1})
+metrics.gauge("rpi_cpu_temperature_celsius", "SoC temperature", fn=read_cpu_temperature)
+metrics.gauge("rpi_throttled_flags", "Firmware throttling bitmask (0 = not throttled)", fn=read_throttled)
+metrics.gauge("rpi_disk_free_bytes", "Free space on the recordings volume",
+              fn=lambda: shutil.disk_usage(VIDEOS_DIR).free)
+metrics.gauge("rpi_upload_queue_depth", "Files waiting to be uploaded", fn=lambda: upload_queue.pending_count())
+metrics.gauge("rpi_location_buffer_depth", "Location points waiting to be synced",
+              fn=lambda: location_tracker.pending_count())
+metrics.gauge("rpi_recording", "1 while a recording is running", fn=lambda: int(is_recording))
+metrics.gauge("rpi_stream_viewers", "Connected /camera clients per tier", ("tier",),
+              fn=lambda: {(tier,): n for tier, n in stream_tiers.stats().items()})
+preview_capture_seconds = metrics.histogram("rpi_preview_capture_seconds",
+                                            "Time to capture and encode one preview frame for all active tiers")
+stream_frames_sent = metrics.counter("rpi_stream_frames_sent_total", "MJPEG frames sent to clients", ("tier",))
+stream_client_frames = metrics.histogram("rpi_stream_client_frames", "Frames sent per /camera connection",
+                                         buckets=(10, 100, 1000, 10000, 100000))
+http_request_seconds = metrics.histogram("rpi_http_request_seconds", "Outbound request latency", ("endpoint",))
+http_request_errors = metrics.counter("rpi_http_request_errors_total",
+                                      "Outbound requests that failed or got a 5xx", ("endpoint",))
+upload_seconds = metrics.histogram("rpi_upload_seconds", "Time to upload one file",
+                                   buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600))
+upload_bytes = metrics.counter("rpi_upload_bytes_total", "Bytes of recordings uploaded")
+upload_bytes_per_second = metrics.gauge("rpi_upload_bytes_per_second", "Throughput of the last completed upload")
+upload_results = metrics.counter("rpi_uploads_total", "Upload attempts by outcome", ("result",))
+recording_seconds = metrics.histogram("rpi_recording_seconds", "Length of finished recordings", ("priority",),
+                                      buckets=(1, 5, 10, 30, 60, 120, 300, 600))
+press_to_record_seconds = metrics.histogram("rpi_press_to_record_seconds",
+                                            "Time from an SOS trigger to capture starting")
+motion_analysis_seconds = metrics.histogram("rpi_motion_analysis_seconds", "Motion detector time per analysed frame",
+                                            buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+motion_events = metrics.counter("rpi_motion_events_total", "Motion events fired")
+retention_evicted_files = metrics.counter("rpi_retention_evicted_files_total", "Recordings deleted to stay in budget")
+retention_evicted_bytes = metrics.counter("rpi_retention_evicted_bytes_total", "Bytes freed by retention")
+metrics.gauge("rpi_boot_stage_seconds", "Time from process start to each boot stage", ("stage",),
+              fn=lambda: {(stage,): seconds for stage, seconds in boot_profile.stages.items()})
+metrics.gauge("rpi_recordings_bytes", "Bytes of recordings kept on the device", fn=lambda: recording_catalog.usage())
+
+# ---------------- HTTP CLIENT ---------------- #
+
+class HttpClient:
+    """Shared requests.Session for all outbound traffic.
+
+    Connections to SYNC_BASE_URL are kept alive and pooled, so repeated syncs
+    and upload chunks skip the TCP/TLS handshake. Every request gets a
+    connect/read timeout, JSON bodies can be gzip-compressed, and latency is
+    tracked per endpoint.
+    """
+
+    def __init__(self, pool_size=HTTP_POOL_SIZE, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT), adapter=None):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._adapter = adapter or HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", self._adapter)
+        self.session.mount("https://", self._adapter)
+        self._lock = threading.Lock()
+        self._stats = {}
+        self.online = None  # outcome of the most recent request (None until one is made)
+        self.listeners = []  # called (on the requesting thread) when online flips
+
+    def request(self, method, url, endpoint=None, json_body=None, gzip_body=False, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers = dict(kwargs.pop("headers", None) or {}, **{"Content-Type": "application/json"})
+            if gzip_body:
+                body = gzip.compress(body)
+                headers["Content-Encoding"] = "gzip"
+            kwargs["data"] = body
+            kwargs["headers"] = headers
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = self.session.request(method, url, **kwargs)
+            ok = response.status_code < 500
+            return response
+        finally:
+            self._record(endpoint or urlsplit(url).path, time.perf_counter() - started, ok)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def _record(self, endpoint, seconds, ok):
+        with self._lock:
+            stat = self._stats.setdefault(endpoint, {"count": 0, "errors": 0, "total": 0.0, "max": 0.0})
+            stat["count"] += 1
+            stat["errors"] += 0 if ok else 1
+            stat["total"] += seconds
+            stat["max"] = max(stat["max"], seconds)
+            changed = self.online != ok
+            self.online = ok
+        http_request_seconds.observe(seconds, endpoint=endpoint)
+        if not ok:
+            http_request_errors.inc(endpoint=endpoint)
+        if changed:
+            for listener in self.listeners:
+                listener()
+
+    def connections_opened(self):
+        pools = self._adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in pools.keys())
+
+    def stats(self):
+        with self._lock:
+            endpoints = {
+                name: {
+                    "count": s["count"],
+                    "errors": s["errors"],
+                    "avg_ms": round(s["total"] / s["count"] * 1000, 1),
+                    "max_ms": round(s["max"] * 1000, 1)
+                }
+                for name, s in self._stats.items()
+            }
+        return {"connections_opened": self.connections_opened(), "endpoints": endpoints}
+
+http_client = HttpClient()
+
+class DeviceIdentity:
+    """The device and user that sync and upload requests speak for, and the client that sends them.
+
+    The service itself is this_device. rpi/bench/fleet_sim.py gives each of
+    its virtual devices an identity and client of its own and runs them all
+    through the same location, status and upload code.
+    """
+
+    def __init__(self, device_id, user_id, base_url, client, upload_url=None):
+        self.device_id = device_id
+        self.user_id = user_id
+        self.base_url = base_url.rstrip("/")
+        self.client = client
+        self.upload_url = upload_url or f"{self.base_url}/api/recordings/upload"
+        self.sessions_url = f"{self.upload_url}/sessions"
+
+this_device = DeviceIdentity(DEVICE_ID, USER_ID, SYNC_BASE_URL, http_client, UPLOAD_URL)
+
+# ---------------- CACHED LOOKUPS ---------------- #
+
+class CachedValue:
+    """Lazily loaded value with a TTL, stale-while-revalidate and single-flight.
+
+    Within ttl the cached value is returned as is. After that, callers keep
+    getting the stale value (for up to stale_ttl more) while one background
+    thread refreshes it. A failed load (an exception or None) is cached too:
+    no new load starts until a retry delay has passed, growing from
+    CACHE_RETRY_BASE up to ttl with each failure in a row.
+
+    With a fallback, get() never waits: a cold, long-expired or failing
+    cache answers with the fallback and loads in the background. Without
+    one, a cold cache makes the caller wait, and concurrent callers then
+    share a single lookup.
+    """
+
+    def __init__(self, name, loader, ttl, stale_ttl, fallback=None, retry_base=CACHE_RETRY_BASE):
+        self.name = name
+        self._loader = loader
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.fallback = fallback
+        self.retry_base = retry_base
+        self._cond = threading.Condition()
+        self._value = None
+        self._loaded_at = None
+        self._refreshing = False
+        self._failures = 0
+        self._retry_at = 0.0
+
+    def get(self):
+        with self._cond:
+            now = time.monotonic()
+            age = now - self._loaded_at if self._loaded_at is not None else None
+            if age is not None and age < self.ttl:
+                return self._value
+            usable = age is not None and age < self.ttl + self.stale_ttl
+            backing_off = now < self._retry_at
+            if usable or self.fallback is not None or backing_off:
+                if not backing_off:
+                    self._start_refresh()
+                if usable:
+                    return self._value
+                return self._value if self.fallback is None else self.fallback
+            if self._refreshing:
+                # Someone is already loading it; share their result
+                self._cond.wait_for(lambda: not self._refreshing)
+                return self._value
+            self._refreshing = True
+        self._refresh()
+        with self._cond:
+            return self._value
+
+    def get_fresh(self, max_age):
+        """The value if it was loaded within max_age seconds, else load it now (or share the
+        load in flight); None if that fails or a recent failure is still backing off"""
+        def fresh():
+            return self._loaded_at is not None and time.monotonic() - self._loaded_at < max_age
+
+        with self._cond:
+            if fresh():
+                return self._value
+            if self._refreshing:
+                self._cond.wait_for(lambda: not self._refreshing)
+                return self._value if fresh() else None
+            if time.monotonic() < self._retry_at:
+                return None
+            self._refreshing = True
+        self._refresh()
+        with self._cond:
+            return self._value if fresh() else None
+
+    def refresh(self):
+        """Load now, or wait for the load already in flight, and return the result"""
+        with self._cond:
+            if self._refreshing:
+                self._cond.wait_for(lambda: not self._refreshing)
+                return self._value
+            self._refreshing = True
+        self._refresh()
+        with self._cond:
+            return self._value
+
+    def _start_refresh(self):
+        if not self._refreshing:
+            self._refreshing = True
+            threading.Thread(target=self._refresh, daemon=True).start()
+
+    def _refresh(self):
+        try:
+            value = self._loader()
+        except Exception as e:
+            print(f"Refreshing {self.name} failed:", e)
+            value = None
+        with self._cond:
+            if value is not None:
+                self._value = value
+                self._loaded_at = time.monotonic()
+                self._failures = 0
+                self._retry_at = 0.0
+            else:
+                # Keep the last good value and don't ask the upstream again for a while
+                self._failures += 1
+                delay = min(self.ttl, self.retry_base * 2 ** (self._failures - 1))
+                self._retry_at = time.monotonic() + delay
+            self._refreshing = False
+            self._cond.notify_all()
+
+    def invalidate(self):
+        """Mark the value stale and refresh it in the background"""
+        with self._cond:
+            if self._loaded_at is not None:
+                self._loaded_at = min(self._loaded_at, time.monotonic() - self.ttl)
+            # Something changed (e.g. the network), so a recent failure says nothing
+            self._failures = 0
+            self._retry_at = 0.0
+            self._start_refresh()
+
+def network_fingerprint():
+    """Cheap snapshot of interfaces and routes; changes when the network does"""
+    try:
+        with open("/proc/net/route") as f:
+            routes = f.read()
+    except OSError:
+        routes = ""
+    try:
+        interfaces = tuple(socket.if_nameindex())
+    except OSError:
+        interfaces = ()
+    return routes, interfaces
+
+def network_watch_loop(caches):
+    """Invalidate network-dependent caches when interfaces or routes change"""
+    last = network_fingerprint()
+    while True:
+        time.sleep(NETWORK_WATCH_INTERVAL)
+        current = network_fingerprint()
+        if current != last:
+            print("Network changed, refreshing cached lookups")
+            for cache in caches:
+                cache.invalidate()
+            last = current
+
+local_ip_cache = CachedValue("local IP", lookup_local_ip, LOCAL_IP_CACHE_TTL, stale_ttl=86400)
+
+def get_local_ip():
+    return local_ip_cache.get()
+
+# ---------------- UPLOAD QUEUE ---------------- #
+
+# Lower runs first: SOS clips jump ahead of everything else
+PRIORITY_SOS = 0
+PRIORITY_ROUTINE = 10
+
+UPLOADABLE_SUFFIXES = (".mp4", ".h264", ".manifest.json")
+
+class UploadQueue:
+    """Disk-backed upload queue (SQLite under VIDEOS_DIR).
+
+    Entries survive crashes and reboots, failed items back off individually
+    (exponential with jitter) so they never block the rest, and workers
+    always pick the most urgent due item. A session manifest is held back
+    until every other file of its session has been uploaded.
+    """
+
+    def __init__(self, db_path):
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS uploads (
+                path TEXT PRIMARY KEY,
+                fields TEXT NOT NULL DEFAULT '{}',
+                session_id TEXT,
+                priority INTEGER NOT NULL DEFAULT 10,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                url TEXT,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_uploads_due ON uploads(state, priority, next_attempt)")
+        # Anything that was mid-upload when we died goes back in line
+        self._db.execute("UPDATE uploads SET state = 'pending' WHERE state = 'uploading'")
+        self._db.commit()
+
+    def put(self, path, fields=None, priority=PRIORITY_ROUTINE):
+        fields = fields or {}
+        with self._cond:
+            self._db.execute(
+                "INSERT OR REPLACE INTO uploads (path, fields, session_id, priority, created_at) VALUES (?, ?, ?, ?, ?)",
+                (path, json.dumps(fields), fields.get("session_id"), priority, time.time())
+            )
+            self._db.commit()
+            self._cond.notify()
+
+    def claim(self, timeout=None):
+        """Wait for the most urgent due entry and mark it in flight; returns (path, fields) or None"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._cond:
+            while True:
+                now = time.time()
+                row = self._db.execute("""
+                    SELECT path, fields FROM uploads AS u
+                    WHERE state = 'pending' AND next_attempt <= ?
+                      AND NOT (path LIKE '%.manifest.json' AND EXISTS (
+                          SELECT 1 FROM uploads AS s
+                          WHERE s.session_id = u.session_id AND s.path != u.path AND s.state != 'done'))
+                    ORDER BY priority, created_at LIMIT 1
+                """, (now,)).fetchone()
+                if row:
+                    self._db.execute("UPDATE uploads SET state = 'uploading' WHERE path = ?", (row[0],))
+                    self._db.commit()
+                    return row[0], json.loads(row[1])
+                wait = self._next_due(now)
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    wait = min(wait, remaining)
+                self._cond.wait(wait)
+
+    def _next_due(self, now):
+        # Items held back for other reasons wake us through notify()
+        row = self._db.execute(
+            "SELECT MIN(next_attempt) FROM uploads WHERE state = 'pending' AND next_attempt > ?", (now,)
+        ).fetchone()
+        return min(row[0] - now, 60) if row[0] is not None else 60
+
+    def complete(self, path, url):
+        with self._cond:
+            self._db.execute("UPDATE uploads SET state = 'done', url = ?, last_error = NULL WHERE path = ?", (url, path))
+            self._db.commit()
+            # A held-back manifest may be due now
+            self._cond.notify_all()
+
+    def fail(self, path, error):
+        with self._cond:
+            attempts = self._db.execute("SELECT attempts FROM uploads WHERE path = ?", (path,)).fetchone()[0] + 1
+            delay = min(UPLOAD_BACKOFF_MAX, UPLOAD_BACKOFF_BASE * 2 ** (attempts - 1))
+            delay = delay / 2 + random.uniform(0, delay / 2)
+            self._db.execute(
+                "UPDATE uploads SET state = 'pending', attempts = ?, next_attempt = ?, last_error = ? WHERE path = ?",
+                (attempts, time.time() + delay, str(error)[:500], path)
+            )
+            self._db.commit()
+            self._cond.notify()
+        return delay
+
+    def raise_priority(self, paths, priority):
+        """Move the paths that are still to upload up to priority (never down)"""
+        with self._cond:
+            self._db.executemany(
+                "UPDATE uploads SET priority = ? WHERE path = ? AND state != 'done' AND priority > ?",
+                [(priority, path, priority) for path in paths]
+            )
+            self._db.commit()
+            self._cond.notify_all()
+
+    def forget(self, path):
+        with self._cond:
+            self._db.execute("DELETE FROM uploads WHERE path = ?", (path,))
+            self._db.commit()
+
+    def active_count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM uploads WHERE state = 'uploading'").fetchone()[0]
+
+    def pending_count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM uploads WHERE state != 'done'").fetchone()[0]
+
+    def protected_paths(self):
+        """Files retention must not delete: SOS clips not yet uploaded and anything mid-upload"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT path FROM uploads WHERE state != 'done' AND (priority <= ? OR state = 'uploading')",
+                (PRIORITY_SOS,)
+            )
+            return {row[0] for row in rows}
+
+    def status(self, path):
+        """(state, url, attempts) for a queued path, or None"""
+        with self._lock:
+            return self._db.execute("SELECT state, url, attempts FROM uploads WHERE path = ?", (path,)).fetchone()
+
+    def rescan(self, directory, describe):
+        """Queue recordings on disk that never made it into the queue (e.g. after a crash).
+
+        describe(name) returns the (fields, priority) to queue a file with.
+        Partial outputs of an interrupted remux or mux are left alone.
+        """
+        with self._lock:
+            known = {row[0] for row in self._db.execute("SELECT path FROM uploads")}
+        names = set(os.listdir(directory))
+        found = 0
+        for name in sorted(names):
+            path = os.path.join(directory, name)
+            if not name.endswith(UPLOADABLE_SUFFIXES) or path in known or is_partial_output(name, names):
+                continue
+            fields, priority = describe(name)
+            self.put(path, fields, priority)
+            found += 1
+        return found
+
+def is_partial_output(name, names):
+    """True for a faststart temp file, or an MP4 whose mux was cut short (its raw .h264 is still there)"""
+    if name.endswith(".faststart.mp4"):
+        return True
+    return name.endswith(".mp4") and name[:-len(".mp4")] + ".h264" in names
+
+def fields_for_recording(name):
+    """Rebuild upload form fields from a recording's file name"""
+    match = re.match(r"(video_\d{8}_\d{6}(?:_\d+)?)(?:_seg(\d{3})\.\w+|\.manifest\.json)$", name)
+    if not match:
+        return {}
+    fields = {"session_id": match.group(1)}
+    if match.group(2) is not None:
+        fields["segment_index"] = int(match.group(2))
+    return fields
+
+upload_queue = UploadQueue(os.path.join(VIDEOS_DIR, "uploads.db"))
+
+# ---------------- RECORDINGS CATALOG ---------------- #
+
+RECORDING_SUFFIXES = (".mp4", ".h264")
+
+def mp4_boxes(f, start, end):
+    """Yield (kind, payload_start, box_end) for the MP4 boxes between two offsets"""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        size, kind = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            return
+        yield kind, pos + header, pos + size
+        pos += size
+
+def mp4_child(f, start, end, path):
+    """(payload_start, box_end) of the box at a path like [b"moov", b"mvhd"], or None"""
+    for kind, payload, box_end in mp4_boxes(f, start, end):
+        if kind == path[0]:
+            return (payload, box_end) if len(path) == 1 else mp4_child(f, payload, box_end, path[1:])
+    return None
+
+def mp4_duration(path):
+    """Read the duration from an MP4's mvhd box without decoding (None if not found)"""
+    try:
+        with open(path, "rb") as f:
+            box = mp4_child(f, 0, os.fstat(f.fileno()).st_size, [b"moov", b"mvhd"])
+            if box is None:
+                return None
+            f.seek(box[0])
+            version = f.read(1)[0]
+            f.read(3)
+            if version == 1:
+                f.read(16)
+                timescale, duration = struct.unpack(">IQ", f.read(12))
+            else:
+                f.read(8)
+                timescale, duration = struct.unpack(">II", f.read(8))
+            return round(duration / timescale, 2) if timescale else None
+    except (OSError, struct.error, IndexError):
+        pass
+    return None
+
+def mp4_media_info(path):
+    """Codec string (RFC 6381, e.g. avc1.640028) and layout of an MP4, read from its headers.
+
+    faststart means the moov index precedes the media data, so the file can be
+    played (or stored and served) as it arrives without being rewritten.
+    """
+    try:
+        with open(path, "rb") as f:
+            end = os.fstat(f.fileno()).st_size
+            order = [kind for kind, _, _ in mp4_boxes(f, 0, end) if kind in (b"moov", b"mdat")]
+            moov = mp4_child(f, 0, end, [b"moov"])
+            if moov is None:
+                return None
+            codec = None
+            for kind, payload, box_end in mp4_boxes(f, *moov):
+                stsd = kind == b"trak" and mp4_child(f, payload, box_end, [b"mdia", b"minf", b"stbl", b"stsd"])
+                if not stsd:
+                    continue
+                # stsd holds the sample entries; the avcC record sits inside the avc1 entry
+                f.seek(stsd[0])
+                data = f.read(stsd[1] - stsd[0])
+                at = data.find(b"avcC")
+                if at >= 0 and at + 8 <= len(data):
+                    codec = "avc1.%02X%02X%02X" % tuple(data[at + 5:at + 8])
+                    break
+            return {"codec": codec, "faststart": order[:1] == [b"moov"]}
+    except (OSError, struct.error, IndexError):
+        return None
+
+class RecordingCatalog:
+    """Persistent index of the recordings in VIDEOS_DIR (SQLite).
+
+    Recordings are added as record_video saves them and their upload state is
+    updated by the upload workers, so listing never touches the filesystem.
+    sync() reconciles with the directory for files that were copied in or
+    deleted behind the service's back; it only scans when the directory's
+    mtime has changed.
+    """
+
+    def __init__(self, db_path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS recordings (
+                name TEXT PRIMARY KEY,
+                session_id TEXT,
+                segment_index INTEGER,
+                incident_id TEXT,
+                size INTEGER NOT NULL,
+                duration REAL,
+                created_at REAL NOT NULL,
+                upload_state TEXT NOT NULL DEFAULT 'local',
+                url TEXT
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_recordings_created ON recordings(created_at DESC, name DESC)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_recordings_session ON recordings(session_id, segment_index)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_recordings_state ON recordings(upload_state, created_at)")
+        self._db.commit()
+        self._dir_mtime = None
+
+    def add(self, path, duration=None, fields=None, upload_state="pending", created_at=None):
+        fields = fields or {}
+        stat = os.stat(path)
+        with self._lock:
+            self._db.execute("""
+                INSERT OR REPLACE INTO recordings
+                    (name, session_id, segment_index, incident_id, size, duration, created_at, upload_state)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                os.path.basename(path), fields.get("session_id"), fields.get("segment_index"),
+                fields.get("incident_id"), stat.st_size, duration, created_at or stat.st_mtime, upload_state
+            ))
+            self._db.commit()
+
+    def set_upload_state(self, path, state, url=None):
+        name = os.path.basename(path)
+        if not name.endswith(RECORDING_SUFFIXES):
+            return
+        with self._lock:
+            self._db.execute("UPDATE recordings SET upload_state = ?, url = COALESCE(?, url) WHERE name = ?",
+                             (state, url, name))
+            self._db.commit()
+
+    def remove(self, name):
+        with self._lock:
+            self._db.execute("DELETE FROM recordings WHERE name = ?", (name,))
+            self._db.commit()
+
+    def usage(self):
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM recordings").fetchone()[0]
+
+    def eviction_order(self):
+        """(name, size, upload_state) of every recording: uploaded ones first, then the rest; oldest first"""
+        with self._lock:
+            return self._db.execute("""
+                SELECT name, size, upload_state FROM recordings
+                WHERE upload_state != 'uploading'
+                ORDER BY upload_state != 'uploaded', created_at, name
+            """).fetchall()
+
+    def get(self, name):
+        with self._lock:
+            cursor = self._db.execute("SELECT * FROM recordings WHERE name = ?", (name,))
+            row = cursor.fetchone()
+            return dict(zip([c[0] for c in cursor.description], row)) if row else None
+
+    def page(self, limit=50, cursor=None, session_id=None, incident_id=None, upload_state=None,
+             since=None, until=None):
+        """Newest first; returns (items, next_cursor). The cursor is opaque to clients."""
+        where, args = [], []
+        if cursor:
+            created_at, name = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            where.append("(created_at, name) < (?, ?)")
+            args += [created_at, name]
+        for column, value in (("session_id", session_id), ("incident_id", incident_id), ("upload_state", upload_state)):
+            if value:
+                where.append(f"{column} = ?")
+                args.append(value)
+        if since is not None:
+            where.append("created_at >= ?")
+            args.append(since)
+        if until is not None:
+            where.append("created_at < ?")
+            args.append(until)
+        sql = "SELECT * FROM recordings"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at DESC, name DESC LIMIT ?"
+        with self._lock:
+            rows = self._db.execute(sql, args + [limit + 1])
+            columns = [c[0] for c in rows.description]
+            items = [dict(zip(columns, row)) for row in rows.fetchall()]
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            last = items[-1]
+            next_cursor = base64.urlsafe_b64encode(json.dumps([last["created_at"], last["name"]]).encode()).decode()
+        return items, next_cursor
+
+    def sync(self, directory):
+        """Reconcile with the files on disk; returns (added, removed)"""
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return 0, 0
+        if mtime == self._dir_mtime:
+            return 0, 0
+        on_disk = {}
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(RECORDING_SUFFIXES) and entry.is_file():
+                    on_disk[entry.name] = entry.path
+        for name in [name for name in on_disk if is_partial_output(name, on_disk)]:
+            del on_disk[name]
+        with self._lock:
+            known = {row[0] for row in self._db.execute("SELECT name FROM recordings")}
+        added = removed = 0
+        for name in known - on_disk.keys():
+            self.remove(name)
+            removed += 1
+        for name in on_disk.keys() - known:
+            path = on_disk[name]
+            queued = upload_queue.status(path)
+            if queued is None:
+                state = "local"
+            else:
+                state = {"done": "uploaded"}.get(queued[0], "pending")
+            try:
+                self.add(path, mp4_duration(path) if name.endswith(".mp4") else None,
+                         fields_for_recording(name), state)
+            except OSError:
+                continue  # Vanished while scanning
+            if queued and queued[1]:
+                self.set_upload_state(path, state, queued[1])
+            added += 1
+        self._dir_mtime = mtime
+        return added, removed
+
+recording_catalog = RecordingCatalog(os.path.join(VIDEOS_DIR, "catalog.db"))
+
+def catalog_watch_loop():
+    """Pick up recordings added or deleted on disk outside the service"""
+    while True:
+        try:
+            recording_catalog.sync(VIDEOS_DIR)
+        except Exception as e:
+            print("Catalog sync failed:", e)
+        time.sleep(CATALOG_SCAN_INTERVAL)
+
+# ---------------- RETENTION ---------------- #
+
+def expected_recording_bytes(duration):
+    # Encoder output at VIDEO_BITRATE plus the pre-event buffer, with 10% for container overhead
+    return int((duration + PREBUFFER_SECONDS) * VIDEO_BITRATE / 8 * 1.1)
+
+class RetentionManager:
+    """Keeps the recordings in VIDEOS_DIR inside a disk budget.
+
+    The budget is RETENTION_QUOTA, capped by what the card can hold while
+    leaving RETENTION_MIN_FREE for everything else. Space for a full-length
+    recording is always held back: while idle as standing headroom, while
+    recording as the part of the session's reservation not yet written. When
+    recordings plus that reservation pass the high watermark, clips are
+    deleted until usage is under the low watermark. Uploaded clips go first,
+    then un-uploaded routine clips, oldest first. Un-uploaded SOS clips,
+    files being uploaded and the session being recorded are never deleted.
+    """
+
+    def __init__(self, directory, quota=RETENTION_QUOTA, min_free=RETENTION_MIN_FREE,
+                 high=RETENTION_HIGH_WATERMARK, low=RETENTION_LOW_WATERMARK, headroom=None):
+        self.directory = directory
+        self.quota = quota
+        self.min_free = min_free
+        self.high = high
+        self.low = low
+        self.headroom = expected_recording_bytes(120) if headroom is None else headroom
+        self._lock = threading.Lock()
+        self._enforce_lock = threading.Lock()
+        self._reservations = {}  # session_id -> bytes still expected
+        self.state = "ok"
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+
+    def budget(self):
+        """(bytes of recordings, bytes recordings may use)"""
+        used = recording_catalog.usage()
+        capacity = used + max(0, shutil.disk_usage(self.directory).free - self.min_free)
+        if self.quota:
+            capacity = min(capacity, self.quota)
+        return used, capacity
+
+    def reserved(self):
+        with self._lock:
+            return sum(self._reservations.values()) if self._reservations else self.headroom
+
+    def reserve(self, session_id, nbytes):
+        """Hold space for a recording that is starting; any eviction runs off the caller's thread"""
+        with self._lock:
+            self._reservations[session_id] = nbytes
+        used, capacity = self.budget()
+        if used + self.reserved() > capacity * self.high:
+            threading.Thread(target=self.enforce, daemon=True).start()
+
+    def consume(self, session_id, nbytes):
+        with self._lock:
+            if session_id in self._reservations:
+                self._reservations[session_id] = max(0, self._reservations[session_id] - nbytes)
+
+    def release(self, session_id):
+        with self._lock:
+            self._reservations.pop(session_id, None)
+
+    def enforce(self):
+        """Evict down to the low watermark once past the high one; returns bytes freed"""
+        with self._enforce_lock:
+            used, capacity = self.budget()
+            demand = used + self.reserved()
+            if demand <= capacity * self.high:
+                self.state = "ok"
+                return 0
+            need = demand - capacity * self.low
+            protected = upload_queue.protected_paths()
+            with self._lock:
+                active = tuple(self._reservations)
+            freed = 0
+            for name, size, upload_state in recording_catalog.eviction_order():
+                if freed >= need:
+                    break
+                path = os.path.join(self.directory, name)
+                if path in protected or (active and name.startswith(active)):
+                    continue
+                self.evict(path, size)
+                freed += size
+            self.state = "ok" if demand - freed <= capacity * self.high else "full"
+            if self.state == "full":
+                print(f"⚠️ Storage full: {(demand - freed) / 1e6:.0f} MB needed, {capacity / 1e6:.0f} MB budget, "
+                      "only protected recordings left")
+            return freed
+
+    def evict(self, path, size):
+        name = os.path.basename(path)
+        for leftover in (path, upload_state_path(path), thumbnails.poster_path(name), thumbnails.sprite_path(name)):
+            try:
+                os.remove(leftover)
+            except FileNotFoundError:
+                pass
+        recording_catalog.remove(name)
+        upload_queue.forget(path)
+        self.evicted_files += 1
+        self.evicted_bytes += size
+        retention_evicted_files.inc()
+        retention_evicted_bytes.inc(size)
+        print("🧹 Evicted:", name)
+
+    def stats(self):
+        used, capacity = self.budget()
+        return {
+            "state": self.state,
+            "used_bytes": used,
+            "reserved_bytes": self.reserved(),
+            "capacity_bytes": capacity,
+            "high_watermark_bytes": int(capacity * self.high),
+            "low_watermark_bytes": int(capacity * self.low),
+            "evicted_files": self.evicted_files,
+            "evicted_bytes": self.evicted_bytes
+        }
+
+def retention_loop():
+    while True:
+        try:
+            retention.enforce()
+        except Exception as e:
+            print("Retention check failed:", e)
+        time.sleep(RETENTION_INTERVAL)
+
+retention = RetentionManager(VIDEOS_DIR)
+
+# ---------------- INCIDENTS ---------------- #
+
+def read_boot_id():
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+class IncidentLog:
+    """Stage-by-stage timeline of every recording trigger.
+
+    Each trigger (HELP button, /help, /record, /command/record) gets an
+    incident ID that travels with its recording and uploads. Stages are
+    stamped with time.monotonic(), so latencies are immune to clock steps.
+    Events live in SQLite because an upload may only finish after a reboot;
+    monotonic readings are compared only within one boot, and wall-clock
+    time is used across boots.
+    """
+
+    def __init__(self, db_path, keep=INCIDENTS_KEEP):
+        self.keep = keep
+        self._boot = read_boot_id()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS incident_events (
+                incident_id TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                detail TEXT,
+                mono REAL NOT NULL,
+                wall REAL NOT NULL,
+                boot TEXT NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_incident_events ON incident_events(incident_id)")
+        self._db.commit()
+
+    def open(self, source, at=None):
+        """Start an incident for a trigger from source; at is its time.monotonic() reading"""
+        incident_id = f"{DEVICE_ID}-{datetime.now().strftime('%Y%m%d%H%M%S')}-{os.urandom(3).hex()}"
+        self.record(incident_id, "triggered", source, at)
+        with self._lock:
+            self._db.execute("""
+                DELETE FROM incident_events WHERE incident_id NOT IN (
+                    SELECT incident_id FROM incident_events WHERE stage = 'triggered'
+                    ORDER BY wall DESC LIMIT ?)
+            """, (self.keep,))
+            self._db.commit()
+        return incident_id
+
+    def record(self, incident_id, stage, detail=None, at=None):
+        if not incident_id:
+            return
+        now = time.monotonic()
+        mono = now if at is None else at
+        wall = time.time() - (now - mono)
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO incident_events (incident_id, stage, detail, mono, wall, boot) VALUES (?, ?, ?, ?, ?, ?)",
+                (incident_id, stage, detail, mono, wall, self._boot)
+            )
+            self._db.commit()
+
+    def timeline(self, incident_id):
+        """Events with their offset from the trigger (t_ms) and from the previous stage (delta_ms)"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT stage, detail, mono, wall, boot FROM incident_events WHERE incident_id = ? ORDER BY wall, rowid",
+                (incident_id,)
+            ).fetchall()
+        if not rows:
+            return None
+        _, source, mono0, wall0, boot0 = rows[0]
+        events, stages, previous = [], {}, 0.0
+        for stage, detail, mono, wall, boot in rows:
+            offset = mono - mono0 if boot == boot0 else wall - wall0
+            events.append({
+                "stage": stage,
+                "detail": detail,
+                "at": datetime.fromtimestamp(wall).isoformat(timespec="milliseconds"),
+                "t_ms": round(offset * 1000, 1),
+                "delta_ms": round((offset - previous) * 1000, 1)
+            })
+            stages.setdefault(stage, round(offset * 1000, 1))
+            previous = offset
+        return {"incident_id": incident_id, "source": source, "stages": stages, "events": events}
+
+    def recent(self, limit=20):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT incident_id, detail, wall FROM incident_events WHERE stage = 'triggered' ORDER BY wall DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [
+            {"incident_id": incident_id, "source": source,
+             "triggered_at": datetime.fromtimestamp(wall).isoformat(timespec="milliseconds")}
+            for incident_id, source, wall in rows
+        ]
+
+incidents = IncidentLog(os.path.join(VIDEOS_DIR, "incidents.db"))
+
+SOS_SOURCES = ("button", "help")
+
+def recovered_upload(name):
+    """(fields, priority) to re-queue a recording found on disk with.
+
+    The incident comes from the catalog or the session's manifest, and its
+    trigger tells an SOS clip (kept from retention until uploaded) from a
+    routine one.
+    """
+    fields = fields_for_recording(name)
+    row = recording_catalog.get(name)
+    incident_id = row["incident_id"] if row else None
+    if not incident_id and "session_id" in fields:
+        try:
+            with open(os.path.join(VIDEOS_DIR, fields["session_id"] + ".manifest.json")) as f:
+                incident_id = json.load(f).get("incident_id")
+        except (OSError, ValueError):
+            pass
+    if not incident_id:
+        return fields, PRIORITY_ROUTINE
+    fields["incident_id"] = incident_id
+    timeline = incidents.timeline(incident_id)
+    if timeline and timeline["source"] in SOS_SOURCES:
+        return fields, PRIORITY_SOS
+    return fields, PRIORITY_ROUTINE
+
+# ---------------- CAMERA ---------------- #
+
+camera = None  # opened by init_camera() after the help button is armed; stays None in demo mode
+camera_ready = threading.Event()  # set once init_camera() has finished (at once in demo mode)
+if not IS_RPI:
+    camera_ready.set()
+
+recording_lock = threading.Lock()
+is_recording = False
+recording_incident = None  # incident ID of the running recording, if it has one
+current_recording = None  # the running SegmentedRecording, set before is_recording
+recording_changed = threading.Condition()
+recording_listeners = []  # called (from any thread) whenever is_recording changes
+recording_stop = threading.Event()  # set to end the current recording early (the clip is kept)
+
+def set_recording(value):
+    global is_recording
+    with recording_changed:
+        is_recording = value
+        recording_changed.notify_all()
+    for listener in recording_listeners:
+        listener()
+
+class FrameHub:
+    """Single-slot broadcaster for the latest preview JPEG.
+
+    The preview loop publishes each frame once; every /camera client waits on
+    the condition for a newer sequence number and is handed the same bytes
+    object, so the cost per frame does not grow with the number of viewers.
+    Clients that fall behind simply skip to the newest frame.
+    """
+
+    def __init__(self, name="", on_change=None):
+        self.name = name
+        self._cond = threading.Condition()
+        self._frame = None
+        self._captured_at = None
+        self._seq = 0
+        self._subscribers = 0
+        self._listeners = []
+        self._on_change = on_change
+
+    @property
+    def seq(self):
+        return self._seq
+
+    @property
+    def subscribers(self):
+        return self._subscribers
+
+    def publish(self, frame, captured_at=None):
+        with self._cond:
+            self._frame = frame
+            self._captured_at = captured_at or time.time()
+            self._seq += 1
+            self._cond.notify_all()
+        for listener in self._listeners:
+            listener()
+
+    def add_listener(self, callback):
+        """Call callback (on the producer thread) after every published frame"""
+        self._listeners.append(callback)
+
+    def latest(self):
+        with self._cond:
+            return self._seq, self._frame, self._captured_at
+
+    def wait_for_frame(self, last_seq, timeout=None):
+        """Return (seq, frame, captured_at) newer than last_seq, or (last_seq, None, None) on timeout"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > last_seq, timeout):
+                return last_seq, None, None
+            return self._seq, self._frame, self._captured_at
+
+    def wait_for_subscribers(self, timeout=None):
+        """Block until at least one client is watching"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._subscribers > 0, timeout)
+
+    @contextmanager
+    def subscription(self):
+        with self._cond:
+            self._subscribers += 1
+            self._cond.notify_all()
+        if self._on_change:
+            self._on_change()
+        try:
+            yield self
+        finally:
+            with self._cond:
+                self._subscribers -= 1
+            if self._on_change:
+                self._on_change()
+
+def capture_preview_array():
+    """Capture the current camera frame as a BGR array (None in demo mode)"""
+    if not camera:
+        return None
+    frame = camera.pc2.capture_array("main")
+    if frame.ndim == 3 and frame.shape[2] == 4:
+        frame = frame[:, :, :3]  # Drop the padding byte of XRGB8888
+    return frame
+
+def load_media_modules():
+    """Import cv2 and NumPy; kept off the boot path, where they would delay arming the button"""
+    global cv2, np, motion_detector
+    if cv2 is None:
+        try:
+            import cv2
+        except ImportError:
+            pass
+    if np is None:
+        try:
+            import numpy as np
+        except ImportError:
+            pass
+    if motion_detector and np is None:
+        print("⚠️ NumPy not installed: motion detection disabled")
+        motion_detector = None
+
+def downscale_frame(frame, width):
+    height, full_width = frame.shape[:2]
+    if width >= full_width:
+        return frame
+    size = (width, max(1, round(height * width / full_width)))
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+def encode_jpeg(frame, quality):
+    ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise RuntimeError("JPEG encode failed")
+    return buf.tobytes()
+
+class StreamTiers:
+    """Per-quality FrameHubs fed from a single camera capture.
+
+    /camera clients ask for a width and JPEG quality, which snap to the
+    nearest configured tier. For every captured frame the preview loop
+    downscales once per active width and encodes once per active tier, then
+    publishes the bytes to that tier's hub, so ten thumbnail viewers cost one
+    small encode rather than ten, and tiers nobody is watching cost nothing.
+    """
+
+    def __init__(self, widths, qualities):
+        self.widths = list(widths)
+        self.qualities = list(qualities)
+        self._cond = threading.Condition()
+        self._hubs = {}
+        self._listeners = []
+        self.frames = 0
+
+    def select(self, width=None, quality=None):
+        """Snap a requested width/quality to a tier (defaults to the best one)"""
+        tier_width = self.widths[-1]
+        if width:
+            tier_width = next((w for w in self.widths if w >= width), self.widths[-1])
+        tier_quality = self.qualities[-1]
+        if quality:
+            tier_quality = min(self.qualities, key=lambda q: abs(q - quality))
+        return tier_width, tier_quality
+
+    def hub(self, width=None, quality=None):
+        tier = self.select(width, quality)
+        with self._cond:
+            if tier not in self._hubs:
+                self._hubs[tier] = FrameHub(f"{tier[0]}w_q{tier[1]}", on_change=self._viewers_changed)
+            return self._hubs[tier]
+
+    def _viewers_changed(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def add_listener(self, callback):
+        """Call callback (on the producer thread) after every captured frame"""
+        self._listeners.append(callback)
+
+    def active(self):
+        with self._cond:
+            return [(tier, hub) for tier, hub in self._hubs.items() if hub.subscribers]
+
+    @property
+    def viewers(self):
+        with self._cond:
+            return sum(hub.subscribers for hub in self._hubs.values())
+
+    def wait_for_viewers(self, timeout=None):
+        """Block until at least one client is watching any tier"""
+        with self._cond:
+            return self._cond.wait_for(lambda: any(h.subscribers for h in self._hubs.values()), timeout)
+
+    def publish(self, frame, captured_at=None):
+        """Encode a raw frame for every watched tier (frame=None publishes a demo placeholder)"""
+        scaled = {}
+        for (width, quality), hub in self.active():
+            if frame is None:
+                hub.publish(b"dummy image data", captured_at)
+                continue
+            if width not in scaled:
+                scaled[width] = downscale_frame(frame, width)
+            hub.publish(encode_jpeg(scaled[width], quality), captured_at)
+        self.frames += 1
+        for listener in self._listeners:
+            listener()
+
+    def stats(self):
+        with self._cond:
+            return {hub.name: hub.subscribers for hub in self._hubs.values() if hub.subscribers}
+
+stream_tiers = StreamTiers(STREAM_WIDTHS, STREAM_QUALITIES)
+
+class MotionDetector:
+    """Frame-differencing activity detector for preview frames (NumPy).
+
+    Each analysed frame is strided down to about `width` pixels across and
+    converted to grey. It is then compared with a running-average background
+    that learns at `learning_rate` per frame. The absolute difference is
+    averaged over CELL x CELL blocks, which filters sensor noise. The share
+    of blocks that changed by more than `pixel_threshold` is the frame's
+    activity. When activity stays at or above `area` for `frames` analysed
+    frames in a row, an event fires, at most once per `cooldown`.
+
+    Analysis is budgeted twice. It skips `frame_skip` frames after each one
+    it analyses, and it waits until its own CPU time stays under
+    `cpu_budget` of one core. A slow core therefore analyses fewer frames
+    instead of slowing the preview loop.
+    """
+
+    CELL = 4
+
+    def __init__(self, width=MOTION_WIDTH, pixel_threshold=MOTION_PIXEL_THRESHOLD, area=MOTION_AREA,
+                 frames=MOTION_FRAMES, frame_skip=MOTION_FRAME_SKIP, cpu_budget=MOTION_CPU_BUDGET,
+                 cooldown=MOTION_COOLDOWN, learning_rate=MOTION_LEARNING_RATE):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.area = area
+        self.frames = frames
+        self.frame_skip = frame_skip
+        self.cpu_budget = cpu_budget
+        self.cooldown = cooldown
+        self.learning_rate = learning_rate
+        self.listeners = []  # called with the activity when an event fires
+        self._background = None
+        self._streak = 0
+        self._skip = 0
+        self._next_at = 0.0
+        self._last_event = None
+        self.activity = 0.0
+        self.analysed = 0
+        self.skipped = 0
+        self.events = 0
+        self._cpu = 0.0
+
+    def feed(self, frame, now=None):
+        """Offer a preview frame; returns its activity, or None if the budget skipped it"""
+        if frame is None:
+            return None
+        now = time.monotonic() if now is None else now
+        if self._skip > 0 or now < self._next_at:
+            self._skip = max(0, self._skip - 1)
+            self.skipped += 1
+            return None
+        started = time.perf_counter()
+        activity = self.analyse(frame)
+        cost = time.perf_counter() - started
+        self._skip = self.frame_skip
+        if self.cpu_budget > 0:
+            self._next_at = now + cost / self.cpu_budget
+        self._cpu += cost
+        self.analysed += 1
+        self.activity = activity
+        motion_analysis_seconds.observe(cost)
+
+        self._streak = self._streak + 1 if activity >= self.area else 0
+        cooled = self._last_event is None or now - self._last_event >= self.cooldown
+        if self._streak >= self.frames and cooled:
+            self._last_event = now
+            self.events += 1
+            motion_events.inc()
+            for listener in self.listeners:
+                listener(activity)
+        return activity
+
+    def grey(self, frame):
+        """Subsampled BT.601 luma as float32, cropped to whole cells"""
+        step = max(1, frame.shape[1] // self.width)
+        small = frame[::step, ::step]
+        rows = small.shape[0] // self.CELL * self.CELL
+        cols = small.shape[1] // self.CELL * self.CELL
+        small = small[:rows, :cols]
+        if small.ndim == 2:
+            return small.astype(np.float32)
+        wide = small.astype(np.uint16)
+        return ((wide[..., 0] * 29 + wide[..., 1] * 150 + wide[..., 2] * 77) >> 8).astype(np.float32)
+
+    def analyse(self, frame):
+        grey = self.grey(frame)
+        if self._background is None or self._background.shape != grey.shape:
+            self._background = grey
+            return 0.0
+        delta = grey - self._background
+        rows, cols = grey.shape
+        cells = np.abs(delta).reshape(rows // self.CELL, self.CELL, cols // self.CELL, self.CELL).mean(axis=(1, 3))
+        self._background += self.learning_rate * delta
+        return float((cells > self.pixel_threshold).mean())
+
+    def stats(self):
+        return {
+            "activity": round(self.activity, 4),
+            "analysed": self.analysed,
+            "skipped": self.skipped,
+            "events": self.events,
+            "avg_ms": round(self._cpu / self.analysed * 1000, 3) if self.analysed else None
+        }
+
+motion_detector = MotionDetector() if MOTION_DETECT in ("tag", "record") else None
+
+def preview_loop():
+    load_media_modules()
+    boot_profile.mark("media")
+    while True:
+        # Stay idle (no capture at all) until someone opens /camera, unless motion detection needs frames
+        if not motion_detector and not stream_tiers.wait_for_viewers(timeout=1.0):
+            continue
+        try:
+            with preview_capture_seconds.time():
+                captured_at = time.time()
+                frame = capture_preview_array()
+                stream_tiers.publish(frame, captured_at)
+            if motion_detector:
+                motion_detector.feed(frame)
+        except Exception as e:
+            print("Preview error:", e)
+        time.sleep(PREVIEW_INTERVAL)
+
+class PreEventBuffer:
+    """Bounded circular buffer of recently encoded H.264 frames.
+
+    Frames older than max_seconds are dropped, as is anything beyond max_bytes,
+    whichever limit is hit first. The buffer always starts on a keyframe so a
+    snapshot can be written to the front of a recording and decode cleanly.
+    """
+
+    def __init__(self, max_seconds, max_bytes):
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self._frames = deque()  # (monotonic time, keyframe, data)
+        self._bytes = 0
+        self._appended = 0
+        self._append_time = 0.0
+
+    def append(self, data, keyframe, now):
+        started = time.perf_counter()
+        if not self._frames and not keyframe:
+            return  # Can't decode anything until the next keyframe
+        self._frames.append((now, keyframe, data))
+        self._bytes += len(data)
+        while self._frames and (
+            self._bytes > self.max_bytes or now - self._frames[0][0] > self.max_seconds
+        ):
+            self._drop_oldest()
+            # Drop the rest of the partial GOP as well
+            while self._frames and not self._frames[0][1]:
+                self._drop_oldest()
+        self._appended += 1
+        self._append_time += time.perf_counter() - started
+
+    def _drop_oldest(self):
+        _, _, data = self._frames.popleft()
+        self._bytes -= len(data)
+
+    def snapshot(self):
+        return list(self._frames)
+
+    def stats(self):
+        span = self._frames[-1][0] - self._frames[0][0] if self._frames else 0.0
+        return {
+            "seconds": round(span, 2),
+            "bytes": self._bytes,
+            "frames": len(self._frames),
+            "max_seconds": self.max_seconds,
+            "max_bytes": self.max_bytes,
+            "avg_append_us": round(self._append_time / self._appended * 1e6, 1) if self._appended else 0.0
+        }
+
+class VideoPipeline:
+    """Always-on H.264 encoder feeding the pre-event buffer.
+
+    When a recording starts, the buffered frames are written first and the live
+    encoder output is appended to the same sink, so the clip includes the
+    seconds before the trigger and never waits for encoder startup.
+    """
+
+    def __init__(self, prebuffer):
+        self.prebuffer = prebuffer
+        self._lock = threading.Lock()
+        self._sink = None
+        self._backlog = None  # live frames held back while start_recording() writes the prebuffer
+        self._encoder = None
+
+    def start(self):
+        from picamera2.encoders import H264Encoder
+        from picamera2.outputs import Output
+
+        pipeline = self
+
+        class _Tap(Output):
+            def outputframe(self, frame, keyframe=True, timestamp=None, *args, **kwargs):
+                pipeline.on_frame(frame, keyframe)
+
+        # repeat=True puts SPS/PPS headers on every keyframe so any GOP is a valid start
+        self._encoder = H264Encoder(bitrate=VIDEO_BITRATE, repeat=True, iperiod=camera.framerate,
+                                    profile=VIDEO_PROFILE)
+        camera.pc2.start_encoder(self._encoder, _Tap())
+
+    def on_frame(self, frame, keyframe):
+        data = bytes(frame)
+        now = time.monotonic()
+        with self._lock:
+            self.prebuffer.append(data, keyframe, now)
+            if self._backlog is not None:
+                self._backlog.append((now, keyframe, data))
+            elif self._sink:
+                self._sink.write(data, keyframe, now)
+
+    def start_recording(self, sink):
+        """Attach sink: the prebuffer first, then live frames, in order.
+
+        Writing up to PREBUFFER_MAX_MB takes a while, so it happens outside
+        the lock; frames arriving meanwhile are held back and written after
+        it, and the encoder callback never waits on the disk.
+        """
+        with self._lock:
+            frames = self.prebuffer.snapshot()
+            self._backlog = []
+            self._sink = sink
+        while True:
+            for ts, keyframe, data in frames:
+                sink.write(data, keyframe, ts)
+            with self._lock:
+                if not self._backlog:
+                    self._backlog = None  # Caught up: on_frame writes straight to the sink again
+                    return
+                frames, self._backlog = self._backlog, []
+
+    def stop_recording(self):
+        with self._lock:
+            sink, self._sink = self._sink, None
+        if sink:
+            sink.close()
+
+video_pipeline = None  # started by init_camera() when PREBUFFER_SECONDS > 0
+
+def init_camera():
+    """Boot stage: open the camera and start the pre-event encoder.
+
+    picamzero and the sensor take seconds to come up on a Pi, so this runs
+    on its own thread after the help button is armed; record_video waits on
+    camera_ready if a press gets there first.
+    """
+    global camera, video_pipeline
+    try:
+        if IS_RPI:
+            from picamzero import Camera
+            opened = Camera()
+            opened.resolution = (1280, 720)
+            opened.framerate = 24
+            camera = opened
+            if PREBUFFER_SECONDS > 0:
+                pipeline = VideoPipeline(PreEventBuffer(PREBUFFER_SECONDS, PREBUFFER_MAX_BYTES))
+                pipeline.start()
+                video_pipeline = pipeline
+    except Exception as e:
+        print("❌ Camera init failed:", e)
+    finally:
+        camera_ready.set()
+        boot_profile.mark("camera")
+
+def mux_to_mp4(raw_path, mp4_path, framerate=None):
+    """Wrap a raw H.264 stream in a faststart MP4 without re-encoding"""
+    subprocess.run(
+        ["ffmpeg", "-y", "-loglevel", "error", "-framerate", str(framerate or camera.framerate),
+         "-i", raw_path, "-c", "copy", "-movflags", "+faststart", mp4_path],
+        check=True, capture_output=True, timeout=120
+    )
+    os.remove(raw_path)
+
+def faststart_mp4(path):
+    """Move an MP4's index in front of its media data (stream copy, in place)"""
+    tmp = path[:-len(".mp4")] + ".faststart.mp4"
+    subprocess.run(
+        ["ffmpeg", "-y", "-loglevel", "error", "-i", path, "-c", "copy", "-movflags", "+faststart", tmp],
+        check=True, capture_output=True, timeout=120
+    )
+    os.replace(tmp, path)
+
+class SegmentedRecording:
+    """One recording session split into N-second MP4 segments.
+
+    Encoder output is cut at the first keyframe after each segment boundary.
+    Every finished segment is muxed and queued for upload straight away while
+    the next one is still being captured, and a JSON manifest describing the
+    segments is kept next to them so the server can stitch the clip together.
+    """
+
+    def __init__(self, session_id, segment_seconds=SEGMENT_SECONDS, priority=PRIORITY_ROUTINE, incident_id=None):
+        self.session_id = session_id
+        self.segment_seconds = segment_seconds
+        self.priority = priority
+        self._priority_lock = threading.Lock()  # queueing a file vs escalate()
+        self.incident_id = incident_id
+        self.segments = []
+        self.started_at = int(time.time())
+        self._finished = queue.Queue()
+        self._recorded = queue.Queue()
+        self._publisher = None
+        self._file = None
+        self._index = 0
+        self._first_ts = None
+        self._last_ts = None
+
+    @property
+    def segmented(self):
+        return self.segment_seconds > 0
+
+    def segment_path(self, index, ext=".mp4"):
+        if not self.segmented:
+            return os.path.join(VIDEOS_DIR, f"{self.session_id}{ext}")
+        return os.path.join(VIDEOS_DIR, f"{self.session_id}_seg{index:03d}{ext}")
+
+    @property
+    def manifest_path(self):
+        return os.path.join(VIDEOS_DIR, f"{self.session_id}.manifest.json")
+
+    # Encoder sink interface (called from the encoder thread)
+
+    def write(self, data, keyframe, ts):
+        if self._file and keyframe and self.segmented and ts - self._first_ts >= self.segment_seconds:
+            self._close_segment()
+        if self._file is None:
+            if not keyframe:
+                return
+            self._file = open(self.segment_path(self._index, ".h264"), "wb")
+            self._first_ts = ts
+        self._file.write(data)
+        self._last_ts = ts
 
-app = Flask(__name__)
-CORS(app)
+    def close(self):
+        if self._file:
+            self._close_segment()
 
-# ---------------- CAMERA ---------------- #
+    def _close_segment(self):
+        self._file.close()
+        self._finished.put((self._index, self._file.name, self._last_ts - self._first_ts))
+        self._file = None
+        self._index += 1
 
-if IS_RPI:
-    camera = Camera()
-    camera.resolution = (1280, 720)
-    camera.framerate = 24
-else:
-    camera = None
+    # Recording thread
 
-recording_lock = threading.Lock()
-is_recording = False
+    def run_until(self, deadline):
+        """Mux and queue finished segments as they arrive until the deadline"""
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if recording_stop.is_set():
+                return
+            try:
+                index, raw_path, seconds = self._finished.get(timeout=min(remaining, 0.5))
+            except queue.Empty:
+                continue
+            self._publish_raw(index, raw_path, seconds)
 
-def preview_loop():
-    while True:
+    def _publish_raw(self, index, raw_path, seconds):
+        path = self.segment_path(index)
         try:
-            if camera:
-                camera.capture_image(PREVIEW_FILE)
-            else:
-                # Create a dummy image for demo
-                with open(PREVIEW_FILE, "wb") as f:
-                    f.write(b"dummy image data")
+            mux_to_mp4(raw_path, path)
         except Exception as e:
-            print("Preview error:", e)
-        time.sleep(0.15)
+            # Keep the raw stream rather than lose the evidence
+            print("❌ MP4 mux failed, keeping raw H.264:", e)
+            path = raw_path
+        self.add_segment(path, seconds)
 
-def record_video(duration=120):
-    global is_recording
+    def publish_recorded(self, path, seconds):
+        """Remux and queue an MP4 the camera wrote itself, off the capture thread.
+
+        The faststart remux takes a while, and the next segment shouldn't
+        wait for it to start capturing.
+        """
+        if self._publisher is None:
+            self._publisher = threading.Thread(target=self._publish_recorded_loop, daemon=True)
+            self._publisher.start()
+        self._recorded.put((path, seconds))
+
+    def _publish_recorded_loop(self):
+        while True:
+            item = self._recorded.get()
+            if item is None:
+                return
+            path, seconds = item
+            try:
+                faststart_mp4(path)
+            except Exception as e:
+                print("⚠️ Faststart remux failed, uploading as recorded:", e)
+            try:
+                self.add_segment(path, seconds)
+            except Exception as e:
+                print("❌ Segment publish error:", e)
+
+    def add_segment(self, path, seconds):
+        index = len(self.segments)
+        size = os.path.getsize(path)
+        self.segments.append({
+            "index": index,
+            "filename": os.path.basename(path),
+            "duration": round(seconds, 2),
+            "size": size
+        })
+        retention.consume(self.session_id, size)
+        print("✅ Saved:", os.path.basename(path))
+        incidents.record(self.incident_id, "segment_saved", os.path.basename(path))
+        fields = {"incident_id": self.incident_id} if self.incident_id else {}
+        if self.segmented:
+            self.write_manifest(complete=False)
+            fields.update(session_id=self.session_id, segment_index=index)
+        recording_catalog.add(path, round(seconds, 2), fields)
+        with self._priority_lock:
+            upload_queue.put(path, fields, self.priority)
+
+    def escalate(self):
+        """Make this an SOS recording: files already queued and those still to come upload first,
+        and retention keeps them until they have; returns False if it already was one"""
+        with self._priority_lock:
+            if self.priority == PRIORITY_SOS:
+                return False
+            self.priority = PRIORITY_SOS
+            paths = [os.path.join(VIDEOS_DIR, segment["filename"]) for segment in self.segments]
+            upload_queue.raise_priority(paths + [self.manifest_path], PRIORITY_SOS)
+        return True
+
+    def write_manifest(self, complete):
+        manifest = {
+            "session_id": self.session_id,
+            "incident_id": self.incident_id,
+            "device_id": DEVICE_ID,
+            "started_at": self.started_at,
+            "segment_seconds": self.segment_seconds,
+            "complete": complete,
+            "segments": self.segments
+        }
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self.manifest_path)
+
+    def finish(self):
+        """Flush the remaining segments and queue the final manifest"""
+        self.close()
+        if self._publisher:
+            self._recorded.put(None)
+            self._publisher.join()
+        while not self._finished.empty():
+            self._publish_raw(*self._finished.get())
+        if self.segmented and self.segments:
+            self.write_manifest(complete=True)
+            fields = {"session_id": self.session_id}
+            if self.incident_id:
+                fields["incident_id"] = self.incident_id
+            with self._priority_lock:
+                upload_queue.put(self.manifest_path, fields, self.priority)
+
+def new_session_id():
+    """video_<timestamp>, with _2, _3... when a session from the same second already has files"""
+    base = f"video_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    taken = {name.split(".")[0] for name in os.listdir(VIDEOS_DIR) if name.startswith(base)}
+    session_id, n = base, 1
+    while session_id in taken or f"{session_id}_seg000" in taken:
+        n += 1
+        session_id = f"{base}_{n}"
+    return session_id
+
+def record_video(duration=120, priority=PRIORITY_ROUTINE, pressed_at=None, incident_id=None):
+    global recording_incident, current_recording
     with recording_lock:
         if is_recording:
+            running = escalate_recording(incident_id, pressed_at) if priority == PRIORITY_SOS else None
+            incidents.record(incident_id, "ignored", f"already recording {running}" if running else "already recording")
             return
-        is_recording = True
-        led.on()
+        recording_stop.clear()
+        # Under the lock, so back-to-back recordings in one second get different sessions
+        session_id = new_session_id()
+        recording = SegmentedRecording(session_id, priority=priority, incident_id=incident_id)
+        recording_incident = incident_id
+        current_recording = recording
+        set_recording(True)
+    location_tracker.mark_active()
+
+    retention.reserve(session_id, expected_recording_bytes(duration))
+    recording_started = time.monotonic()
 
-    filename = f"video_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4"
-    filepath = os.path.join(VIDEOS_DIR, filename)
+    capture_started = False
+
+    def mark_started():
+        nonlocal capture_started
+        if capture_started:
+            return
+        capture_started = True
+        incidents.record(incident_id, "recording_started", session_id)
+        if pressed_at is not None:
+            latency = time.monotonic() - pressed_at
+            press_latency.add(latency)
+            press_to_record_seconds.observe(latency)
 
     try:
-        print("🎥 Recording:", filename)
-        if camera:
-            camera.start_recording(filepath)
-            time.sleep(duration)
-            camera.stop_recording()
+        if not camera_ready.is_set():
+            incidents.record(incident_id, "camera_wait", "camera still starting")
+            camera_ready.wait(CAMERA_START_TIMEOUT)
+        if IS_RPI and not camera:
+            raise RuntimeError("camera not available")
+        print("🎥 Recording:", session_id)
+        if video_pipeline:
+            video_pipeline.start_recording(recording)
+            try:
+                mark_started()
+                recording.run_until(time.monotonic() + duration)
+            finally:
+                # Always detach, or the encoder keeps writing segments until restart
+                video_pipeline.stop_recording()
         else:
-            # Simulate recording
-            time.sleep(duration)
-            with open(filepath, "w") as f:
-                f.write("dummy video")
-        print("✅ Saved:", filename)
-
-        # Queue for upload
-        upload_queue.append(filepath)
+            step = recording.segment_seconds if recording.segmented else duration
+            elapsed = 0
+            index = 0
+            while elapsed < duration and not recording_stop.is_set():
+                path = recording.segment_path(index)
+                started = time.monotonic()
+                if camera:
+                    camera.start_recording(path)
+                    mark_started()
+                    recording_stop.wait(min(step, duration - elapsed))
+                    camera.stop_recording()
+                    seconds = time.monotonic() - started
+                    # Remuxed in the background so the next segment starts right away
+                    recording.publish_recorded(path, seconds)
+                else:
+                    # Simulate recording
+                    mark_started()
+                    recording_stop.wait(min(step, duration - elapsed))
+                    with open(path, "w") as f:
+                        f.write("dummy video")
+                    seconds = time.monotonic() - started
+                    recording.add_segment(path, seconds)
+                elapsed += seconds
+                index += 1
 
     except Exception as e:
         print("❌ Recording error:", e)
     finally:
-        is_recording = False
-        led.off()
+        try:
+            recording.finish()
+        except Exception as e:
+            print("❌ Recording finalize error:", e)
+        recording_seconds.observe(time.monotonic() - recording_started,
+                                  priority="sos" if recording.priority == PRIORITY_SOS else "routine")
+        incidents.record(incident_id, "recording_finished", f"{len(recording.segments)} segments")
+        retention.release(session_id)
+        recording_incident = None
+        if current_recording is recording:
+            current_recording = None
+        set_recording(False)
+        for segment in recording.segments:
+            thumbnails.submit(os.path.join(VIDEOS_DIR, segment["filename"]))
+
+# ---------------- THUMBNAILS ---------------- #
+
+class ThumbnailWorker:
+    """Bounded background pool rendering a poster frame and a sprite strip per clip.
+
+    Jobs wait until no recording is running and ffmpeg runs under nice/ionice
+    with one thread, so thumbnailing only takes CPU and I/O that live capture
+    leaves idle. Results are cached under THUMBS_DIR and stay valid while they
+    are newer than their clip. When the queue is full the job is dropped;
+    /videos/<name>/thumb submits it again on demand.
+    """
+
+    def __init__(self, directory, workers=THUMB_WORKERS, maxsize=THUMB_QUEUE_MAX):
+        self.directory = directory
+        self.workers = workers
+        self._queue = queue.Queue(maxsize)
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._failed = {}  # path -> mtime of the clip ffmpeg could not read
+        self.rendered = 0
+
+    def poster_path(self, name):
+        return os.path.join(self.directory, f"{name}.jpg")
+
+    def sprite_path(self, name):
+        return os.path.join(self.directory, f"{name}.sprite.jpg")
+
+    def cached(self, path):
+        """True when both images exist and are newer than the clip"""
+        name = os.path.basename(path)
+        try:
+            mtime = os.path.getmtime(path)
+            return all(os.path.getmtime(p) >= mtime for p in (self.poster_path(name), self.sprite_path(name)))
+        except OSError:
+            return False
+
+    def submit(self, path):
+        """Queue a clip without blocking; False when it cannot or need not be rendered now"""
+        if not THUMBNAILS_ENABLED or not path.endswith(".mp4") or self.cached(path):
+            return False
+        with self._lock:
+            try:
+                if path in self._pending or self._failed.get(path) == os.path.getmtime(path):
+                    return False
+            except OSError:
+                return False
+            try:
+                self._queue.put_nowait(path)
+            except queue.Full:
+                return False
+            self._pending.add(path)
+        return True
+
+    @property
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def is_pending(self, path):
+        """True while a render for path is queued or running"""
+        with self._lock:
+            return path in self._pending
+
+    def start(self):
+        for _ in range(self.workers):
+            threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            path = self._queue.get()
+            with recording_changed:
+                recording_changed.wait_for(lambda: not is_recording)
+            try:
+                self.render(path)
+                self.rendered += 1
+                self.queue_uploads(path)
+            except Exception as e:
+                print("❌ Thumbnail failed:", os.path.basename(path), e)
+                with self._lock:
+                    try:
+                        self._failed[path] = os.path.getmtime(path)
+                    except OSError:
+                        pass
+            finally:
+                with self._lock:
+                    self._pending.discard(path)
+
+    def render(self, path):
+        name = os.path.basename(path)
+        os.makedirs(self.directory, exist_ok=True)
+        duration = recording_duration(path) or SEGMENT_SECONDS or 1
+        self._ffmpeg(["-ss", f"{min(1.0, duration / 2):.2f}", "-i", path, "-frames:v", "1",
+                      "-vf", f"scale={THUMB_WIDTH}:-2", "-q:v", "5"], self.poster_path(name))
+        self._ffmpeg(["-i", path, "-frames:v", "1",
+                      "-vf", f"fps={SPRITE_FRAMES / duration:.4f},scale={SPRITE_WIDTH}:-2,tile={SPRITE_FRAMES}x1",
+                      "-q:v", "7"], self.sprite_path(name))
+
+    def _ffmpeg(self, args, out):
+        # Render to a temporary name so the route never serves a half-written image
+        tmp = out[:-len(".jpg")] + ".part.jpg"
+        subprocess.run(
+            LOW_PRIORITY + ["ffmpeg", "-y", "-loglevel", "error", "-threads", "1"] + args + [tmp],
+            check=True, capture_output=True, timeout=60
+        )
+        os.replace(tmp, out)
+
+    def queue_uploads(self, path):
+        """Queue the images once the clip itself is in the cloud (whichever finishes last calls this)"""
+        status = upload_queue.status(path)
+        if not status or status[0] != "done":
+            return
+        name = os.path.basename(path)
+        for kind, image in (("poster", self.poster_path(name)), ("sprite", self.sprite_path(name))):
+            if os.path.exists(image) and upload_queue.status(image) is None:
+                upload_queue.put(image, {"thumbnail_for": name, "thumbnail_kind": kind})
+
+def recording_duration(path):
+    row = recording_catalog.get(os.path.basename(path))
+    if row and row.get("duration"):
+        return row["duration"]
+    return mp4_duration(path)
+
+LOW_PRIORITY = ["nice", "-n", "19"] + (["ionice", "-c", "3"] if shutil.which("ionice") else [])
+
+thumbnails = ThumbnailWorker(THUMBS_DIR)
 
 # ---------------- LOCATION & SYNC ---------------- #
 
-def get_location():
+def lookup_location():
     if DEMO_MODE:
         return {
             "latitude": 37.7397,  # Tracy, CA
@@ -145,6 +2269,7 @@ def get_location():
         }
 
     try:
+        import geocoder  # slow to import, so not on the boot path
         g = geocoder.ip("me")
         if g.ok and g.latlng:
             return {
@@ -156,56 +2281,184 @@ def get_location():
     except:
         pass
 
-    return {
-        "latitude": 0.0,
-        "longitude": 0.0,
-        "method": "fallback",
-        "timestamp": int(time.time())
-    }
+    # The cache keeps the last good location and backs off before trying again
+    return None
+
+LOCATION_FALLBACK = {"latitude": 0.0, "longitude": 0.0, "method": "fallback"}
+
+location_cache = CachedValue("location", lookup_location, LOCATION_CACHE_TTL, stale_ttl=3600,
+                             fallback=LOCATION_FALLBACK)
+
+def get_location():
+    """Current location from the cache; never waits on the network (the fallback until the first fix)"""
+    return {**location_cache.get(), "timestamp": int(time.time())}
+
+class LocationTracker:
+    """Buffers location samples on disk and syncs them in batches.
+
+    Points that can't be sent (no network, server error) stay in a local
+    SQLite buffer and go out with the next flush instead of being dropped.
+    Sampling is tight while a recording is running or shortly after one
+    started, and sparse when the device is idle.
+    """
+
+    def __init__(self, db_path, device=None):
+        self.device = device or this_device
+        self._lock = threading.Lock()
+        # One flush at a time: a second one would read and send the same unsent points
+        self._flush_lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS points (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                latitude REAL NOT NULL,
+                longitude REAL NOT NULL,
+                timestamp INTEGER NOT NULL,
+                method TEXT NOT NULL
+            )
+        """)
+        self._db.commit()
+        self._wake = threading.Event()
+        self._flush_now = False
+        self._active_until = 0.0
+        self._last_fix = None
+
+    @property
+    def active(self):
+        return is_recording or time.monotonic() < self._active_until
+
+    @property
+    def interval(self):
+        return LOCATION_ACTIVE_INTERVAL if self.active else LOCATION_IDLE_INTERVAL
+
+    def mark_active(self):
+        """Switch to the tight cadence now (called when a recording starts)"""
+        self._active_until = time.monotonic() + LOCATION_ACTIVE_WINDOW
+        self._flush_now = True
+        self._wake.set()
+
+    def sample(self, loc=None):
+        """Buffer loc, or a location fix no older than the sampling interval.
+
+        The fix keeps the time it was looked up (get_location() restamps the
+        cached one), and a fix that was already buffered is skipped, so the
+        trail only holds real observations.
+        """
+        loc = loc or location_cache.get_fresh(self.interval)
+        if not loc or (loc["latitude"] == 0.0 and loc["longitude"] == 0.0):
+            return
+        fix = (loc["latitude"], loc["longitude"], loc["timestamp"])
+        with self._lock:
+            if fix == self._last_fix:
+                return
+            self._last_fix = fix
+            self._db.execute(
+                "INSERT INTO points (latitude, longitude, timestamp, method) VALUES (?, ?, ?, ?)",
+                (loc["latitude"], loc["longitude"], loc["timestamp"], loc["method"])
+            )
+            # Bounded: drop the oldest points if we've been offline for a very long time
+            self._db.execute(
+                "DELETE FROM points WHERE id <= (SELECT MAX(id) FROM points) - ?", (LOCATION_BUFFER_MAX,)
+            )
+            self._db.commit()
+
+    def pending_count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM points").fetchone()[0]
+
+    def flush(self):
+        """Send buffered points in batches; returns how many were synced.
+
+        Concurrent callers take turns, so each point goes out once: a flush
+        that waited finds the points the previous one sent already gone.
+        """
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self):
+        synced = 0
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT id, latitude, longitude, timestamp, method FROM points ORDER BY id LIMIT ?",
+                    (LOCATION_BATCH_SIZE,)
+                ).fetchall()
+            if not rows:
+                return synced
+            data = {
+                "user_id": self.device.user_id,
+                "device_id": self.device.device_id,
+                "points": [
+                    {"latitude": lat, "longitude": lng, "timestamp": ts, "method": method}
+                    for _, lat, lng, ts, method in rows
+                ]
+            }
+            try:
+                response = self.device.client.post(f"{self.device.base_url}/api/location/sync",
+                                                   endpoint="location_sync", json_body=data, gzip_body=SYNC_GZIP)
+            except Exception as e:
+                print("❌ Location sync failed, keeping points for later:", e)
+                return synced
+            if response.status_code != 200:
+                print("Location sync failed, keeping points for later:", response.text)
+                return synced
+            with self._lock:
+                self._db.execute("DELETE FROM points WHERE id <= ?", (rows[-1][0],))
+                self._db.commit()
+            synced += len(rows)
+
+    def run(self):
+        next_flush = 0.0
+        while True:
+            try:
+                self.sample()
+                now = time.monotonic()
+                if self._flush_now or now >= next_flush:
+                    self._flush_now = False
+                    if self.flush():
+                        print("Location synced")
+                    next_flush = now + (LOCATION_ACTIVE_FLUSH if self.active else LOCATION_IDLE_INTERVAL)
+            except Exception as e:
+                print("❌ Location tracking error:", e)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+location_tracker = LocationTracker(os.path.join(VIDEOS_DIR, "locations.db"))
 
 def sync_location():
-    """Sync current location via API"""
+    """Sample the current location and sync everything buffered"""
     if not sync_enabled:
         return
 
     try:
-        loc = get_location()
-        if loc["latitude"] != 0.0 or loc["longitude"] != 0.0:
-            data = {
-                "user_id": USER_ID,
-                "device_id": DEVICE_ID,
-                "latitude": loc["latitude"],
-                "longitude": loc["longitude"],
-                "timestamp": loc["timestamp"],
-                "method": loc["method"]
-            }
-            response = requests.post(f"{SYNC_BASE_URL}/api/location/sync", json=data)
-            if response.status_code == 200:
-                print("Location synced")
-            else:
-                print("Location sync failed:", response.text)
+        location_tracker.sample()
+        if location_tracker.flush():
+            print("Location synced")
     except Exception as e:
         print("❌ Location sync failed:", e)
 
+def post_device_status(device, location, ip):
+    """Send one status update for device to /api/devices/sync and return the response"""
+    data = {
+        "user_id": device.user_id,
+        "device_id": device.device_id,
+        "name": f"Raspberry Pi ({device.device_id})",
+        "type": "rpi",
+        "is_online": True,
+        "location": location,
+        "ip_address": ip,
+        "port": PORT
+    }
+    return device.client.post(f"{device.base_url}/api/devices/sync", endpoint="device_sync",
+                              json_body=data, gzip_body=SYNC_GZIP)
+
 def sync_device_status():
     """Update device status via API"""
     if not sync_enabled:
         return
 
     try:
-        loc = get_location()
-        ip = get_local_ip()
-        data = {
-            "user_id": USER_ID,
-            "device_id": DEVICE_ID,
-            "name": f"Raspberry Pi ({DEVICE_ID})",
-            "type": "rpi",
-            "is_online": True,
-            "location": loc,
-            "ip_address": ip,
-            "port": PORT
-        }
-        response = requests.post(f"{SYNC_BASE_URL}/api/devices/sync", json=data)
+        response = post_device_status(this_device, get_location(), get_local_ip())
         if response.status_code == 200:
             print("Device status synced")
         else:
@@ -213,56 +2466,269 @@ def sync_device_status():
     except Exception as e:
         print("❌ Device sync failed:", e)
 
+def upload_content_type(path):
+    if path.endswith(".json"):
+        return "application/json"
+    if path.endswith(".h264"):
+        return "video/h264"
+    if path.endswith(".jpg"):
+        return "image/jpeg"
+    return "video/mp4"
+
+class UploadError(Exception):
+    pass
+
+class ChunkedUploadUnsupported(UploadError):
+    """The server has no resumable upload endpoint; fall back to a single POST"""
+
+def upload_single(path, fields, device=None):
+    """Post the whole file as one multipart request and return its cloud URL"""
+    device = device or this_device
+    with open(path, 'rb') as f:
+        files = {'file': (os.path.basename(path), f, upload_content_type(path))}
+        data = {'device_id': device.device_id, **fields}
+        if device.user_id:
+            data['user_id'] = device.user_id
+        response = device.client.post(device.upload_url, endpoint="upload", files=files, data=data)
+    if response.status_code != 200:
+        raise UploadError(f"HTTP {response.status_code}: {response.text[:200]}")
+    return response.json()['url']
+
+def upload_state_path(path):
+    return path + ".upload.json"
+
+def load_upload_state(path):
+    try:
+        with open(upload_state_path(path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_upload_state(path, state):
+    tmp = upload_state_path(path) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, upload_state_path(path))
+
+def clear_upload_state(path):
+    try:
+        os.remove(upload_state_path(path))
+    except OSError:
+        pass
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def upload_resumable(path, fields, chunk_size=None, device=None):
+    """Upload a file in checksummed chunks, resuming from the last acknowledged byte.
+
+    Progress is kept in a <file>.upload.json sidecar, so a retry after a
+    dropped connection or a reboot continues where the server left off
+    instead of starting from byte zero. Returns the cloud URL.
+    """
+    chunk_size = chunk_size or UPLOAD_CHUNK_SIZE
+    device = device or this_device
+    client = device.client
+    size = os.path.getsize(path)
+    state = load_upload_state(path)
+
+    if state and state.get("size") == size:
+        # The server is authoritative for how much it already has
+        response = client.get(f"{device.sessions_url}/{state['upload_id']}", endpoint="upload_session_status")
+        if response.status_code == 404:
+            clear_upload_state(path)
+            raise UploadError("upload session expired")
+        if response.status_code != 200:
+            raise UploadError(f"HTTP {response.status_code}: {response.text[:200]}")
+        result = response.json()
+        if result.get("url"):
+            clear_upload_state(path)
+            return result["url"]
+        state["offset"] = result["offset"]
+    else:
+        body = {
+            "filename": os.path.basename(path),
+            "size": size,
+            "sha256": file_sha256(path),
+            "content_type": upload_content_type(path),
+            "device_id": device.device_id,
+            "user_id": device.user_id,
+            "fields": fields
+        }
+        response = client.post(device.sessions_url, endpoint="upload_session_create", json_body=body)
+        if response.status_code in (404, 405):
+            raise ChunkedUploadUnsupported()
+        if response.status_code != 200:
+            raise UploadError(f"HTTP {response.status_code}: {response.text[:200]}")
+        result = response.json()
+        state = {"upload_id": result["upload_id"], "size": size, "offset": result.get("offset", 0)}
+    save_upload_state(path, state)
+
+    url = f"{device.sessions_url}/{state['upload_id']}"
+    with open(path, "rb") as f:
+        while True:
+            offset = state["offset"]
+            f.seek(offset)
+            chunk = f.read(chunk_size)
+            if chunk:
+                content_range = f"bytes {offset}-{offset + len(chunk) - 1}/{size}"
+            else:
+                # Everything is there but finalizing failed last time; ask again
+                content_range = f"bytes */{size}"
+            headers = {
+                "Content-Range": content_range,
+                "X-Chunk-SHA256": hashlib.sha256(chunk).hexdigest(),
+                "Content-Type": "application/octet-stream"
+            }
+            response = client.put(url, endpoint="upload_chunk", data=chunk, headers=headers)
+            if response.status_code == 409:
+                # Offset mismatch: resync with the server and carry on
+                state["offset"] = response.json()["offset"]
+                save_upload_state(path, state)
+                continue
+            if response.status_code != 200:
+                raise UploadError(f"HTTP {response.status_code}: {response.text[:200]}")
+            result = response.json()
+            if result.get("url"):
+                clear_upload_state(path)
+                return result["url"]
+            if not chunk:
+                raise UploadError("server did not finalize the upload")
+            state["offset"] = result["offset"]
+            save_upload_state(path, state)
+
+def upload_media_fields(path):
+    """Codec and layout declared with an MP4 upload so ingest can store it without transcoding"""
+    info = mp4_media_info(path) if path.endswith(".mp4") else None
+    if not info or not info["codec"]:
+        return {}
+    return {"codec": info["codec"], "faststart": "true" if info["faststart"] else "false"}
+
+def upload_file(path, fields, device=None):
+    fields = {**fields, **upload_media_fields(path)}
+    # Anything that fits in one chunk (manifests, thumbnails) costs a single request
+    if UPLOAD_CHUNKED and os.path.getsize(path) > UPLOAD_CHUNK_SIZE:
+        try:
+            return upload_resumable(path, fields, device=device)
+        except ChunkedUploadUnsupported:
+            pass
+    return upload_single(path, fields, device=device)
+
 def upload_worker():
-    """Background thread to retry uploads"""
+    """Background thread: upload queued files, backing off per item on failure"""
     while True:
-        if upload_queue:
-            path = upload_queue[0]
-            try:
-                with open(path, 'rb') as f:
-                    files = {'file': (os.path.basename(path), f, 'video/mp4')}
-                    data = {'device_id': DEVICE_ID}
-                    if USER_ID:
-                        data['user_id'] = USER_ID
-                    response = requests.post(UPLOAD_URL, files=files, data=data, timeout=15)
-                if response.status_code == 200:
-                    data = response.json()
-                    video_url = data['url']
-                    print("☁️ Uploaded:", path)
-                    upload_queue.popleft()
-                else:
-                    print("Upload failed, retrying:", response.text)
-                    time.sleep(5)
-            except Exception as e:
-                print("Upload error, retrying:", e)
-                time.sleep(5)
-        else:
-            time.sleep(1)
+        path, fields = upload_queue.claim()
+        if not os.path.exists(path):
+            print("Upload skipped, file is gone:", path)
+            upload_queue.forget(path)
+            continue
+        incident_id = fields.get("incident_id")
+        name = os.path.basename(path)
+        incidents.record(incident_id, "upload_started", name)
+        recording_catalog.set_upload_state(path, "uploading")
+        try:
+            started = time.perf_counter()
+            with status_led.uploading():
+                video_url = upload_file(path, fields)
+            elapsed = time.perf_counter() - started
+            size = os.path.getsize(path)
+            upload_queue.complete(path, video_url)
+            upload_results.inc(result="ok")
+            upload_seconds.observe(elapsed)
+            upload_bytes.inc(size)
+            upload_bytes_per_second.set(round(size / max(elapsed, 1e-6)))
+            incidents.record(incident_id, "upload_done", name)
+            recording_catalog.set_upload_state(path, "uploaded", video_url)
+            if path.endswith(".manifest.json") or "session_id" not in fields:
+                # The whole recording is in the cloud now
+                incidents.record(incident_id, "delivered", video_url)
+            if path.endswith(".mp4"):
+                thumbnails.queue_uploads(path)
+            print("☁️ Uploaded:", path)
+        except Exception as e:
+            upload_results.inc(result="retry")
+            incidents.record(incident_id, "upload_failed", f"{name}: {e}")
+            recording_catalog.set_upload_state(path, "retrying")
+            delay = upload_queue.fail(path, e)
+            print(f"Upload error, retrying in {delay:.0f}s:", e)
 
-def scan_wifi():
-    """Scan for nearby WiFi networks"""
-    try:
-        result = subprocess.run(['sudo', 'iwlist', 'wlan0', 'scan'], capture_output=True, text=True, timeout=10)
-        networks = []
-        current = {}
-        for line in result.stdout.split('\n'):
-            line = line.strip()
-            if line.startswith('Cell '):
-                if current:
-                    networks.append(current)
-                current = {}
-            elif 'Address:' in line:
-                current['mac'] = line.split()[-1]
-            elif 'ESSID:' in line:
-                current['ssid'] = line.split('"')[1] if '"' in line else ''
-            elif 'Encryption key:' in line:
-                current['encrypted'] = 'on' in line
-        if current:
+def parse_iw_scan(output):
+    """Networks from `iw dev <if> scan` output (nl80211)"""
+    networks = []
+    current = None
+    for line in output.splitlines():
+        if line.startswith("BSS "):
+            current = {"mac": line[4:21], "ssid": "", "encrypted": False}
             networks.append(current)
-        return networks
+        elif current is not None and line.startswith("\t") and not line.startswith("\t\t"):
+            key, _, value = line.strip().partition(":")
+            value = value.strip()
+            if key == "SSID":
+                current["ssid"] = value
+            elif key == "signal":
+                current["signal"] = float(value.split()[0])
+            elif key == "freq":
+                current["freq"] = int(float(value))
+            elif key == "capability":
+                current["encrypted"] = "Privacy" in value
+    return networks
+
+def parse_iwlist_scan(output):
+    networks = []
+    current = {}
+    for line in output.split('\n'):
+        line = line.strip()
+        if line.startswith('Cell '):
+            if current:
+                networks.append(current)
+            current = {}
+            if 'Address:' in line:
+                current['mac'] = line.split()[-1]
+        elif 'ESSID:' in line:
+            current['ssid'] = line.split('"')[1] if '"' in line else ''
+        elif 'Encryption key:' in line:
+            current['encrypted'] = line.endswith(':on')
+    if current:
+        networks.append(current)
+    return networks
+
+def scan_wifi(trigger=True):
+    """Scan for nearby WiFi networks; None if the scan failed.
+
+    Uses `iw` (nl80211) where installed and falls back to iwlist. With
+    trigger=False only the kernel's results from the last scan (ours or
+    wpa_supplicant's) are read, which keeps the radio on-channel.
+    """
+    try:
+        if shutil.which("iw"):
+            command = ["sudo", "iw", "dev", WIFI_INTERFACE, "scan"] + ([] if trigger else ["dump"])
+            result = subprocess.run(command, capture_output=True, text=True, timeout=10, check=True)
+            return parse_iw_scan(result.stdout)
+        if not trigger:
+            return None
+        result = subprocess.run(['sudo', 'iwlist', WIFI_INTERFACE, 'scan'], capture_output=True, text=True,
+                                timeout=10, check=True)
+        return parse_iwlist_scan(result.stdout)
     except Exception as e:
         print("WiFi scan error:", e)
-        return []
+        return None
+
+def wifi_busy():
+    # A scan takes the radio off-channel for seconds, stalling streams and uploads
+    return is_recording or upload_queue.active_count() > 0 or stream_tiers.viewers > 0
+
+def load_wifi_networks():
+    if wifi_busy():
+        networks = scan_wifi(trigger=False)
+        if networks:
+            return networks
+    return scan_wifi()
+
+wifi_scans = CachedValue("WiFi scan", load_wifi_networks, WIFI_SCAN_TTL, stale_ttl=WIFI_SCAN_INTERVAL * 10)
 
 def connect_wifi(ssid, password=None):
     """Connect to WiFi network"""
@@ -292,9 +2758,12 @@ def scan_devices():
         return []
 
 def wifi_manager():
-    """Background thread for WiFi management"""
+    """Background thread for WiFi management; scans are skipped while the device is busy"""
     while True:
-        networks = scan_wifi()
+        time.sleep(WIFI_SCAN_INTERVAL)
+        if wifi_busy():
+            continue
+        networks = wifi_scans.refresh() or []
         print(f"Found {len(networks)} WiFi networks")
         for net in networks:
             if not net.get('encrypted', True):  # Connect to open networks
@@ -304,32 +2773,272 @@ def wifi_manager():
                     print(f"Found {len(devices)} devices on network")
                     # Here, could establish connections or sync
                     break
-        time.sleep(60)  # Scan every minute
 
 def start_sync_loop():
-    """Background thread to sync location and status periodically"""
+    """Background threads to sync location and status periodically"""
     def sync_loop():
         while True:
-            sync_location()
             sync_device_status()
             time.sleep(300)  # Sync every 5 minutes
 
     if sync_enabled:
+        threading.Thread(target=location_tracker.run, daemon=True).start()
         threading.Thread(target=sync_loop, daemon=True).start()
         print("Started sync loop")
 
 # ---------------- LED & BUTTON ---------------- #
 
+class ActionEngine:
+    """Single scheduler thread for all hardware actions.
+
+    GPIO callbacks and HTTP handlers only enqueue work and return. Timed steps
+    (blink phases, LED flashes) sit on a heap until they are due instead
+    of sleeping on a thread, so bursts of presses or commands never pile up
+    threads. Actions must be quick; anything slow starts its own thread.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heap = []
+        self._counter = 0
+        self._stopped = False
+        self._thread = None
+
+    def call_later(self, delay, fn, *args):
+        """Run fn(*args) on the engine thread after delay seconds; returns a handle for cancel()"""
+        with self._cond:
+            self._counter += 1
+            entry = [time.monotonic() + delay, self._counter, fn, args, False]
+            heapq.heappush(self._heap, entry)
+            self._cond.notify()
+        return entry
+
+    def submit(self, fn, *args):
+        return self.call_later(0, fn, *args)
+
+    @staticmethod
+    def cancel(handle):
+        if handle is not None:
+            handle[4] = True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the scheduler thread once the current action returns; pending actions are dropped"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _next(self):
+        with self._cond:
+            while True:
+                if self._stopped:
+                    return None
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                delay = self._heap[0][0] - time.monotonic()
+                if delay <= 0:
+                    return heapq.heappop(self._heap)
+                self._cond.wait(delay)
+
+    def _run(self):
+        while True:
+            entry = self._next()
+            if entry is None:
+                return
+            _, _, fn, args, cancelled = entry
+            if cancelled:
+                continue
+            try:
+                fn(*args)
+            except Exception as e:
+                print("❌ Action error:", e)
+
+# Blink codes: True/False is steady on/off, a tuple alternates on/off durations (seconds)
+LED_PATTERNS = {
+    "flash": True,
+    "recording": True,
+    "offline": (0.15, 0.15, 0.15, 1.55),
+    "uploading": (0.1, 1.9),
+    "idle": False,
+}
+
+class StatusLed:
+    """Drives the LED from device state on the action engine.
+
+    Priority: flash command > recording > offline > uploading > idle. State
+    changes call refresh() from any thread; the pattern is re-evaluated on
+    the engine thread and blink phases are scheduled, never slept through.
+    """
+
+    def __init__(self, led, engine):
+        self.led = led
+        self.engine = engine
+        self._lock = threading.Lock()
+        self._uploading = 0
+        self._flash_until = 0.0
+        self._pattern = None
+        self._timer = None
+
+    def refresh(self):
+        self.engine.submit(self._apply)
+
+    def flash(self, seconds):
+        self.engine.submit(self._flash, seconds)
+
+    @contextmanager
+    def uploading(self):
+        with self._lock:
+            self._uploading += 1
+        self.refresh()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._uploading -= 1
+            self.refresh()
+
+    def current(self):
+        if time.monotonic() < self._flash_until:
+            return "flash"
+        if is_recording:
+            return "recording"
+        if sync_enabled and http_client.online is False:
+            return "offline"
+        if self._uploading:
+            return "uploading"
+        return "idle"
+
+    def _flash(self, seconds):
+        self._flash_until = max(self._flash_until, time.monotonic() + seconds)
+        self.engine.call_later(seconds, self._apply)
+        self._apply()
+
+    def _apply(self):
+        pattern = self.current()
+        if pattern == self._pattern:
+            return
+        self._pattern = pattern
+        self.engine.cancel(self._timer)
+        self._timer = None
+        self._step(pattern, 0)
+
+    def _step(self, pattern, phase):
+        phases = LED_PATTERNS[pattern]
+        if isinstance(phases, bool):
+            self.led.value = phases
+            return
+        self.led.value = phase % 2 == 0
+        self._timer = self.engine.call_later(phases[phase], self._step, pattern, (phase + 1) % len(phases))
+
+class LatencyStats:
+    """Rolling window of latency samples (seconds)"""
+
+    def __init__(self, size=200):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=size)
+        self.count = 0
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def stats(self):
+        with self._lock:
+            samples = sorted(self._samples)
+            last = self._samples[-1] if self._samples else None
+        if not samples:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "last_ms": round(last * 1000, 1),
+            "p50_ms": round(samples[len(samples) // 2] * 1000, 1),
+            "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 1),
+            "max_ms": round(samples[-1] * 1000, 1)
+        }
+
+def start_recording(source, priority=PRIORITY_ROUTINE, pressed_at=None):
+    """Open an incident and start record_video on its own thread; returns the incident ID.
+
+    If a recording is already running, an SOS trigger escalates it and gets
+    its incident ID back; any other trigger gets None (and records nothing).
+    pressed_at, when given, is also counted as press-to-record latency.
+    """
+    if is_recording:
+        return escalate_recording(source, pressed_at) if priority == PRIORITY_SOS else None
+    incident_id = incidents.open(source, pressed_at)
+    kwargs = {"priority": priority, "pressed_at": pressed_at, "incident_id": incident_id}
+    threading.Thread(target=record_video, kwargs=kwargs, daemon=True).start()
+    return incident_id
+
+def escalate_recording(detail, pressed_at=None):
+    """SOS during a recording: keep it going as an SOS one; returns its incident ID (None if it just ended)"""
+    recording = current_recording
+    if recording is None:
+        return None
+    if recording.escalate():
+        incidents.record(recording.incident_id, "sos", detail, pressed_at)
+        print("🆘 Running recording escalated to SOS:", recording.session_id)
+    return recording.incident_id
+
+def stop_recording():
+    """End the current recording early; segments recorded so far are kept and uploaded"""
+    recording_stop.set()
+
+class HelpButton:
+    """Debounced SOS button.
+
+    A press starts an SOS recording straight away. The button never stops a
+    recording: a panicked hold must not end the evidence, so stopping is
+    left to /record/stop or the recording's length.
+    """
+
+    def __init__(self, button, engine, debounce=HELP_DEBOUNCE):
+        self.button = button
+        self.engine = engine
+        self.debounce = debounce
+        self._last_press = float("-inf")
+        button.when_pressed = self.pressed
+
+    def pressed(self, pressed_at=None):
+        # gpiozero callback thread: timestamp, debounce and hand off (pressed_at: a press latched at boot)
+        now = time.monotonic() if pressed_at is None else pressed_at
+        if now - self._last_press < self.debounce:
+            return
+        self._last_press = now
+        self.engine.submit(self._on_press, now)
+
+    def _on_press(self, pressed_at):
+        print("🆘 BUTTON PRESSED")
+        start_recording("button", PRIORITY_SOS, pressed_at)  # escalates a routine recording already running
+
 led = LED(LED_PIN)
+actions = ActionEngine()
+status_led = StatusLed(led, actions)
+press_latency = LatencyStats()
+recording_listeners.append(status_led.refresh)
+http_client.listeners.append(status_led.refresh)
+help_button = HelpButton(sos_latch.button, actions)
+sos_latch.hand_over(help_button.pressed)
 
-def on_help_pressed():
-    print("🆘 BUTTON PRESSED")
-    led.on()
-    threading.Thread(target=record_video, daemon=True).start()
-    time.sleep(0.5)
-    led.off()
+def on_motion(activity):
+    """Motion event: start a routine recording ("record" mode), or tag the running one / log an incident"""
+    incident_id = recording_incident
+    if incident_id is None and MOTION_DETECT == "record":
+        incident_id = start_recording("motion")
+    if incident_id is None:
+        incident_id = recording_incident or incidents.open("motion")
+    incidents.record(incident_id, "motion", f"{activity:.1%} of the frame changed")
+    print(f"👀 Motion: {activity:.1%} of the frame changed")
 
-Button(HELP_PIN).when_pressed = on_help_pressed
+if motion_detector:
+    motion_detector.listeners.append(on_motion)
 
 # ---------------- ROUTES ---------------- #
 
@@ -349,16 +3058,33 @@ def home():
 def health():
     return jsonify({"status": "ok"})
 
+@app.route("/metrics")
+def metrics_route():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/status")
 def status():
     return {
         "recording": is_recording,
-        "preview_exists": os.path.exists(PREVIEW_FILE),
+        "preview_exists": stream_tiers.frames > 0,
+        "viewers": stream_tiers.viewers,
+        "stream_tiers": stream_tiers.stats(),
+        "uploads_pending": upload_queue.pending_count(),
+        "locations_pending": location_tracker.pending_count(),
+        "http": http_client.stats(),
+        "prebuffer": video_pipeline.prebuffer.stats() if video_pipeline else None,
+        "thumbnails_pending": thumbnails.pending,
+        "storage": retention.stats(),
+        "motion": motion_detector.stats() if motion_detector else None,
+        "press_to_record": press_latency.stats(),
+        "boot": boot_profile.stats(),
         "ip": get_local_ip()
     }
 
 @app.route("/qr")
 def get_qr():
+    import qrcode
+
     url = f"{SYNC_BASE_URL}/device/{DEVICE_ID}"
     qr = qrcode.QRCode(version=1, box_size=10, border=5)
     qr.add_data(url)
@@ -371,8 +3097,7 @@ def get_qr():
 
 @app.route("/wifi/scan")
 def wifi_scan():
-    networks = scan_wifi()
-    return jsonify(networks)
+    return jsonify(wifi_scans.get() or [])
 
 @app.route("/wifi/connect", methods=["POST"])
 def wifi_connect():
@@ -395,61 +3120,240 @@ def location():
 
 @app.route("/help", methods=["POST"])
 def help_route():
-    threading.Thread(target=record_video, daemon=True).start()
-    return jsonify({"status": "recording_started"})
+    was_recording = is_recording
+    incident_id = start_recording("help", PRIORITY_SOS, pressed_at=time.monotonic())
+    status = "recording_escalated" if was_recording and incident_id else "recording_started"
+    return jsonify({"status": status, "incident_id": incident_id})
 
 @app.route("/record", methods=["POST"])
 def record():
-    threading.Thread(target=record_video, daemon=True).start()
-    return jsonify({"status": "recording_started"})
+    incident_id = start_recording("record")
+    return jsonify({"status": "recording_started", "incident_id": incident_id})
 
 @app.route("/record/start", methods=["POST"])
 def record_start():
-    global is_recording
-    if is_recording:
+    incident_id = start_recording("record_start")
+    if not incident_id:
         return jsonify({"status": "already_recording"})
-    threading.Thread(target=record_video, daemon=True).start()
-    return jsonify({"status": "recording_started"})
+    return jsonify({"status": "recording_started", "incident_id": incident_id})
+
+@app.route("/incidents")
+def incidents_list():
+    limit = min(request.args.get("limit", 20, type=int), 200)
+    return jsonify(incidents.recent(limit))
+
+@app.route("/incidents/<incident_id>")
+def incident_timeline(incident_id):
+    timeline = incidents.timeline(incident_id)
+    if timeline is None:
+        return jsonify({"error": "unknown_incident"}), 404
+    return jsonify(timeline)
 
 @app.route("/record/stop", methods=["POST"])
 def record_stop():
-    global is_recording
-    is_recording = False
+    stop_recording()
     return jsonify({"status": "recording_stopped"})
 
 @app.route("/record/status")
 def record_status():
+    # Long-poll: ?wait=N blocks until the state differs from ?recording= (or just changes)
+    wait = min(request.args.get("wait", 0, type=float), 60)
+    if wait > 0:
+        known = request.args.get("recording", str(is_recording)).lower() == "true"
+        with recording_changed:
+            recording_changed.wait_for(lambda: is_recording != known, wait)
     return jsonify({"recording": is_recording})
 
+@app.route("/recordings")
+def recordings():
+    """Catalog page, newest first: ?limit=&cursor=&session_id=&incident_id=&upload_state=&since=&until="""
+    args = request.args
+    try:
+        items, next_cursor = recording_catalog.page(
+            limit=max(1, min(args.get("limit", 50, type=int), 200)),
+            cursor=args.get("cursor"),
+            session_id=args.get("session_id"),
+            incident_id=args.get("incident_id"),
+            upload_state=args.get("upload_state"),
+            since=args.get("since", type=float),
+            until=args.get("until", type=float)
+        )
+    except (ValueError, TypeError):
+        return jsonify({"error": "invalid_cursor"}), 400
+    return jsonify({"items": items, "next_cursor": next_cursor})
+
 @app.route("/videos")
 def list_videos():
-    files = sorted(
-        [f for f in os.listdir(VIDEOS_DIR) if f.endswith(".mp4")],
-        reverse=True
-    )
-    if not files:
+    try:
+        items, next_cursor = recording_catalog.page(limit=100, cursor=request.args.get("cursor"))
+    except (ValueError, TypeError):
+        return jsonify({"error": "invalid_cursor"}), 400
+    if not items:
         return "No videos yet."
-    return "<br>".join(f'<a href="/videos/{f}">{f}</a>' for f in files)
+    links = [f'<a href="/videos/{r["name"]}">{r["name"]}</a> ({r["size"] // 1024} KB, {r["upload_state"]})'
+             for r in items]
+    if next_cursor:
+        links.append(f'<a href="/videos?cursor={next_cursor}">Older</a>')
+    return "<br>".join(links)
+
+class FileRange:
+    """WSGI body for bytes [start, start + length) of a file.
+
+    Under the built-in (threaded) server the status line and headers are
+    flushed first and the range is then handed to the kernel with
+    sendfile(2), so video bytes never pass through Python. Other servers get
+    plain chunked reads.
+    """
+
+    CHUNK = 256 * 1024
+
+    def __init__(self, path, start, length, sock=None):
+        self.path = path
+        self.start = start
+        self.length = length
+        self.sock = sock
+
+    def __iter__(self):
+        with open(self.path, "rb") as f:
+            if self.sock is not None:
+                yield b""  # Makes the server write the status line and headers now
+                self.sock.sendfile(f, self.start, self.length)
+                return
+            f.seek(self.start)
+            remaining = self.length
+            while remaining > 0:
+                data = f.read(min(self.CHUNK, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+
+def file_etag(stat):
+    # Strong validator: a rewritten file gets a new inode, size or mtime
+    return f"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+def stat_or_none(path):
+    try:
+        return os.stat(path) if path else None
+    except OSError:
+        return None
 
 @app.route("/videos/<name>")
 def get_video(name):
     if not name.endswith(".mp4"):
         abort(404)
-    return send_from_directory(VIDEOS_DIR, name)
+    path = safe_join(VIDEOS_DIR, name)
+    stat = stat_or_none(path)
+    if stat is None:
+        abort(404)
+    return send_file_range(path, stat, "video/mp4")
+
+@app.route("/videos/<name>/thumb")
+def get_video_thumb(name):
+    """Poster frame, or the sprite strip with ?sprite=1; 404 + Retry-After while it renders"""
+    if not name.endswith(".mp4"):
+        abort(404)
+    path = safe_join(VIDEOS_DIR, name)
+    if stat_or_none(path) is None:
+        abort(404)
+    if not thumbnails.cached(path):
+        # Queued now or by an earlier request: either way it is about to exist
+        if thumbnails.submit(path) or thumbnails.is_pending(path):
+            return jsonify({"error": "thumbnail_pending"}), 404, {"Retry-After": "5"}
+        if not os.path.exists(thumbnails.poster_path(name)):
+            return jsonify({"error": "no_thumbnail"}), 404
+    image = thumbnails.sprite_path(name) if request.args.get("sprite") else thumbnails.poster_path(name)
+    stat = stat_or_none(image)
+    if stat is None:
+        abort(404)
+    return send_file_range(image, stat, "image/jpeg")
+
+def send_file_range(path, stat, mimetype):
+    """Conditional (ETag / Last-Modified) and single-range response for a file on disk"""
+    etag = file_etag(stat)
+    last_modified = datetime.fromtimestamp(int(stat.st_mtime), timezone.utc)
+    headers = {
+        "ETag": f'"{etag}"',
+        "Last-Modified": http_date(last_modified),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=3600"
+    }
+
+    if request.if_none_match:
+        if request.if_none_match.contains(etag) or request.if_none_match.star_tag:
+            return Response(status=304, headers=headers)
+    elif request.if_modified_since and request.if_modified_since >= last_modified:
+        return Response(status=304, headers=headers)
+
+    size = stat.st_size
+    start, length, status = 0, size, 200
+    byte_range = request.range
+    if_range = request.if_range
+    range_applies = not (if_range.etag or if_range.date) or (
+        if_range.etag == etag if if_range.etag else if_range.date >= last_modified
+    )
+    if byte_range is not None and range_applies and byte_range.units == "bytes" and len(byte_range.ranges) == 1:
+        span = byte_range.range_for_length(size)
+        if span is None:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status=416, headers=headers)
+        start, stop = span
+        length, status = stop - start, 206
+        headers["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+
+    headers["Content-Length"] = str(length)
+    body = FileRange(path, start, length, request.environ.get("werkzeug.socket"))
+    return Response(body, status=status, headers=headers, mimetype=mimetype, direct_passthrough=True)
+
+def mjpeg_part_header(frame, captured_at):
+    # X-Timestamp (capture time, Unix seconds) lets clients measure frame age
+    return (
+        b"--frame\r\n"
+        b"Content-Type: image/jpeg\r\n"
+        b"Content-Length: " + str(len(frame)).encode() + b"\r\n"
+        b"X-Timestamp: " + f"{captured_at:.3f}".encode() + b"\r\n\r\n"
+    )
+
+def stream_options(args):
+    """Map /camera ?width=&quality=&fps= onto a tier hub and a minimum frame interval"""
+    def number(name):
+        # Missing, malformed and non-finite (nan, inf) values all mean "use the default"
+        try:
+            value = float(args.get(name) or 0)
+        except ValueError:
+            return 0
+        return max(value, 0) if math.isfinite(value) else 0
+    hub = stream_tiers.hub(int(number("width")), int(number("quality")))
+    fps = number("fps")
+    return hub, 1.0 / fps if fps else 0.0
 
 @app.route("/camera")
 def camera_stream():
+    hub, interval = stream_options(request.args)
+
     def gen():
-        while True:
-            if os.path.exists(PREVIEW_FILE):
-                with open(PREVIEW_FILE, "rb") as f:
-                    frame = f.read()
-                yield (
-                    b"--frame\r\n"
-                    b"Content-Type: image/jpeg\r\n\r\n" +
-                    frame + b"\r\n"
-                )
-            time.sleep(0.15)
+        seq = 0
+        sent = 0
+        next_due = 0.0
+        try:
+            with hub.subscription():
+                while True:
+                    # Honour the client's fps by skipping frames, never by queueing them
+                    delay = next_due - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    seq, frame, captured_at = hub.wait_for_frame(seq, timeout=5)
+                    if frame is None:
+                        continue
+                    next_due = time.monotonic() + interval
+                    # Yield the shared frame as its own chunk so it is never copied
+                    yield mjpeg_part_header(frame, captured_at)
+                    yield frame
+                    yield b"\r\n"
+                    sent += 1
+                    stream_frames_sent.inc(tier=hub.name)
+        finally:
+            stream_client_frames.observe(sent)
 
     return Response(
         gen(),
@@ -459,25 +3363,168 @@ def camera_stream():
 
 @app.route("/command/<action>", methods=["POST"])
 def command(action):
+    # Commands are queued and answered immediately
     if action == "flash":
-        led.on()
-        time.sleep(1)
-        led.off()
-        return jsonify({"status": "flashed"})
+        status_led.flash(1.0)
+        return jsonify({"status": "flash_queued"})
     elif action == "record":
-        threading.Thread(target=record_video, daemon=True).start()
-        return jsonify({"status": "recording_started"})
+        incident_id = start_recording("command")
+        return jsonify({"status": "recording_started", "incident_id": incident_id})
     elif action == "locate":
-        sync_location()
-        return jsonify({"status": "location_synced"})
+        threading.Thread(target=sync_location, daemon=True).start()
+        return jsonify({"status": "location_sync_queued"})
     else:
         return jsonify({"error": "unknown_command"}), 400
 
+# ---------------- ASGI SERVER ---------------- #
+
+class AsyncSignal:
+    """Wakes coroutines when state owned by other threads changes.
+
+    fire() may be called from any thread; waiters on the event loop are
+    resumed without needing a thread of their own.
+    """
+
+    def __init__(self, loop):
+        self._loop = loop
+        self._future = loop.create_future()
+
+    def fire(self):
+        self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        future, self._future = self._future, self._loop.create_future()
+        future.set_result(None)
+
+    async def wait(self, timeout):
+        try:
+            await asyncio.wait_for(asyncio.shield(self._future), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+async def _wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+def create_asgi_app():
+    """ASGI front end for SERVER_MODE=asgi.
+
+    /camera and the /record/status long-poll run as coroutines on the event
+    loop, so an idle viewer costs a socket and a few KB instead of an OS
+    thread. Every other route is handed to the Flask app on a small
+    thread pool.
+    """
+    from uvicorn.middleware.wsgi import WSGIMiddleware
+
+    flask_app = WSGIMiddleware(app, workers=ASGI_WSGI_WORKERS)
+    signals = {}
+
+    def signal(name):
+        if not signals:
+            loop = asyncio.get_running_loop()
+            signals["frame"] = AsyncSignal(loop)
+            signals["recording"] = AsyncSignal(loop)
+            stream_tiers.add_listener(signals["frame"].fire)
+            recording_listeners.append(signals["recording"].fire)
+        return signals[name]
+
+    async def camera(scope, receive, send):
+        frames = signal("frame")
+        args = {k: v[-1] for k, v in parse_qs(scope["query_string"].decode()).items()}
+        hub, interval = stream_options(args)
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"multipart/x-mixed-replace; boundary=frame")]
+        })
+        disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+        sent = 0
+        try:
+            with hub.subscription():
+                seq = 0
+                next_due = 0.0
+                while not disconnected.done():
+                    delay = next_due - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    latest, frame, captured_at = hub.latest()
+                    if latest <= seq:
+                        await frames.wait(5)
+                        continue
+                    seq = latest
+                    next_due = time.monotonic() + interval
+                    for part in (mjpeg_part_header(frame, captured_at), frame, b"\r\n"):
+                        await send({"type": "http.response.body", "body": part, "more_body": True})
+                    sent += 1
+                    stream_frames_sent.inc(tier=hub.name)
+        finally:
+            disconnected.cancel()
+            stream_client_frames.observe(sent)
+
+    async def record_status_poll(scope, receive, send, wait, known):
+        changed = signal("recording")
+        deadline = time.monotonic() + wait
+        while is_recording == known:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await changed.wait(remaining)
+        body = json.dumps({"recording": is_recording}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def asgi_app(scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "GET":
+            if scope["path"] == "/camera":
+                return await camera(scope, receive, send)
+            if scope["path"] == "/record/status":
+                args = parse_qs(scope["query_string"].decode())
+                wait = min(float(args.get("wait", ["0"])[0] or 0), 60)
+                if wait > 0:
+                    known = args.get("recording", [str(is_recording)])[0].lower() == "true"
+                    return await record_status_poll(scope, receive, send, wait, known)
+        if scope["type"] == "lifespan":
+            while (await receive())["type"] != "lifespan.shutdown":
+                await send({"type": "lifespan.startup.complete"})
+            return await send({"type": "lifespan.shutdown.complete"})
+        await flask_app(scope, receive, send)
+
+    return asgi_app
+
 # ---------------- MAIN ---------------- #
 
 if __name__ == "__main__":
+    # Presses have been latched since "armed"; from here they are handled and can start recordings
+    actions.start()
+    status_led.refresh()
+    boot_profile.mark("ready")
+    threading.Thread(target=init_camera, daemon=True).start()
     threading.Thread(target=preview_loop, daemon=True).start()
-    threading.Thread(target=upload_worker, daemon=True).start()  # Start upload worker
+    threading.Thread(target=catalog_watch_loop, daemon=True).start()
+    threading.Thread(target=retention_loop, daemon=True).start()
+    if WIFI_MANAGER:
+        threading.Thread(target=wifi_manager, daemon=True).start()
+    thumbnails.start()
+    threading.Thread(target=network_watch_loop, args=([local_ip_cache, location_cache],), daemon=True).start()
+    location_cache.invalidate()  # Warm the caches in the background
+    local_ip_cache.invalidate()
+    orphans = upload_queue.rescan(VIDEOS_DIR, recovered_upload)
+    if orphans:
+        print(f"Queued {orphans} recordings found on disk")
+    for _ in range(UPLOAD_WORKERS):
+        threading.Thread(target=upload_worker, daemon=True).start()  # Start upload workers
     start_sync_loop()  # Start background sync
-    print("🚀 Raspberry Pi demo backend running")
-    app.run(host="0.0.0.0", port=PORT, threaded=True)
+    boot_profile.mark("serving")
+    stages = boot_profile.stats()["stages_ms"]
+    print(f"🚀 Raspberry Pi demo backend running (armed {stages['armed']:.0f} ms, ready {stages['ready']:.0f} ms "
+          f"after process start)")
+    if SERVER_MODE == "asgi":
+        import uvicorn
+        uvicorn.run(create_asgi_app(), host="0.0.0.0", port=PORT, log_level="warning")
+    else:
+        app.run(host="0.0.0.0", port=PORT, threaded=True)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""End-to-end cost per clip of the cloud ingest strategies.
+
+Encodes a synthetic H.264 clip like the Pi's encoder output, then times, per
+clip, the device-side mux plus what ingest does with the upload:
+
+  transcode  plain MP4 mux on the Pi, full libx264/aac transcode on the server
+             (what every clip cost before devices declared their codec)
+  remux      plain MP4 mux on the Pi, stream-copy to faststart on the server
+             (a playable clip whose index is at the end)
+  store      faststart mux on the Pi (app.mux_to_mp4), header check only on
+             the server
+
+The server steps run the same ffmpeg commands as src/lib/ingest.ts on this
+machine, so absolute numbers depend on the box; the differences are the point.
+Needs ffmpeg with libx264 on PATH.
+
+Usage:
+  python rpi/bench/bench_ingest.py --seconds 10 --trials 3
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('GPIOZERO_PIN_FACTORY', 'mock')
+
+
+def ffmpeg(*args):
+    subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', *args], check=True, capture_output=True)
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - started
+
+
+def make_raw_clip(path, args):
+    ffmpeg('-f', 'lavfi', '-i', f'testsrc2=size={args.width}x{args.height}:rate={args.fps}', '-t', str(args.seconds),
+           '-c:v', 'libx264', '-profile:v', args.profile, '-b:v', str(args.bitrate), '-g', str(args.fps),
+           '-f', 'h264', path)
+
+
+def main(argv: Optional[list] = None) -> int:
+    p = argparse.ArgumentParser()
+    p.add_argument('--seconds', type=float, default=10, help='Clip length (one segment)')
+    p.add_argument('--trials', type=int, default=3)
+    p.add_argument('--width', type=int, default=1280)
+    p.add_argument('--height', type=int, default=720)
+    p.add_argument('--fps', type=int, default=24)
+    p.add_argument('--bitrate', type=int, default=2000000)
+    p.add_argument('--profile', default='high')
+    args = p.parse_args(argv)
+
+    if not shutil.which('ffmpeg'):
+        print('ffmpeg not found on PATH')
+        return 2
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['VIDEOS_DIR'] = os.path.join(tmp, 'videos')
+        import app
+
+        raw = os.path.join(tmp, 'clip.h264')
+        make_raw_clip(raw, args)
+
+        def mux_plain(out):
+            # The Pi's mux before faststart: index written after the media data
+            ffmpeg('-framerate', str(args.fps), '-i', raw, '-c', 'copy', out)
+
+        def mux_faststart(out):
+            work = os.path.join(tmp, 'work.h264')
+            shutil.copy(raw, work)  # mux_to_mp4 consumes its input
+            app.mux_to_mp4(work, out, args.fps)
+
+        def transcode(src):
+            ffmpeg('-i', src, '-c:v', 'libx264', '-c:a', 'aac', '-f', 'mp4', os.path.join(tmp, 'transcoded.mp4'))
+
+        def remux(src):
+            ffmpeg('-i', src, '-c', 'copy', '-movflags', '+faststart', os.path.join(tmp, 'remuxed.mp4'))
+
+        def store(src):
+            info = app.mp4_media_info(src)
+            assert info and info['faststart'] and info['codec'], info
+
+        strategies = {
+            'transcode': (mux_plain, transcode),
+            'remux': (mux_plain, remux),
+            'store': (mux_faststart, store),
+        }
+        results = {}
+        for name, (mux, ingest) in strategies.items():
+            device, server = [], []
+            for trial in range(args.trials):
+                clip = os.path.join(tmp, f'{name}-{trial}.mp4')
+                device.append(timed(mux, clip))
+                server.append(timed(ingest, clip))
+                os.remove(clip)
+            results[name] = statistics.median(device), statistics.median(server)
+
+    print(f'clip={args.seconds:g}s {args.width}x{args.height}@{args.fps} {args.profile} ({args.trials} trials, medians)')
+    print(f'{"strategy":<10} {"device s":>9} {"server s":>9} {"total s":>8} {"saved s":>8} {"vs clip":>8}')
+    baseline = sum(results['transcode'])
+    for name, (device, server) in results.items():
+        total = device + server
+        print(f'{name:<10} {device:>9.3f} {server:>9.3f} {total:>8.3f} {baseline - total:>8.3f} '
+              f'{total / args.seconds:>7.2f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
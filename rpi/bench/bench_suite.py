@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""Hardware-free benchmarks for the hot paths of rpi/app.py.
+
+Runs in-process on any Linux box. gpiozero uses its mock pin factory, the
+camera is replaced by synthetic sources (moving-gradient preview frames and
+an H.264-sized byte stream with a keyframe every second) and all cloud
+traffic goes to the local stand-in server. Scenarios:
+
+ - fanout     /camera tiers: capture+encode per frame and frame age at the viewer
+ - sync       location points flushed in batches, device status posts
+ - upload     clips pushed through upload_worker to the stand-in
+ - recording  HELP pin press through the pre-event buffer to saved segments
+ - motion     motion detector on synthetic 720p sequences: cost per analysed
+              frame, false events on a noisy static scene, frames until a
+              moving object fires, and the share analysed under the CPU budget
+
+Each reports throughput, p50/p95/p99 latency and process RSS. --json saves
+the results and --baseline prints the change against an earlier run, so a
+slower hot path shows up in review.
+
+Usage:
+  python rpi/bench/bench_suite.py --json bench.json
+  python rpi/bench/bench_suite.py --only fanout,upload --baseline bench.json
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import threading
+import contextlib
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stand_in_server import FaultProfile, StandInServer, UPLOAD_PATH  # noqa: E402
+
+SCENARIOS = ('fanout', 'sync', 'upload', 'recording', 'motion')
+TIERS = ((320, 40), (640, 60), (1280, 80))
+
+
+def percentiles(samples, scale=1000.0):
+    """p50/p95/p99 of samples (seconds), in ms by default"""
+    if not samples:
+        return {'p50': None, 'p95': None, 'p99': None}
+    ordered = sorted(samples)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * scale, 3)  # noqa: E731
+    return {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99)}
+
+
+def rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return round(int(line.split()[1]) / 1024, 1)
+    return None
+
+
+def peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the app's progress prints (from every thread) while a scenario runs"""
+    real = sys.stdout
+    sys.stdout = io.StringIO()
+    try:
+        yield
+    finally:
+        sys.stdout = real
+
+
+class SyntheticCamera:
+    """Moving gradient frames shaped like Picamera2.capture_array() output (BGR uint8)"""
+
+    def __init__(self, width=1280, height=720):
+        import numpy as np
+        self.np = np
+        x = np.linspace(0, 255, width, dtype=np.uint8)
+        y = np.linspace(0, 255, height, dtype=np.uint8)
+        self.base = np.dstack([np.tile(x, (height, 1)), np.tile(y[:, None], (1, width)),
+                               np.full((height, width), 128, np.uint8)])
+        self.captured_at = []
+
+    def capture(self):
+        self.captured_at.append(time.perf_counter())
+        return self.np.roll(self.base, len(self.captured_at) * 8, axis=1)
+
+
+class SyntheticEncoder:
+    """Feeds VideoPipeline.on_frame like the picamera2 encoder tap would"""
+
+    def __init__(self, pipeline, fps=24, bitrate=2_000_000):
+        self.pipeline = pipeline
+        self.fps = fps
+        size = max(bitrate // 8 // fps, 1)
+        self.frames = [os.urandom(size * 4), os.urandom(size // 2)]  # keyframe, delta frame
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        n = 0
+        interval = 1.0 / self.fps
+        next_due = time.monotonic()
+        while not self._stop.is_set():
+            keyframe = n % self.fps == 0
+            self.pipeline.on_frame(self.frames[0 if keyframe else 1], keyframe)
+            n += 1
+            next_due += interval
+            self._stop.wait(max(0.0, next_due - time.monotonic()))
+
+
+def bench_fanout(app, args):
+    if app.cv2 is None:
+        print('  (cv2 not installed: timing placeholder frames, not real JPEG encodes)')
+        camera = None
+    else:
+        camera = SyntheticCamera()
+    hubs = [app.stream_tiers.hub(w, q) for w, q in TIERS]
+    ages, delivered = [], []
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def viewer(hub):
+        seq, count, local = 0, 0, []
+        with hub.subscription():
+            while not stop.is_set():
+                seq, frame, _ = hub.wait_for_frame(seq, timeout=0.5)
+                if frame is None:
+                    continue
+                count += 1
+                if camera:
+                    local.append(time.perf_counter() - camera.captured_at[seq - 1])
+        with lock:
+            ages.extend(local)
+            delivered.append(count)
+
+    threads = [threading.Thread(target=viewer, args=(hub,)) for hub in hubs for _ in range(args.viewers)]
+    for t in threads:
+        t.start()
+    while app.stream_tiers.viewers < len(threads):
+        time.sleep(0.01)
+
+    publish = []
+    started = time.perf_counter()
+    for _ in range(args.frames):
+        t0 = time.perf_counter()
+        app.stream_tiers.publish(camera.capture() if camera else None)
+        publish.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+    time.sleep(0.1)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    return {
+        'viewers': len(threads),
+        'frames_per_s': round(args.frames / elapsed, 1),
+        'publish_ms': percentiles(publish),
+        'frame_age_ms': percentiles(ages),
+        'delivered_ratio': round(sum(delivered) / (len(delivered) * args.frames), 3),
+    }
+
+
+def bench_sync(app, args):
+    flushes, samples, status = [], [], []
+    batch = app.LOCATION_BATCH_SIZE
+    for _ in range(args.sync_rounds):
+        for _ in range(batch):
+            t0 = time.perf_counter()
+            app.location_tracker.sample()
+            samples.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        app.location_tracker.flush()
+        flushes.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        app.sync_device_status()
+        status.append(time.perf_counter() - t0)
+    return {
+        'points_per_s': round(batch * len(flushes) / sum(flushes), 1),
+        'sample_ms': percentiles(samples),
+        'flush_ms': percentiles(flushes),
+        'device_sync_ms': percentiles(status),
+        'left_unsynced': app.location_tracker.pending_count(),
+    }
+
+
+def start_upload_workers(app):
+    if not getattr(app, '_bench_workers', False):
+        for _ in range(app.UPLOAD_WORKERS):
+            threading.Thread(target=app.upload_worker, daemon=True).start()
+        app._bench_workers = True
+
+
+def wait_for_uploads(app, timeout):
+    deadline = time.monotonic() + timeout
+    while app.upload_queue.pending_count() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return app.upload_queue.pending_count()
+
+
+def bench_upload(app, args):
+    size = int(args.upload_mb * 1024 * 1024)
+    paths = []
+    for i in range(args.uploads):
+        path = os.path.join(app.VIDEOS_DIR, f'bench_upload_{i:03d}.mp4')
+        with open(path, 'wb') as f:
+            f.write(os.urandom(size))
+        paths.append(path)
+
+    retries_before = app.upload_results._values.get(('retry',), 0)
+    start_upload_workers(app)
+    started = time.perf_counter()
+    ids = []
+    for i, path in enumerate(paths):
+        incident_id = app.incidents.open('bench_upload')
+        app.upload_queue.put(path, {'incident_id': incident_id})
+        ids.append(incident_id)
+    left = wait_for_uploads(app, args.timeout)
+    elapsed = time.perf_counter() - started
+
+    latencies = []
+    for incident_id in ids:
+        stages = app.incidents.timeline(incident_id)['stages']
+        if 'upload_done' in stages:
+            latencies.append(stages['upload_done'] / 1000)
+    return {
+        'files': len(paths),
+        'mb_per_s': round(size * (len(paths) - left) / elapsed / 1024 / 1024, 2),
+        'queued_to_uploaded_ms': percentiles(latencies),
+        'retries': app.upload_results._values.get(('retry',), 0) - retries_before,
+        'not_uploaded': left,
+    }
+
+
+def bench_recording(app, args):
+    pipeline = app.VideoPipeline(app.PreEventBuffer(app.PREBUFFER_SECONDS, app.PREBUFFER_MAX_BYTES))
+    app.video_pipeline = pipeline
+    encoder = SyntheticEncoder(pipeline, bitrate=app.VIDEO_BITRATE).start()
+    start_upload_workers(app)
+    app.actions.start()
+    pin = app.help_button.button.pin
+    time.sleep(args.warmup)
+
+    press, first_segment = [], []
+    for _ in range(args.recordings):
+        pin.drive_low()
+        while not app.is_recording:
+            time.sleep(0.001)
+        pin.drive_high()
+        time.sleep(args.record_seconds)
+        app.stop_recording()
+        while app.is_recording:
+            time.sleep(0.01)
+        stages = app.incidents.timeline(app.incidents.recent(1)[0]['incident_id'])['stages']
+        press.append(stages.get('recording_started', 0) / 1000)
+        if 'segment_saved' in stages:
+            first_segment.append(stages['segment_saved'] / 1000)
+        time.sleep(app.HELP_DEBOUNCE + 0.05)
+    encoder.stop()
+    app.video_pipeline = None
+    wait_for_uploads(app, args.timeout)
+
+    return {
+        'recordings': args.recordings,
+        'press_to_record_ms': percentiles(press),
+        'press_to_first_segment_ms': percentiles(first_segment),
+        'prebuffer_append_us': pipeline.prebuffer.stats().get('avg_append_us'),
+    }
+
+
+def noisy_scene(np, count, width=1280, height=720, noise=6, seed=1):
+    """Static gradient scene with per-frame sensor noise (BGR uint8)"""
+    rng = np.random.default_rng(seed)
+    base = SyntheticCamera(width, height).base.astype(np.int16)
+    return [np.clip(base + rng.integers(-noise, noise + 1, base.shape, dtype=np.int16), 0, 255).astype(np.uint8)
+            for _ in range(count)]
+
+
+def bench_motion(app, args):
+    np = app.np
+    quiet_frames = noisy_scene(np, 8)
+    # Analyse every frame: the budget is measured separately below
+    detector = app.MotionDetector(frame_skip=0, cpu_budget=0, cooldown=0)
+    costs = []
+    for i in range(args.motion_frames):
+        t0 = time.perf_counter()
+        detector.feed(quiet_frames[i % len(quiet_frames)])
+        costs.append(time.perf_counter() - t0)
+    false_events = detector.events
+
+    # A dark 160x160 object walks across the scene, 24 px per frame
+    frames_to_detect = None
+    for i in range(60):
+        frame = quiet_frames[i % len(quiet_frames)].copy()
+        x = (i * 24) % (frame.shape[1] - 160)
+        frame[280:440, x:x + 160] = 20
+        detector.feed(frame)
+        if detector.events > false_events:
+            frames_to_detect = i + 1
+            break
+
+    # Default skip and CPU budget at the preview cadence: how many frames actually get analysed
+    budgeted = app.MotionDetector(cooldown=0)
+    now = 0.0
+    for i in range(args.motion_frames):
+        budgeted.feed(quiet_frames[i % len(quiet_frames)], now)
+        now += app.PREVIEW_INTERVAL
+    seconds = args.motion_frames * app.PREVIEW_INTERVAL
+    mean_cost = sum(costs) / len(costs)
+
+    return {
+        'frames': args.motion_frames,
+        'analyse_ms': percentiles(costs),
+        'false_events': false_events,
+        'frames_to_detect': frames_to_detect,
+        'analysed_ratio': round(budgeted.analysed / args.motion_frames, 3),
+        'cpu_percent_of_core': round(budgeted.analysed * mean_cost / seconds * 100, 2),
+    }
+
+
+def flatten(results):
+    flat = {}
+    for scenario, metrics in results.items():
+        for key, value in metrics.items():
+            if isinstance(value, dict):
+                for sub, v in value.items():
+                    flat[f'{scenario}.{key}.{sub}'] = v
+            else:
+                flat[f'{scenario}.{key}'] = value
+    return flat
+
+
+def print_results(results, baseline=None):
+    flat = flatten(results)
+    base = flatten(baseline) if baseline else {}
+    for key, value in flat.items():
+        line = f'{key:<45} {value!s:>12}'
+        old = base.get(key)
+        if isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+            line += f'   {(value - old) / old * 100:+7.1f}% vs {old}'
+        print(line)
+
+
+def main(argv: Optional[list] = None) -> int:
+    p = argparse.ArgumentParser()
+    p.add_argument('--only', default=','.join(SCENARIOS), help='Comma-separated scenarios to run')
+    p.add_argument('--viewers', type=int, default=10, help='Viewers per /camera tier')
+    p.add_argument('--frames', type=int, default=100)
+    p.add_argument('--sync-rounds', type=int, default=20)
+    p.add_argument('--uploads', type=int, default=8)
+    p.add_argument('--upload-mb', type=float, default=2)
+    p.add_argument('--recordings', type=int, default=5)
+    p.add_argument('--record-seconds', type=float, default=2.5)
+    p.add_argument('--warmup', type=float, default=2.0, help='Seconds to fill the pre-event buffer')
+    p.add_argument('--motion-frames', type=int, default=500)
+    p.add_argument('--latency-ms', type=float, default=20, help='Stand-in server latency per request')
+    p.add_argument('--bandwidth-kbps', type=float, default=0, help='Stand-in upload bandwidth cap (0 = none)')
+    p.add_argument('--timeout', type=float, default=120)
+    p.add_argument('--json', help='Write results to this file')
+    p.add_argument('--baseline', help='Compare against results saved with --json')
+    args = p.parse_args(argv)
+
+    server = StandInServer(FaultProfile(latency_ms=args.latency_ms, bandwidth_kbps=args.bandwidth_kbps)).start()
+    videos = tempfile.mkdtemp(prefix='rpi-bench-')
+    os.environ.update({
+        'GPIOZERO_PIN_FACTORY': 'mock',
+        'VIDEOS_DIR': videos,
+        'DEMO_MODE': 'true',
+        'SYNC_BASE_URL': server.base_url,
+        'UPLOAD_URL': server.base_url + UPLOAD_PATH,
+        'USER_ID': 'bench-user',
+        'SEGMENT_SECONDS': '1',
+    })
+    with quiet():
+        import app
+        app.load_media_modules()
+
+    results = {'env': {'rss_mb_after_import': rss_mb()}}
+    runners = {'fanout': bench_fanout, 'sync': bench_sync, 'upload': bench_upload, 'recording': bench_recording,
+               'motion': bench_motion}
+    try:
+        for name in args.only.split(','):
+            print(f'running {name} ...', flush=True)
+            with quiet():
+                result = runners[name](app, args)
+            result['rss_mb'] = rss_mb()
+            results[name] = result
+    finally:
+        server.stop()
+        shutil.rmtree(videos, ignore_errors=True)
+    results['env']['peak_rss_mb'] = peak_rss_mb()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Throughput benchmark: single-shot POST vs resumable chunked upload.
+
+Starts the local stand-in API with the requested network profile, then
+uploads the same synthetic clip with both strategies from rpi/app.py,
+retrying each until it succeeds or runs out of attempts (like
+upload_worker does), and reports time, effective throughput and how many
+bytes had to cross the link.
+
+Usage:
+  python rpi/bench/bench_upload.py --size-mb 8 --bandwidth-kbps 2000 --drop-per-mb 0.2
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('GPIOZERO_PIN_FACTORY', 'mock')
+
+from stand_in_server import FaultProfile, StandInServer, UPLOAD_PATH  # noqa: E402
+
+
+def run_upload(upload, path, max_attempts, retry_delay):
+    started = time.perf_counter()
+    for attempt in range(1, max_attempts + 1):
+        try:
+            upload(path, {})
+            return True, attempt, time.perf_counter() - started
+        except Exception:
+            time.sleep(retry_delay)
+    return False, max_attempts, time.perf_counter() - started
+
+
+def main(argv: Optional[list] = None) -> int:
+    p = argparse.ArgumentParser()
+    p.add_argument('--size-mb', type=float, default=8)
+    p.add_argument('--trials', type=int, default=3)
+    p.add_argument('--chunk-kb', type=int, default=256)
+    p.add_argument('--bandwidth-kbps', type=float, default=2000)
+    p.add_argument('--latency-ms', type=float, default=50)
+    p.add_argument('--drop-per-mb', type=float, default=0.2)
+    p.add_argument('--max-attempts', type=int, default=30)
+    p.add_argument('--retry-delay', type=float, default=0.0)
+    args = p.parse_args(argv)
+
+    profile = FaultProfile(latency_ms=args.latency_ms, bandwidth_kbps=args.bandwidth_kbps,
+                           drop_per_mb=args.drop_per_mb)
+    server = StandInServer(profile).start()
+    os.environ['UPLOAD_URL'] = server.base_url + UPLOAD_PATH
+
+    import app
+
+    size = int(args.size_mb * 1024 * 1024)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'clip.mp4')
+        with open(path, 'wb') as f:
+            f.write(os.urandom(size))
+
+        strategies = {
+            'single-shot': app.upload_single,
+            'chunked': lambda p, fields: app.upload_resumable(p, fields, chunk_size=args.chunk_kb * 1024),
+        }
+        print(f'clip={args.size_mb} MB link={profile}')
+        print(f'{"strategy":<12} {"ok":>5} {"median s":>9} {"MB/s":>7} {"attempts":>9} {"wire/clip":>10}')
+        for name, upload in strategies.items():
+            times, attempts, ok = [], [], 0
+            before = server.state.bytes_received
+            for _ in range(args.trials):
+                app.clear_upload_state(path)
+                success, n, elapsed = run_upload(upload, path, args.max_attempts, args.retry_delay)
+                ok += success
+                attempts.append(n)
+                if success:
+                    times.append(elapsed)
+            wire = (server.state.bytes_received - before) / (size * args.trials)
+            median = statistics.median(times) if times else float('nan')
+            rate = args.size_mb / median if times else 0.0
+            print(f'{name:<12} {ok:>2}/{args.trials:<2} {median:>9.2f} {rate:>7.2f} '
+                  f'{statistics.mean(attempts):>9.1f} {wire:>10.2f}')
+
+    server.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""Memory/thread cost of concurrent /camera viewers per serving mode.
+
+Starts rpi/app.py in demo mode once per SERVER_MODE, opens an increasing
+number of MJPEG viewers (all drained from one client thread, so the client
+side stays cheap) and samples the server's RSS, virtual size and thread
+count from /proc.
+
+Usage:
+  python rpi/bench/bench_viewers.py --viewers 1,10,50,100 --modes threaded,asgi
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import selectors
+import subprocess
+import threading
+import urllib.request
+from typing import Optional
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def proc_status(pid):
+    fields = {}
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            fields[key] = value.strip()
+    return int(fields['VmRSS'].split()[0]) / 1024, int(fields['VmSize'].split()[0]) / 1024, int(fields['Threads'])
+
+
+def wait_healthy(base, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(base + '/health', timeout=1).read()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+class Viewers:
+    """Raw-socket MJPEG clients drained by a single selector thread"""
+
+    def __init__(self, port):
+        self.port = port
+        self.sel = selectors.DefaultSelector()
+        self.frames = {}
+        self.socks = []
+        self._lock = threading.Lock()
+        self._stop = False
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        self._thread.start()
+
+    def open(self, n):
+        for _ in range(n):
+            s = socket.create_connection(('127.0.0.1', self.port))
+            s.sendall(b'GET /camera HTTP/1.1\r\nHost: bench\r\n\r\n')
+            s.setblocking(False)
+            with self._lock:
+                self.socks.append(s)
+                self.frames[s] = 0
+                self.sel.register(s, selectors.EVENT_READ)
+
+    def _drain(self):
+        while not self._stop:
+            with self._lock:
+                if not self.socks:
+                    events = []
+                else:
+                    events = self.sel.select(timeout=0.1)
+            if not events:
+                time.sleep(0.01)
+                continue
+            for key, _ in events:
+                try:
+                    data = key.fileobj.recv(65536)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    data = b''
+                self.frames[key.fileobj] += data.count(b'--frame')
+
+    def fps(self, seconds):
+        before = dict(self.frames)
+        time.sleep(seconds)
+        rates = [(self.frames[s] - before.get(s, 0)) / seconds for s in self.socks]
+        return sum(rates) / len(rates) if rates else 0.0
+
+    def close(self):
+        self._stop = True
+        self._thread.join()
+        for s in self.socks:
+            s.close()
+
+
+def run_mode(mode, steps, settle):
+    port = free_port()
+    env = dict(os.environ, GPIOZERO_PIN_FACTORY='mock', SERVER_MODE=mode, STREAM_PORT=str(port),
+               PREVIEW_INTERVAL='0.15')
+    proc = subprocess.Popen([sys.executable, APP], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    results = []
+    try:
+        if not wait_healthy(f'http://127.0.0.1:{port}'):
+            raise RuntimeError(f'{mode} server did not start')
+        rss, vsz, threads = proc_status(proc.pid)
+        results.append((0, rss, vsz, threads, 0.0))
+        viewers = Viewers(port)
+        opened = 0
+        for n in steps:
+            viewers.open(n - opened)
+            opened = n
+            time.sleep(settle)
+            fps = viewers.fps(2)
+            rss, vsz, threads = proc_status(proc.pid)
+            results.append((n, rss, vsz, threads, fps))
+        viewers.close()
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    return results
+
+
+def main(argv: Optional[list] = None) -> int:
+    p = argparse.ArgumentParser()
+    p.add_argument('--viewers', default='1,10,50,100', help='Comma-separated viewer counts to step through')
+    p.add_argument('--modes', default='threaded,asgi')
+    p.add_argument('--settle', type=float, default=2.0, help='Seconds to wait after opening viewers')
+    args = p.parse_args(argv)
+
+    steps = [int(n) for n in args.viewers.split(',')]
+    print(f'{"mode":<10} {"viewers":>8} {"RSS MB":>8} {"VSZ MB":>8} {"threads":>8} {"fps/viewer":>11}')
+    for mode in args.modes.split(','):
+        for n, rss, vsz, threads, fps in run_mode(mode, steps, args.settle):
+            print(f'{mode:<10} {n:>8} {rss:>8.1f} {vsz:>8.0f} {threads:>8} {fps:>11.1f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""Fleet simulator: hundreds of virtual devices in one process against the stand-in API.
+
+Each virtual device is a DeviceIdentity (its own device ID, an account
+shared with --devices-per-user others, and its own HttpClient with a small
+keep-alive pool) driven through the code a real device runs:
+
+ - location   LocationTracker.sample() + flush() into /api/location/sync,
+              from a random walk; every --location-interval seconds, or at
+              the active cadence for LOCATION_ACTIVE_WINDOW after an SOS
+ - status     post_device_status() to /api/devices/sync every --status-interval
+ - SOS        Poisson arrivals at --sos-per-hour; each writes a --clip-mb clip and
+              puts it on the device's own UploadQueue at PRIORITY_SOS. An
+              upload pass claims the most urgent due entry, sends it with
+              upload_file() (resumable chunks above one chunk) and completes
+              it, or fails it and comes back after the queue's backoff
+
+Every device's link follows a network profile: a stand_in_server.FaultProfile
+applied on the client side (per-request latency, upload bandwidth cap,
+connection drops per MB and random failures), assigned by --profiles weights.
+The drops land before or after the server saw the request, so resumable
+uploads go through their offset resync as they would in the field.
+
+Timers run on one ActionEngine; the blocking work runs on a --workers thread
+pool. Scheduling lag (due time to start) is reported so a saturated simulator
+is not mistaken for a slow backend. The report gives requests, errors, req/s
+and p50/p95/p99/max latency per endpoint, SOS delivery latency per profile,
+upload throughput and the stand-in's counters. Starts the stand-in in-process
+unless --base points at a running one (stand_in_server.py or `next dev`).
+
+Usage:
+  python rpi/bench/fleet_sim.py --devices 300 --duration 60 --sos-per-hour 6 --clip-mb 2
+  python rpi/bench/fleet_sim.py --profiles wifi:0.5,lte:0.3,weak:0.2 --json fleet.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests  # noqa: E402
+from requests.adapters import HTTPAdapter  # noqa: E402
+
+from bench_suite import percentiles, peak_rss_mb, quiet  # noqa: E402
+from stand_in_server import FaultProfile, StandInServer  # noqa: E402
+
+MB = 1024 * 1024
+NETWORK_PROFILES = {
+    'wifi': FaultProfile(latency_ms=15, bandwidth_kbps=20000),
+    'lte': FaultProfile(latency_ms=60, bandwidth_kbps=5000, drop_per_mb=0.05, error_rate=0.005),
+    'weak': FaultProfile(latency_ms=250, bandwidth_kbps=600, drop_per_mb=0.3, error_rate=0.03),
+}
+
+
+class ShapedLink(HTTPAdapter):
+    """One device's uplink: latency, bandwidth cap and drops from its FaultProfile.
+
+    A drop is equally likely to happen before the request reaches the server
+    or after it was handled (the response is lost), which is what sends a
+    resumable upload back to the server for its offset.
+    """
+
+    def __init__(self, profile, rng, **kwargs):
+        super().__init__(**kwargs)
+        self.profile = profile
+        self.rng = rng
+
+    def send(self, request, **kwargs):
+        profile = self.profile
+        body = request.body or b''
+        size = len(body) if isinstance(body, (bytes, str)) else 0
+        delay = profile.latency_ms / 1000
+        if profile.bandwidth_kbps:
+            delay += size * 8 / (profile.bandwidth_kbps * 1000)
+        dropped = self.rng.random() < profile.error_rate + profile.drop_per_mb * size / MB
+        if dropped and self.rng.random() < 0.5:
+            time.sleep(delay / 2)
+            raise requests.ConnectionError('simulated drop before the server')
+        time.sleep(delay)
+        response = super().send(request, **kwargs)
+        if dropped:
+            response.close()
+            raise requests.ConnectionError('simulated drop, response lost')
+        return response
+
+
+class Recorder:
+    """Latency samples and error counts, shared by every device"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+        self.counters = {}
+
+    def add(self, key, seconds, ok=True):
+        with self._lock:
+            self.samples.setdefault(key, []).append(seconds)
+            self.errors[key] = self.errors.get(key, 0) + (0 if ok else 1)
+
+    def count(self, key, n=1):
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+
+def recording_client(app, recorder, profile, rng):
+    """An app.HttpClient whose per-request timings also go to recorder"""
+
+    class Client(app.HttpClient):
+        def _record(self, endpoint, seconds, ok):
+            super()._record(endpoint, seconds, ok)
+            recorder.add(endpoint, seconds, ok)
+
+    link = ShapedLink(profile, rng, pool_connections=2, pool_maxsize=2)
+    return Client(pool_size=2, adapter=link)
+
+
+class VirtualDevice:
+    def __init__(self, app, sim, index, profile_name):
+        self.app = app
+        self.sim = sim
+        self.profile_name = profile_name
+        self.rng = random.Random(index)
+        client = recording_client(app, sim.recorder, NETWORK_PROFILES[profile_name], self.rng)
+        user_id = f'sim-user-{index // sim.args.devices_per_user:04d}'
+        self.identity = app.DeviceIdentity(f'sim-{index:04d}', user_id, sim.base_url, client)
+        self.tracker = app.LocationTracker(':memory:', self.identity)
+        self.uploads = app.UploadQueue(':memory:')
+        self.triggered = {}  # clip path -> time.monotonic() of its SOS
+        self.ip = f'10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}'
+        self.latitude = 37.7397 + self.rng.uniform(-0.2, 0.2)
+        self.longitude = -121.4252 + self.rng.uniform(-0.2, 0.2)
+        self.active_until = 0.0
+        self.sos_count = 0
+
+    def location(self):
+        self.latitude += self.rng.gauss(0, 0.0002)
+        self.longitude += self.rng.gauss(0, 0.0002)
+        return {'latitude': self.latitude, 'longitude': self.longitude, 'method': 'sim',
+                'timestamp': int(time.time())}
+
+    def start(self):
+        args = self.sim.args
+        self.sim.schedule(self.rng.uniform(0, args.location_interval), self.sync_location)
+        self.sim.schedule(self.rng.uniform(0, args.status_interval), self.sync_status)
+        self.schedule_sos()
+
+    def schedule_sos(self):
+        rate = self.sim.args.sos_per_hour / 3600
+        if rate > 0:
+            self.sim.schedule(self.rng.expovariate(rate), self.sos)
+
+    def sync_location(self):
+        self.tracker.sample(self.location())
+        self.tracker.flush()
+        active = time.monotonic() < self.active_until
+        interval = self.app.LOCATION_ACTIVE_INTERVAL if active else self.sim.args.location_interval
+        self.sim.schedule(interval, self.sync_location)
+
+    def sync_status(self):
+        try:
+            self.app.post_device_status(self.identity, self.location(), self.ip)
+        except Exception:
+            pass  # Counted by the client; the next round tries again
+        self.sim.schedule(self.sim.args.status_interval, self.sync_status)
+
+    def sos(self):
+        self.sos_count += 1
+        self.active_until = time.monotonic() + self.app.LOCATION_ACTIVE_WINDOW
+        self.sim.recorder.count('sos_triggered')
+        self.sim.schedule(0, self.sync_location)
+        name = f'{self.identity.device_id}_sos{self.sos_count:03d}.mp4'
+        path = self.sim.write_clip(name)
+        self.triggered[path] = time.monotonic()
+        self.uploads.put(path, {'incident_id': f'{self.identity.device_id}-{self.sos_count}'}, self.app.PRIORITY_SOS)
+        self.sim.schedule(0, self.upload_pass, always=True)
+        self.schedule_sos()
+
+    def upload_pass(self):
+        """What upload_worker does with one queue entry, without blocking a pool thread on claim()"""
+        item = self.uploads.claim(timeout=0)
+        if item is None:
+            return  # Nothing due; entries backing off have their own pass scheduled
+        path, fields = item
+        try:
+            url = self.app.upload_file(path, fields, device=self.identity)
+        except Exception as e:
+            delay = self.uploads.fail(path, e)
+            self.sim.recorder.count('upload_retries')
+            self.sim.schedule(delay, self.upload_pass, always=True)
+        else:
+            self.uploads.complete(path, url)
+            size = os.path.getsize(path)
+            os.remove(path)
+            self.sim.recorder.add(f'sos_delivered:{self.profile_name}', time.monotonic() - self.triggered.pop(path))
+            self.sim.recorder.count('upload_bytes', size)
+            self.sim.recorder.count('sos_delivered')
+        self.sim.schedule(0, self.upload_pass, always=True)  # The next due entry, if any
+
+
+class FleetSim:
+    def __init__(self, app, args, base_url, workdir):
+        self.app = app
+        self.args = args
+        self.base_url = base_url
+        self.workdir = workdir
+        self.recorder = Recorder()
+        self.engine = app.ActionEngine()
+        self.pool = ThreadPoolExecutor(max_workers=args.workers)
+        self.stopping = threading.Event()
+        self._clip_block = os.urandom(MB)
+
+    def schedule(self, delay, fn, *args, always=False):
+        """Run fn(*args) on the pool after delay; once stopping, only retries (always=True) still run"""
+        if self.stopping.is_set() and not always:
+            return
+        due = time.monotonic() + delay
+        self.engine.call_later(delay, self.pool.submit, self._run, due, fn, args, always)
+
+    def _run(self, due, fn, args, always):
+        self.recorder.add('scheduler_lag', max(0.0, time.monotonic() - due))
+        try:
+            if always or not self.stopping.is_set():
+                fn(*args)
+        except Exception as e:
+            self.recorder.count(f'error:{type(e).__name__}')
+
+    def close(self):
+        """Stop the timers first, so none fires into a pool that is shutting down"""
+        self.engine.stop()
+        self.pool.shutdown(wait=True)
+
+    def undelivered(self):
+        counters = self.recorder.counters
+        return counters.get('sos_triggered', 0) - counters.get('sos_delivered', 0)
+
+    def write_clip(self, name):
+        path = os.path.join(self.workdir, name)
+        remaining = int(self.args.clip_mb * MB)
+        with open(path, 'wb') as f:
+            while remaining > 0:
+                f.write(self._clip_block[:remaining])
+                remaining -= len(self._clip_block)
+        return path
+
+
+def assign_profiles(spec, count, rng):
+    names, weights = [], []
+    for part in spec.split(','):
+        name, _, weight = part.partition(':')
+        if name not in NETWORK_PROFILES:
+            raise SystemExit(f'unknown network profile {name!r} (have {", ".join(NETWORK_PROFILES)})')
+        names.append(name)
+        weights.append(float(weight or 1))
+    return [rng.choices(names, weights)[0] for _ in range(count)]
+
+
+def report(sim, devices, args, elapsed, server_stats):
+    rec = sim.recorder
+    profiles = {}
+    for device in devices:
+        profiles[device.profile_name] = profiles.get(device.profile_name, 0) + 1
+    endpoints = {}
+    for key in sorted(rec.samples):
+        if key == 'scheduler_lag' or key.startswith('sos_delivered:'):
+            continue
+        samples = rec.samples[key]
+        endpoints[key] = {
+            'requests': len(samples),
+            'errors': rec.errors.get(key, 0),
+            'per_s': round(len(samples) / elapsed, 2),
+            **percentiles(samples),
+            'max': round(max(samples) * 1000, 3),
+        }
+    delivered = {name: rec.samples.get(f'sos_delivered:{name}', []) for name in profiles}
+    uploaded = rec.counters.get('upload_bytes', 0)
+    return {
+        'devices': len(devices),
+        'profiles': profiles,
+        'seconds': round(elapsed, 1),
+        'endpoints': endpoints,
+        'sos': {
+            'triggered': rec.counters.get('sos_triggered', 0),
+            'delivered': sum(len(v) for v in delivered.values()),
+            'upload_retries': rec.counters.get('upload_retries', 0),
+            'upload_mb_per_s': round(uploaded / MB / elapsed, 2),
+            'delivered_ms': {name: {'count': len(v), **percentiles(v)} for name, v in delivered.items()},
+        },
+        'scheduler_lag_ms': percentiles(rec.samples.get('scheduler_lag', [])),
+        'errors': {k: v for k, v in rec.counters.items() if k.startswith('error:')},
+        'server': server_stats,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def print_report(result, args):
+    profiles = ', '.join(f'{name} {n}' for name, n in result['profiles'].items())
+    print(f'{result["devices"]} devices ({profiles}) for {result["seconds"]}s, '
+          f'SOS {args.sos_per_hour:g}/h per device, clips {args.clip_mb:g} MB')
+    print(f'\n{"endpoint":<24} {"requests":>9} {"errors":>7} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} '
+          f'{"p99 ms":>8} {"max ms":>8}')
+    for name, e in result['endpoints'].items():
+        print(f'{name:<24} {e["requests"]:>9} {e["errors"]:>7} {e["per_s"]:>8.2f} {e["p50"]:>8.1f} '
+              f'{e["p95"]:>8.1f} {e["p99"]:>8.1f} {e["max"]:>8.1f}')
+    sos = result['sos']
+    print(f'\nSOS: {sos["triggered"]} triggered, {sos["delivered"]} delivered, {sos["upload_retries"]} upload retries, '
+          f'{sos["upload_mb_per_s"]} MB/s uploaded')
+    for name, d in sos['delivered_ms'].items():
+        if d['count']:
+            print(f'  trigger to delivered, {name:<5} n={d["count"]:<4} p50 {d["p50"]:.0f} ms  p95 {d["p95"]:.0f} ms  '
+                  f'p99 {d["p99"]:.0f} ms')
+    lag = result['scheduler_lag_ms']
+    print(f'\nscheduler lag p50 {lag["p50"]} ms, p99 {lag["p99"]} ms; peak RSS {result["peak_rss_mb"]} MB')
+    if result['errors']:
+        print('unexpected errors:', result['errors'])
+    if result['server']:
+        print('stand-in:', json.dumps(result['server']))
+
+
+def main(argv: Optional[list] = None) -> int:
+    p = argparse.ArgumentParser()
+    p.add_argument('--devices', type=int, default=200)
+    p.add_argument('--devices-per-user', type=int, default=3, help='Keychains per account')
+    p.add_argument('--duration', type=float, default=60, help='Seconds of new activity')
+    p.add_argument('--drain', type=float, default=120, help='Seconds to let SOS uploads finish afterwards')
+    p.add_argument('--sos-per-hour', type=float, default=6, help='Mean SOS triggers per device per hour')
+    p.add_argument('--clip-mb', type=float, default=2, help='Size of the clip each SOS uploads')
+    p.add_argument('--location-interval', type=float, default=60, help='Idle location sync interval')
+    p.add_argument('--status-interval', type=float, default=60, help='Device status sync interval')
+    p.add_argument('--profiles', default='wifi:0.6,lte:0.3,weak:0.1',
+                   help=f'Network profile weights ({", ".join(NETWORK_PROFILES)})')
+    p.add_argument('--workers', type=int, default=128, help='Threads running device work')
+    p.add_argument('--base', help='Use a running backend instead of the in-process stand-in')
+    p.add_argument('--seed', type=int, default=1)
+    p.add_argument('--json', help='Write results to this file')
+    args = p.parse_args(argv)
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))  # a socket or two per device, both ends
+
+    server = None if args.base else StandInServer().start()
+    base_url = args.base.rstrip('/') if args.base else server.base_url
+    workdir = tempfile.mkdtemp(prefix='rpi-fleet-')
+    os.environ.update({
+        'GPIOZERO_PIN_FACTORY': 'mock',
+        'VIDEOS_DIR': os.path.join(workdir, 'videos'),
+        'DEMO_MODE': 'true',
+        'SYNC_BASE_URL': base_url,
+        'USER_ID': 'sim-user',
+    })
+    with quiet():
+        import app
+
+    sim = FleetSim(app, args, base_url, workdir)
+    names = assign_profiles(args.profiles, args.devices, random.Random(args.seed))
+    devices = [VirtualDevice(app, sim, i, name) for i, name in enumerate(names)]
+    print(f'Simulating {len(devices)} devices against {base_url} for {args.duration:g}s ...', flush=True)
+    with quiet():
+        sim.engine.start()
+        started = time.monotonic()
+        for device in devices:
+            device.start()
+        time.sleep(args.duration)
+        sim.stopping.set()
+        deadline = time.monotonic() + args.drain
+        while sim.undelivered() and time.monotonic() < deadline:
+            time.sleep(0.2)
+        elapsed = time.monotonic() - started
+        sim.close()
+
+    server_stats = None
+    if server:
+        server_stats = server.state.snapshot()
+        server.stop()
+        requests_by_route = {}
+        for key, n in server_stats['requests'].items():
+            if '/sessions/' in key:
+                key = key.rsplit('/', 1)[0] + '/<id>'
+            requests_by_route[key] = requests_by_route.get(key, 0) + n
+        server_stats['requests'] = requests_by_route
+    result = report(sim, devices, args, elapsed, server_stats)
+    print_report(result, args)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+    undelivered = result['sos']['triggered'] - result['sos']['delivered']
+    if undelivered:
+        print(f'FAIL {undelivered} SOS clips not delivered within --drain')
+    return 1 if undelivered else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
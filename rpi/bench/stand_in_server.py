@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""Local stand-in for the cloud API used by the Raspberry Pi companion.
+
+Implements just enough of the Next.js backend for rpi/app.py to talk to it:
+
+ - POST /api/recordings/upload                 single-shot multipart upload
+ - POST /api/recordings/upload/sessions        start a resumable upload
+ - GET  /api/recordings/upload/sessions/<id>   query the acknowledged offset
+ - PUT  /api/recordings/upload/sessions/<id>   send one checksummed chunk
+ - POST /api/location/sync, /api/devices/sync  accept sync payloads
+ - GET  /stats                                 request counters as JSON
+
+Network faults can be injected to emulate a weak uplink: fixed latency, a
+bandwidth cap on request bodies, random connection drops (per MB received)
+and random 5xx errors.
+
+Usage:
+  python rpi/bench/stand_in_server.py --port 9000 --bandwidth-kbps 256 --drop-per-mb 0.3
+"""
+
+import sys
+import json
+import time
+import uuid
+import random
+import socket
+import hashlib
+import argparse
+import threading
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+UPLOAD_PATH = '/api/recordings/upload'
+SESSIONS_PATH = UPLOAD_PATH + '/sessions'
+BLOCK = 16 * 1024
+
+
+@dataclass
+class FaultProfile:
+    latency_ms: float = 0.0
+    bandwidth_kbps: float = 0.0  # 0 = unlimited
+    drop_per_mb: float = 0.0     # expected connection drops per MB of request body
+    error_rate: float = 0.0      # probability of answering 503 instead of handling
+
+
+class _Dropped(Exception):
+    pass
+
+
+class StandInState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.counters = {}
+        self.bytes_received = 0
+        self.drops = 0
+        self.uploads = []
+
+    def count(self, key):
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'requests': dict(self.counters),
+                'bytes_received': self.bytes_received,
+                'drops': self.drops,
+                'uploads': len(self.uploads),
+            }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'StandIn/1.0'
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    # ---- helpers ----
+
+    @property
+    def state(self) -> StandInState:
+        return self.server.state
+
+    @property
+    def profile(self) -> FaultProfile:
+        return self.server.profile
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get('Content-Length') or 0)
+        profile = self.profile
+        chunks = []
+        remaining = length
+        while remaining > 0:
+            block = self.rfile.read(min(BLOCK, remaining))
+            if not block:
+                raise _Dropped()
+            remaining -= len(block)
+            chunks.append(block)
+            with self.state.lock:
+                self.state.bytes_received += len(block)
+            if profile.bandwidth_kbps:
+                time.sleep(len(block) * 8 / (profile.bandwidth_kbps * 1000))
+            if profile.drop_per_mb and random.random() < profile.drop_per_mb * len(block) / (1024 * 1024):
+                raise _Dropped()
+        return b''.join(chunks)
+
+    def _drop(self):
+        with self.state.lock:
+            self.state.drops += 1
+        self.close_connection = True
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _json(self, status, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _dispatch(self, method):
+        path = self.path.split('?', 1)[0]
+        self.state.count(f'{method} {path}')
+        if self.profile.latency_ms:
+            time.sleep(self.profile.latency_ms / 1000)
+        try:
+            if self.profile.error_rate and random.random() < self.profile.error_rate:
+                self._read_body()
+                return self._json(503, {'error': 'injected failure'})
+            handler = self._route(method, path)
+            if handler is None:
+                self._read_body()
+                return self._json(404, {'error': 'not found'})
+            handler(path)
+        except _Dropped:
+            self._drop()
+
+    def _route(self, method, path):
+        if method == 'GET' and path == '/stats':
+            return self.handle_stats
+        if method == 'POST' and path == UPLOAD_PATH:
+            return self.handle_single_upload
+        if method == 'POST' and path == SESSIONS_PATH:
+            return self.handle_create_session
+        if path.startswith(SESSIONS_PATH + '/'):
+            if method == 'GET':
+                return self.handle_get_session
+            if method == 'PUT':
+                return self.handle_put_chunk
+        if method == 'POST' and path in ('/api/location/sync', '/api/devices/sync'):
+            return self.handle_sync
+        return None
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    # ---- endpoints ----
+
+    def handle_stats(self, path):
+        self._json(200, self.state.snapshot())
+
+    def handle_sync(self, path):
+        self._read_body()
+        self._json(200, {'success': True})
+
+    def _finish_upload(self, name, size):
+        url = f'http://stand-in/videos/{uuid.uuid4().hex}/{name}'
+        with self.state.lock:
+            self.state.uploads.append({'name': name, 'size': size, 'url': url})
+        return url
+
+    def handle_single_upload(self, path):
+        body = self._read_body()
+        self._json(200, {'success': True, 'url': self._finish_upload('recording.mp4', len(body))})
+
+    def handle_create_session(self, path):
+        meta = json.loads(self._read_body() or b'{}')
+        upload_id = uuid.uuid4().hex
+        with self.state.lock:
+            self.state.sessions[upload_id] = {
+                'meta': meta,
+                'size': int(meta['size']),
+                'offset': 0,
+                'hash': hashlib.sha256(),
+                'url': None,
+            }
+        self._json(200, {'upload_id': upload_id, 'offset': 0})
+
+    def _session(self, path):
+        return self.state.sessions.get(path.rsplit('/', 1)[-1])
+
+    def handle_get_session(self, path):
+        session = self._session(path)
+        if session is None:
+            return self._json(404, {'error': 'unknown upload'})
+        self._json(200, {'offset': session['offset'], 'size': session['size'], 'url': session['url']})
+
+    def handle_put_chunk(self, path):
+        session = self._session(path)
+        body = self._read_body()
+        if session is None:
+            return self._json(404, {'error': 'unknown upload'})
+        content_range = self.headers.get('Content-Range', '')
+        try:
+            span, total = content_range.split(' ', 1)[1].split('/')
+            start = session['size'] if span == '*' else int(span.split('-')[0])
+        except (IndexError, ValueError):
+            return self._json(400, {'error': 'bad Content-Range'})
+        with self.state.lock:
+            if start != session['offset']:
+                status, reply = 409, {'offset': session['offset']}
+            elif hashlib.sha256(body).hexdigest() != self.headers.get('X-Chunk-SHA256'):
+                status, reply = 422, {'error': 'chunk checksum mismatch', 'offset': session['offset']}
+            else:
+                status, reply = 200, None
+                session['hash'].update(body)
+                session['offset'] += len(body)
+            complete = session['offset'] >= session['size']
+        if reply is not None:
+            return self._json(status, reply)
+        if complete and session['url'] is None:
+            if session['hash'].hexdigest() != session['meta'].get('sha256'):
+                return self._json(422, {'error': 'file checksum mismatch'})
+            session['url'] = self._finish_upload(session['meta'].get('filename', 'upload'), session['size'])
+        self._json(200, {'offset': session['offset'], 'url': session['url']})
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # listen backlog: a simulated fleet connects all at once
+
+
+class StandInServer:
+    """Run the stand-in API on a background thread (for benchmarks)"""
+
+    def __init__(self, profile: Optional[FaultProfile] = None, host: str = '127.0.0.1', port: int = 0,
+                 verbose: bool = False):
+        self.httpd = _Server((host, port), Handler)
+        self.httpd.state = StandInState()
+        self.httpd.profile = profile or FaultProfile()
+        self.httpd.verbose = verbose
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def state(self) -> StandInState:
+        return self.httpd.state
+
+    @property
+    def profile(self) -> FaultProfile:
+        return self.httpd.profile
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main(argv: Optional[list] = None) -> int:
+    p = argparse.ArgumentParser()
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=9000)
+    p.add_argument('--latency-ms', type=float, default=0.0)
+    p.add_argument('--bandwidth-kbps', type=float, default=0.0, help='Cap on request body bandwidth (0 = unlimited)')
+    p.add_argument('--drop-per-mb', type=float, default=0.0, help='Expected connection drops per MB received')
+    p.add_argument('--error-rate', type=float, default=0.0, help='Probability of an injected 503')
+    p.add_argument('--verbose', action='store_true')
+    args = p.parse_args(argv)
+
+    profile = FaultProfile(args.latency_ms, args.bandwidth_kbps, args.drop_per_mb, args.error_rate)
+    server = StandInServer(profile, args.host, args.port, verbose=args.verbose)
+    print(f'Stand-in API listening on {server.base_url} ({profile})')
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Boot-time regression check for the Raspberry Pi companion service.
+
+Usage:
+  python rpi/check_boot.py [--runs 5] [--max-armed-ms 1000]
+
+Profile mode (default) starts app.py --runs times as it would boot (demo mode
+off a Pi, with mock GPIO and an empty recordings directory). Each run polls
+/status until every boot stage has been reached and reads the stage times,
+measured from process start. It prints the median and worst time per stage.
+
+Press mode (--press-during-boot) imports app in this process and presses the
+help button while the rest of the module is still loading. The check passes
+when that press opens a "button" incident and starts a recording once the
+action engine runs.
+
+Exit status is non-zero when:
+ - the median time-to-armed exceeds --max-armed-ms,
+ - a deferred module (Flask, requests, cv2, NumPy, geocoder, qrcode,
+   picamzero) was already imported when the button was armed,
+ - a run doesn't come up, or
+ - the boot-time press is lost.
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+from typing import Optional
+
+import requests
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+STAGES = ('armed', 'ready', 'media', 'camera', 'serving')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def boot_env(videos_dir, port):
+    env = dict(os.environ, VIDEOS_DIR=videos_dir, STREAM_PORT=str(port), GPIOZERO_PIN_FACTORY='mock',
+               PYTHONUNBUFFERED='1')
+    for name in ('SYNC_BASE_URL', 'USER_ID', 'UPLOAD_URL', 'WIFI_MANAGER'):
+        env.pop(name, None)
+    return env
+
+
+def boot_once(timeout):
+    """Start app.py, wait for every stage; returns its /status "boot" block"""
+    with tempfile.TemporaryDirectory() as tmp:
+        port = free_port()
+        proc = subprocess.Popen([sys.executable, APP], env=boot_env(tmp, port), cwd=tmp,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                if proc.poll() is not None:
+                    raise RuntimeError(f'app.py exited with status {proc.returncode}')
+                try:
+                    boot = requests.get(f'http://127.0.0.1:{port}/status', timeout=2).json()['boot']
+                    if all(stage in boot['stages_ms'] for stage in STAGES):
+                        return boot
+                except (requests.RequestException, ValueError, KeyError):
+                    pass
+                time.sleep(0.05)
+            raise RuntimeError(f'boot stages not all reached within {timeout}s')
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+def run_profile(args) -> int:
+    samples = {stage: [] for stage in STAGES}
+    early = set()
+    for run in range(args.runs):
+        try:
+            boot = boot_once(args.timeout)
+        except RuntimeError as e:
+            print(f'FAIL run {run + 1}: {e}')
+            return 2
+        for stage in STAGES:
+            samples[stage].append(boot['stages_ms'][stage])
+        early.update(boot['loaded_when_armed'])
+
+    print(f'Boot stages over {args.runs} runs (ms from process start)')
+    print(f'{"stage":<8} {"median":>8} {"max":>8}')
+    for stage in STAGES:
+        print(f'{stage:<8} {statistics.median(samples[stage]):>8.0f} {max(samples[stage]):>8.0f}')
+
+    failed = 0
+    armed = statistics.median(samples['armed'])
+    if armed > args.max_armed_ms:
+        print(f'FAIL time-to-armed {armed:.0f} ms > {args.max_armed_ms:.0f} ms')
+        failed = 3
+    if early:
+        print('FAIL imported before the button was armed:', ', '.join(sorted(early)))
+        failed = 4
+    if not failed:
+        print(f'OK time-to-armed {armed:.0f} ms (budget {args.max_armed_ms:.0f} ms)')
+    return failed
+
+
+def run_press(args) -> int:
+    os.environ.update(boot_env(tempfile.mkdtemp(), free_port()))
+    sys.path.insert(0, os.path.dirname(APP))
+    pressed = {}
+
+    def press_while_loading():
+        deadline = time.monotonic() + args.timeout
+        while time.monotonic() < deadline:
+            module = sys.modules.get('app')
+            latch = getattr(module, 'sos_latch', None)
+            if latch is not None:
+                pressed['before_handover'] = not hasattr(module, 'help_button')
+                latch.button.pin.drive_low()
+                latch.button.pin.drive_high()
+                return
+            time.sleep(0.0005)
+
+    presser = threading.Thread(target=press_while_loading, daemon=True)
+    presser.start()
+    import app
+    presser.join()
+    if not pressed.get('before_handover'):
+        print('INCONCLUSIVE: the module loaded before the press landed')
+        return 5
+
+    app.actions.start()
+    deadline = time.monotonic() + args.timeout
+    while not app.is_recording and time.monotonic() < deadline:
+        time.sleep(0.01)
+    recent = app.incidents.recent(1)
+    started = app.is_recording
+    app.stop_recording()
+    if not started or not recent or recent[0]['source'] != 'button':
+        print('FAIL the press made while booting was lost')
+        return 6
+    print(f'OK press at boot started a recording (incident {recent[0]["incident_id"]}, '
+          f'press-to-record {app.press_latency.stats()["last_ms"]} ms)')
+    return 0
+
+
+def main(argv: Optional[list] = None) -> int:
+    p = argparse.ArgumentParser()
+    p.add_argument('--runs', type=int, default=5, help='Boots to profile')
+    p.add_argument('--max-armed-ms', type=float, default=1000, help='Budget for the median time-to-armed')
+    p.add_argument('--timeout', type=float, default=30, help='Seconds to wait for a boot (or the press)')
+    p.add_argument('--press-during-boot', action='store_true',
+                   help='Check that a press while loading starts a recording instead of profiling')
+    args = p.parse_args(argv)
+    return run_press(args) if args.press_during_boot else run_profile(args)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,23 +1,35 @@
 #!/usr/bin/env python3
-"""Simple health-check/test utility for the Raspberry Pi companion service.
+"""Health-check and load-test utility for the Raspberry Pi companion service.
 
 Usage:
   python rpi/check_rpi.py --base http://127.0.0.1:8000 [--check-stream] [--timeout 10]
+  python rpi/check_rpi.py --base http://127.0.0.1:8000 --load --streams 20 --rate 50 --duration 30
 
-The script performs the following checks:
+Check mode (default) performs:
  - GET /health
  - GET /status
- - POST /camera/start and poll until camera_running is True
- - Optionally check /camera/stream for an MJPEG boundary
- - POST /camera/stop and poll until camera_running is False
+ - Optionally read /camera until one MJPEG frame arrives
 
-Exit status: 0 on success, non-zero on any failure.
+Load mode (--load) runs for --duration seconds:
+ - --streams concurrent /camera clients (with --stream-query, e.g. "width=320&fps=5"),
+   each reporting delivered fps and frame age (from the X-Timestamp part header)
+ - GET requests to --endpoints at a combined --rate per second, scheduled open-loop,
+   so latency includes any time a request waited for a free worker
+It reports p50/p95/p99/max latency and error counts per endpoint. Works against a
+real device or a demo-mode instance (run app.py on a dev box).
+
+Exit status: 0 on success, non-zero on any failure (or, in load mode, when more
+than --max-error-rate of the requests fail).
 """
 
 import sys
 import time
 import argparse
+import threading
+import http.client
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
+from urllib.parse import urlsplit
 
 import requests
 
@@ -35,57 +47,214 @@ def get_json(path: str, base: str, timeout: int = 5):
         return None, f'JSON parse error: {e}'
 
 
-def post_json(path: str, base: str, timeout: int = 5):
-    try:
-        r = requests.post(base + path, timeout=timeout)
-    except Exception as e:
-        return None, f'HTTP error: {e}'
-    if r.status_code != 200:
-        return None, f'Bad status {r.status_code}'
-    try:
-        return r.json(), None
-    except Exception as e:
-        return None, f'JSON parse error: {e}'
+def open_stream(base: str, query: str = '', timeout: float = 5):
+    """Open /camera with http.client (handles both close-delimited and chunked bodies)"""
+    url = urlsplit(base)
+    conn_cls = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+    conn = conn_cls(url.hostname, url.port, timeout=timeout)
+    path = (url.path.rstrip('/') or '') + '/camera' + (f'?{query}' if query else '')
+    conn.request('GET', path)
+    return conn, conn.getresponse()
+
+
+def read_frame(resp):
+    """Read one MJPEG part; returns (jpeg_bytes, headers) or (None, None) at end of stream"""
+    line = resp.readline()
+    while line in (b'\r\n', b'\n'):
+        line = resp.readline()
+    if not line:
+        return None, None
+    if not line.startswith(b'--frame'):
+        raise ValueError(f'unexpected MJPEG line: {line[:40]!r}')
+    headers = {}
+    while True:
+        line = resp.readline()
+        if not line:
+            return None, None
+        if line in (b'\r\n', b'\n'):
+            break
+        key, _, value = line.decode('latin-1').partition(':')
+        headers[key.strip().lower()] = value.strip()
+    data = resp.read(int(headers['content-length']))
+    return data, headers
 
 
 def check_stream(base: str, timeout: int = 5):
-    url = base + '/camera/stream'
     try:
-        r = requests.get(url, stream=True, timeout=timeout)
+        conn, resp = open_stream(base, timeout=timeout)
     except Exception as e:
         return False, f'HTTP error: {e}'
-    if r.status_code != 200:
-        return False, f'Bad status {r.status_code}'
-    # Read a small chunk and look for JPEG boundary
     try:
-        chunk = r.raw.read(2048)
+        if resp.status != 200:
+            return False, f'Bad status {resp.status}'
+        frame, _ = read_frame(resp)
     except Exception as e:
         return False, f'read error: {e}'
-    if b'--frame' in chunk or b'Content-Type: image/jpeg' in chunk:
-        return True, None
-    return False, 'no MJPEG boundary found in stream sample'
+    finally:
+        conn.close()
+    if not frame:
+        return False, 'no MJPEG frame found in stream'
+    return True, None
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else float('nan')
+
 
+class StreamClient(threading.Thread):
+    """One /camera viewer recording frame arrival times and ages"""
 
-def poll_status(base: str, expect_running: bool, timeout: int = 10, interval: float = 0.5):
-    deadline = time.time() + timeout
-    while time.time() < deadline:
-        j, err = get_json('/status', base, timeout=2)
-        if j is None:
-            time.sleep(interval)
-            continue
-        running = bool(j.get('camera_running'))
-        if running == expect_running:
-            return True, None
-        time.sleep(interval)
-    return False, f'camera_running did not become {expect_running} within {timeout}s'
+    def __init__(self, base, query, stop):
+        super().__init__(daemon=True)
+        self.base = base
+        self.query = query
+        self.stop = stop
+        self.frames = 0
+        self.bytes = 0
+        self.ages = []
+        self.error = None
+        self.first = self.last = None
+
+    def run(self):
+        conn = None
+        try:
+            conn, resp = open_stream(self.base, self.query, timeout=10)
+            if resp.status != 200:
+                raise RuntimeError(f'Bad status {resp.status}')
+            while not self.stop.is_set():
+                frame, headers = read_frame(resp)
+                if frame is None:
+                    raise RuntimeError('stream ended')
+                now = time.time()
+                if self.first is None:
+                    self.first = now
+                self.last = now
+                self.frames += 1
+                self.bytes += len(frame)
+                if 'x-timestamp' in headers:
+                    self.ages.append(now - float(headers['x-timestamp']))
+        except Exception as e:
+            if not self.stop.is_set():
+                self.error = str(e)
+        finally:
+            if conn:
+                conn.close()
+
+    @property
+    def fps(self):
+        if self.frames < 2:
+            return 0.0
+        return (self.frames - 1) / (self.last - self.first)
+
+
+class RequestLoad:
+    """Open-loop GET load: requests start on schedule whether or not earlier ones finished"""
+
+    def __init__(self, base, endpoints, rate, workers, timeout):
+        self.base = base
+        self.endpoints = endpoints
+        self.rate = rate
+        self.timeout = timeout
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.results = {e: {'latencies': [], 'errors': 0} for e in endpoints}
+
+    def _session(self):
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def _one(self, endpoint, scheduled):
+        ok = False
+        try:
+            r = self._session().get(self.base + endpoint, timeout=self.timeout)
+            ok = r.status_code < 400
+        except Exception:
+            pass
+        latency = time.monotonic() - scheduled
+        with self.lock:
+            stats = self.results[endpoint]
+            stats['latencies'].append(latency)
+            stats['errors'] += 0 if ok else 1
+
+    def run(self, duration, stop):
+        if self.rate <= 0:
+            return
+        interval = 1.0 / self.rate
+        start = time.monotonic()
+        n = 0
+        while not stop.is_set():
+            scheduled = start + n * interval
+            if scheduled - start >= duration:
+                break
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.pool.submit(self._one, self.endpoints[n % len(self.endpoints)], scheduled)
+            n += 1
+        self.pool.shutdown(wait=True)
+
+
+def run_load(args, base) -> int:
+    stop = threading.Event()
+    endpoints = [e if e.startswith('/') else '/' + e for e in args.endpoints.split(',') if e]
+    clients = [StreamClient(base, args.stream_query, stop) for _ in range(args.streams)]
+    for c in clients:
+        c.start()
+    load = RequestLoad(base, endpoints, args.rate, args.workers, args.request_timeout)
+    print(f'Load: {args.streams} x /camera?{args.stream_query}, {args.rate}/s over {", ".join(endpoints)} '
+          f'for {args.duration}s')
+    started = time.monotonic()
+    load.run(args.duration, stop)
+    time.sleep(max(0.0, args.duration - (time.monotonic() - started)))
+    stop.set()
+    for c in clients:
+        c.join(timeout=5)
+
+    failed = False
+    if clients:
+        fps = sorted(c.fps for c in clients)
+        ages = sorted(a for c in clients for a in c.ages)
+        errors = [c.error for c in clients if c.error]
+        mb = sum(c.bytes for c in clients) / 1024 / 1024
+        print(f'\n/camera streams: {len(clients)} clients, {len(errors)} errors, {mb / args.duration:.2f} MB/s total')
+        print(f'  fps per client  min {fps[0]:.1f}  p50 {percentile(fps, 0.5):.1f}  max {fps[-1]:.1f}')
+        if ages:
+            print(f'  frame age ms    p50 {percentile(ages, 0.5) * 1000:.0f}  p95 {percentile(ages, 0.95) * 1000:.0f}'
+                  f'  p99 {percentile(ages, 0.99) * 1000:.0f}  max {ages[-1] * 1000:.0f}')
+        for error in sorted(set(errors)):
+            print('  error:', error)
+        failed = len(errors) > args.max_error_rate * len(clients)
+
+    if endpoints and args.rate > 0:
+        print(f'\n{"endpoint":<20} {"requests":>9} {"errors":>7} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"max ms":>8}')
+        for endpoint, stats in load.results.items():
+            lat = sorted(stats['latencies'])
+            count = len(lat)
+            row = [percentile(lat, q) * 1000 for q in (0.5, 0.95, 0.99)] + [lat[-1] * 1000 if lat else float('nan')]
+            print(f'{endpoint:<20} {count:>9} {stats["errors"]:>7} ' + ' '.join(f'{v:>8.1f}' for v in row))
+            if count and stats['errors'] > args.max_error_rate * count:
+                failed = True
+
+    return 7 if failed else 0
 
 
 def main(argv: Optional[list] = None) -> int:
     p = argparse.ArgumentParser()
     p.add_argument('--base', default='http://127.0.0.1:8000', help='Base URL of the service')
-    p.add_argument('--timeout', type=int, default=10, help='Timeout for start/stop polling (seconds)')
-    p.add_argument('--check-stream', action='store_true', help='Verify MJPEG stream contains a frame boundary')
-    p.add_argument('--no-camera', action='store_true', help='Skip starting/stopping the camera (useful for dev machines without a camera)')
+    p.add_argument('--timeout', type=int, default=10, help='Timeout for the stream check (seconds)')
+    p.add_argument('--check-stream', action='store_true', help='Verify /camera delivers an MJPEG frame')
+    p.add_argument('--no-camera', action='store_true', help='Skip all /camera checks (useful for dev machines without a camera)')
+    p.add_argument('--load', action='store_true', help='Run the concurrent load test instead of the checks')
+    p.add_argument('--streams', type=int, default=10, help='Concurrent /camera clients (load mode)')
+    p.add_argument('--stream-query', default='', help='Query string for /camera, e.g. "width=320&fps=5"')
+    p.add_argument('--endpoints', default='/status,/location,/record/status', help='Comma-separated GET endpoints to load')
+    p.add_argument('--rate', type=float, default=20, help='Combined requests per second across --endpoints')
+    p.add_argument('--workers', type=int, default=32, help='Concurrent request workers')
+    p.add_argument('--duration', type=float, default=30, help='Load test length (seconds)')
+    p.add_argument('--request-timeout', type=float, default=10)
+    p.add_argument('--max-error-rate', type=float, default=0.01, help='Fail if more than this fraction errors')
 
     args = p.parse_args(argv)
     base = args.base.rstrip('/')
@@ -97,6 +266,11 @@ def main(argv: Optional[list] = None) -> int:
         return 2
     print('OK /health ->', j)
 
+    if args.load:
+        if args.no_camera:
+            args.streams = 0
+        return run_load(args, base)
+
     print('Checking /status...')
     j, err = get_json('/status', base)
     if j is None:
@@ -104,43 +278,13 @@ def main(argv: Optional[list] = None) -> int:
         return 3
     print('OK /status ->', j)
 
-    if args.no_camera:
-        print('Skipping camera start/stop (--no-camera)')
-    else:
-        print('Stopping camera (best-effort)')
-        post_json('/camera/stop', base)
-        ok, err = poll_status(base, expect_running=False, timeout=args.timeout)
-        if not ok:
-            print('FAIL stopping camera ->', err)
-            # Continue to try starting
-        else:
-            print('camera stopped')
-
-        print('Starting camera')
-        j, err = post_json('/camera/start', base)
-        if j is None:
-            print('FAIL /camera/start ->', err)
-            return 4
-        print('start response ->', j)
-        ok, err = poll_status(base, expect_running=True, timeout=args.timeout)
+    if args.check_stream and not args.no_camera:
+        print('Checking /camera (first frame)...')
+        ok, err = check_stream(base, timeout=args.timeout)
         if not ok:
-            print('FAIL starting camera ->', err)
-            return 5
-        print('camera started')
-
-        if args.check_stream:
-            print('Checking /camera/stream (sample read)...')
-            ok, err = check_stream(base, timeout=5)
-            if not ok:
-                print('FAIL /camera/stream ->', err)
-                return 6
-            print('OK /camera/stream')
-
-    print('Stopping camera (cleanup)')
-    post_json('/camera/stop', base)
-    ok, err = poll_status(base, expect_running=False, timeout=args.timeout)
-    if not ok:
-        print('WARNING: could not stop camera cleanly ->', err)
+            print('FAIL /camera ->', err)
+            return 6
+        print('OK /camera')
 
     print('All checks passed')
     return 0
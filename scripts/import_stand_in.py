@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""Local stand-in for the services scripts/import_videos.py talks to, plus an end-to-end check.
+
+One server plays every part of a bulk import:
+
+ - GET    /files/<name>                          source video (Content-Length, streamed)
+ - POST   /storage/v1/object/<bucket>/<name>     Supabase Storage upload (plain or chunked body)
+ - DELETE /storage/v1/object/<bucket>/<name>     Supabase Storage delete
+ - GET    /rest/v1/videos                        PostgREST select (limit/offset)
+ - POST   /rest/v1/videos                        PostgREST insert (one object or an array)
+ - GET    /stats                                 request counters, objects, rows and peak
+                                                 concurrent uploads as JSON
+
+Source files are generated on the fly from a seed, so large imports need no
+disk space and the server never holds a whole file in memory. Files that share
+a seed have the same content, which is how duplicates are produced.
+--drop-rate cuts that fraction of downloads off halfway through.
+
+By default, main() generates a manifest and imports it twice with
+import_videos.main(). The manifest also has an entry with different content
+under the same name as the first file. The first run must store every distinct
+file exactly once, under a name of its own, despite the dropped downloads. The second run must finish everything from the
+checkpoint and must not re-download an extra entry whose sha256 is already
+known. It reports throughput and the process's peak RSS, which should stay
+flat as --size-mb grows.
+
+Usage:
+  python scripts/import_stand_in.py --files 12 --duplicates 3 --size-mb 16 --workers 4 --drop-rate 0.1
+  python scripts/import_stand_in.py --serve --port 9100 --manifest /tmp/manifest.jsonl
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import hashlib
+import argparse
+import resource
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+
+BLOCK = 64 * 1024
+STORAGE_PATH = '/storage/v1/object/'
+ROWS_PATH = '/rest/v1/videos'
+
+
+class _Dropped(Exception):
+    pass
+
+
+class SourceFile:
+    """A generated source video: a seeded random block repeated up to size"""
+
+    def __init__(self, name, size, seed):
+        self.name = name
+        self.size = size
+        self.seed = seed
+
+    def blocks(self):
+        block = random.Random(self.seed).randbytes(BLOCK)
+        remaining = self.size
+        while remaining > 0:
+            yield block[:remaining]
+            remaining -= len(block)
+
+    def sha256(self):
+        digest = hashlib.sha256()
+        for block in self.blocks():
+            digest.update(block)
+        return digest.hexdigest()
+
+
+class ImportState:
+    def __init__(self, files=(), drop_rate=0.0):
+        self.lock = threading.Lock()
+        self.files = {f.name: f for f in files}
+        self.drop_rate = drop_rate
+        self.objects = {}  # (bucket, name) -> {'size', 'sha256', 'content_type'}
+        self.rows = []
+        self.counters = {}
+        self.uploading = 0
+        self.peak_uploading = 0
+
+    def count(self, key):
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'requests': dict(self.counters),
+                'objects': len(self.objects),
+                'rows': len(self.rows),
+                'peak_uploading': self.peak_uploading,
+            }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'ImportStandIn/1.0'
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    @property
+    def state(self) -> ImportState:
+        return self.server.state
+
+    def _body_blocks(self):
+        """Yield the request body block by block, Content-Length or chunked"""
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    raise _Dropped()
+                size = int(line.split(b';')[0].strip(), 16)
+                if size == 0:
+                    while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                        pass
+                    return
+                yield from self._read_exact(size)
+                self.rfile.readline()
+        else:
+            yield from self._read_exact(int(self.headers.get('Content-Length') or 0))
+
+    def _read_exact(self, length):
+        while length > 0:
+            block = self.rfile.read(min(BLOCK, length))
+            if not block:
+                raise _Dropped()
+            length -= len(block)
+            yield block
+
+    def _read_body(self) -> bytes:
+        return b''.join(self._body_blocks())
+
+    def _drop(self):
+        self.close_connection = True
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _json(self, status, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _dispatch(self, method):
+        path = urlsplit(self.path).path
+        key = path.rsplit('/', 1)[0] + '/*' if path.startswith(('/files/', STORAGE_PATH)) else path
+        self.state.count(f'{method} {key}')
+        try:
+            handler = self._route(method, path)
+            if handler is None:
+                self._read_body()
+                return self._json(404, {'error': 'not found'})
+            handler(path)
+        except _Dropped:
+            self._drop()
+
+    def _route(self, method, path):
+        if method == 'GET' and path == '/stats':
+            return self.handle_stats
+        if method == 'GET' and path.startswith('/files/'):
+            return self.handle_source
+        if path.startswith(STORAGE_PATH):
+            if method == 'POST':
+                return self.handle_upload
+            if method == 'DELETE':
+                return self.handle_delete
+        if path == ROWS_PATH:
+            if method == 'GET':
+                return self.handle_select
+            if method == 'POST':
+                return self.handle_insert
+        return None
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    # ---- endpoints ----
+
+    def handle_stats(self, path):
+        self._json(200, self.state.snapshot())
+
+    def handle_source(self, path):
+        source = self.state.files.get(unquote(path[len('/files/'):]))
+        if source is None:
+            return self._json(404, {'error': 'no such file'})
+        cut = source.size // 2 if random.random() < self.state.drop_rate else None
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(source.size))
+        self.end_headers()
+        sent = 0
+        for block in source.blocks():
+            if cut is not None and sent + len(block) > cut:
+                self.wfile.write(block[:cut - sent])
+                raise _Dropped()
+            self.wfile.write(block)
+            sent += len(block)
+
+    def _object_key(self, path):
+        bucket, _, name = path[len(STORAGE_PATH):].partition('/')
+        return bucket, unquote(name)
+
+    def handle_upload(self, path):
+        key = self._object_key(path)
+        with self.state.lock:
+            self.state.uploading += 1
+            self.state.peak_uploading = max(self.state.peak_uploading, self.state.uploading)
+        try:
+            digest = hashlib.sha256()
+            size = 0
+            for block in self._body_blocks():
+                digest.update(block)
+                size += len(block)
+        finally:
+            with self.state.lock:
+                self.state.uploading -= 1
+        with self.state.lock:
+            if key in self.state.objects and self.headers.get('x-upsert') != 'true':
+                return self._json(409, {'error': 'Duplicate', 'message': 'The resource already exists'})
+            self.state.objects[key] = {
+                'size': size,
+                'sha256': digest.hexdigest(),
+                'content_type': self.headers.get('Content-Type'),
+            }
+        self._json(200, {'Key': '/'.join(key)})
+
+    def handle_delete(self, path):
+        self._read_body()
+        with self.state.lock:
+            removed = self.state.objects.pop(self._object_key(path), None)
+        if removed is None:
+            return self._json(404, {'error': 'not_found'})
+        self._json(200, {'message': 'Successfully deleted'})
+
+    def handle_select(self, path):
+        query = parse_qs(urlsplit(self.path).query)
+        columns = query.get('select', ['*'])[0].split(',')
+        offset = int(query.get('offset', ['0'])[0])
+        limit = int(query.get('limit', ['1000'])[0])
+        with self.state.lock:
+            rows = list(self.state.rows)
+        if query.get('content_hash') == ['not.is.null']:
+            rows = [r for r in rows if r.get('content_hash')]
+        rows = rows[offset:offset + limit]
+        self._json(200, rows if columns == ['*'] else [{c: r.get(c) for c in columns} for r in rows])
+
+    def handle_insert(self, path):
+        rows = json.loads(self._read_body() or b'[]')
+        rows = rows if isinstance(rows, list) else [rows]
+        with self.state.lock:
+            self.state.rows.extend(rows)
+        if self.headers.get('Prefer') == 'return=minimal':
+            self.send_response(201)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        else:
+            self._json(201, rows)
+
+
+class ImportStandIn:
+    """Threaded HTTP server running the handler above; start() serves in the background"""
+
+    def __init__(self, files=(), drop_rate: float = 0.0, host: str = '127.0.0.1', port: int = 0,
+                 verbose: bool = False):
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = ImportState(files, drop_rate)
+        self.httpd.verbose = verbose
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def state(self) -> ImportState:
+        return self.httpd.state
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def make_files(count, duplicates, size):
+    """count distinct files, then duplicates more files copying the content of earlier ones"""
+    files = [SourceFile(f'clip_{i:04d}.mp4', size, seed=i) for i in range(count)]
+    files += [SourceFile(f'copy_{i:04d}.mp4', size, seed=i % count) for i in range(duplicates)]
+    return files
+
+
+def write_manifest(path, base_url, files, extra=()):
+    with open(path, 'w') as f:
+        for source in files:
+            f.write(json.dumps({'url': f'{base_url}/files/{source.name}', 'name': source.name}) + '\n')
+        for entry in extra:
+            f.write(json.dumps(entry) + '\n')
+
+
+def verify(state, files):
+    """Problems with what the import left behind, as a list of strings"""
+    problems = []
+    expected = {source.sha256() for source in files}
+    with state.lock:
+        objects = dict(state.objects)
+        rows = list(state.rows)
+    hashes = [row['content_hash'] for row in rows]
+    names = [row['filename'] for row in rows]
+    if len(names) != len(set(names)):
+        problems.append(f'{len(names) - len(set(names))} rows share a file name')
+    if len(hashes) != len(set(hashes)):
+        problems.append(f'{len(hashes) - len(set(hashes))} duplicate rows')
+    if set(hashes) != expected:
+        problems.append(f'rows cover {len(set(hashes) & expected)} of {len(expected)} distinct files')
+    if len(objects) != len(expected):
+        problems.append(f'{len(objects)} objects stored for {len(expected)} distinct files')
+    for row in rows:
+        stored = objects.get(('videos', row['filename']))
+        if stored is None or stored['sha256'] != row['content_hash'] or stored['size'] != row['size']:
+            problems.append(f'row {row["filename"]} does not match its stored object')
+    return problems
+
+
+def main(argv: Optional[list] = None) -> int:
+    p = argparse.ArgumentParser()
+    p.add_argument('--files', type=int, default=12, help='Distinct source files')
+    p.add_argument('--duplicates', type=int, default=3, help='Extra files repeating earlier content')
+    p.add_argument('--size-mb', type=float, default=8, help='Size of each source file')
+    p.add_argument('--workers', type=int, default=4)
+    p.add_argument('--batch-size', type=int, default=5)
+    p.add_argument('--drop-rate', type=float, default=0.1, help='Fraction of downloads cut off halfway')
+    p.add_argument('--serve', action='store_true', help='Only serve (write --manifest and block)')
+    p.add_argument('--manifest', help='Where --serve writes the manifest')
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=0)
+    p.add_argument('--verbose', action='store_true')
+    args = p.parse_args(argv)
+
+    files = make_files(args.files, args.duplicates, int(args.size_mb * 1024 * 1024))
+    # Different content, imported under the same name as the first file
+    clash = SourceFile('other/clip_0000.mp4', int(args.size_mb * 1024 * 1024), seed=args.files)
+    server = ImportStandIn(files + [clash], args.drop_rate, args.host, args.port, verbose=args.verbose)
+
+    if args.serve:
+        manifest = args.manifest or os.path.join(tempfile.gettempdir(), 'import_manifest.jsonl')
+        write_manifest(manifest, server.base_url, files)
+        print(f'Import stand-in listening on {server.base_url}, manifest {manifest}')
+        print(f'  python scripts/import_videos.py --supabase-url {server.base_url} --manifest {manifest}')
+        try:
+            server.httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import import_videos
+
+    server.start()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = os.path.join(tmp, 'manifest.jsonl')
+            same_name = {'url': f'{server.base_url}/files/{clash.name}', 'name': files[0].name}
+            write_manifest(manifest, server.base_url, files, extra=[same_name])
+            common = ['--supabase-url', server.base_url, '--manifest', manifest, '--workers', str(args.workers),
+                      '--batch-size', str(args.batch_size), '--retries', '5']
+
+            print(f'Run 1: {len(files)} files ({args.duplicates} duplicates) of {args.size_mb:g} MB, '
+                  f'{args.drop_rate:.0%} of downloads dropped')
+            started = time.perf_counter()
+            first = import_videos.main(common)
+            elapsed = time.perf_counter() - started
+            problems = verify(server.state, files + [clash])
+            downloads = server.state.snapshot()['requests'].get('GET /files/*', 0)
+
+            # Resume with one more entry whose declared hash is already stored: nothing may be downloaded
+            known = files[0]
+            write_manifest(manifest, server.base_url, files, extra=[same_name, {
+                'url': f'{server.base_url}/files/{known.name}?mirror=1', 'name': 'declared_copy.mp4',
+                'sha256': known.sha256()
+            }])
+            print('\nRun 2: same manifest from the checkpoint, plus a declared duplicate')
+            second = import_videos.main(common)
+            stats = server.state.snapshot()
+            if stats['requests'].get('GET /files/*', 0) != downloads:
+                problems.append('second run downloaded again')
+            problems += [p for p in verify(server.state, files + [clash]) if p not in problems]
+    finally:
+        server.stop()
+
+    total_mb = (len(files) + 1) * args.size_mb
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'\n{total_mb:g} MB of sources in {elapsed:.1f}s ({total_mb / elapsed:.1f} MB/s), '
+          f'{downloads} downloads, peak {stats["peak_uploading"]} concurrent uploads, '
+          f'{stats["requests"].get("POST " + ROWS_PATH, 0)} inserts, peak RSS {peak_mb:.0f} MB')
+    if first or second:
+        problems.append(f'import exit codes {first}, {second}')
+    for problem in problems:
+        print('FAIL', problem)
+    if not problems:
+        print('OK: every distinct file stored once under its own name, resume skipped finished and known content')
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,19 +1,51 @@
 #!/usr/bin/env python3
 """
-Script to import existing videos from Google Drive to Supabase Storage
+Script to import existing videos into Supabase Storage and the videos table
 Run this on your local machine with internet access
+
+Without arguments the Google Drive links in VIDEO_LINKS are imported. For a
+bulk import pass --manifest, a file with one entry per line: either a URL
+(optionally followed by a file name) or a JSON object such as
+{"url": ..., "name": ..., "sha256": ..., "device_id": ..., "timestamp": ...}.
+
+Each file is streamed from its source straight into storage in --chunk-kb
+pieces, so memory stays bounded whatever the file size, and --workers
+transfers run at once. Content is hashed (SHA-256) on the way through and
+stored in videos.content_hash. Content that was already imported is not
+stored twice, and an entry that lists a known sha256 is skipped without
+downloading it. Rows are inserted --batch-size at a time. Finished entries
+are appended to a checkpoint file, so an interrupted run resumes where it
+stopped.
+
+Object names are never overwritten. An entry whose name is already used by
+another entry, by a row in the table or by an object in the bucket is
+imported as name_2, name_3 and so on.
+
+Storage and the table are reached through their REST APIs. For a local
+dry run, point --supabase-url at scripts/import_stand_in.py.
+
+Usage:
+  python scripts/import_videos.py
+  python scripts/import_videos.py --manifest videos.txt --workers 8 --batch-size 100
 """
 
 import os
+import sys
+import json
 import time
+import hashlib
+import argparse
+import resource
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from urllib.parse import urlsplit, quote
+
 import requests
-from supabase import create_client
 
 SUPABASE_URL = os.getenv("NEXT_PUBLIC_SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-
 VIDEO_LINKS = [
     "https://drive.google.com/uc?id=1nbPXnr26pgJj9CobCEEgUNKxwgjvkAga",
     "https://drive.google.com/uc?id=10d2mLTJ4phxO9nSlQsoFCdkcRittq3tG",
@@ -25,34 +57,357 @@ VIDEO_LINKS = [
     "https://drive.google.com/uc?id=1qnj0OhpNKG5dg57lFE-9Q0K4yr1aACKD"
 ]
 
-def download_and_upload(url, filename):
-    print(f"⬇ Downloading {filename}")
-    r = requests.get(url, stream=True)
-    if r.status_code != 200:
-        print("❌ Download failed")
-        return
-
-    data = r.content
-
-    print(f"⬆ Uploading {filename}")
-    res = supabase.storage.from_("videos").upload(
-        filename,
-        data,
-        file_options={"content-type": "video/mp4", "upsert": True}
-    )
-
-    if res:
-        public_url = supabase.storage.from_("videos").get_public_url(filename)
-        supabase.table("videos").insert({
-            "filename": filename,
-            "url": public_url,
-            "timestamp": int(time.time() * 1000),
-            "size": len(data),
-            "device_id": "imported"
-        }).execute()
-        print("✅ Done")
+def read_manifest(path):
+    entries = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                entries.append(json.loads(line))
+                continue
+            parts = line.split(None, 1)
+            entry = {"url": parts[0]}
+            if len(parts) > 1:
+                entry["name"] = parts[1].strip()
+            entries.append(entry)
+    return entries
+
+def object_name(entry, index):
+    if entry.get("name"):
+        return entry["name"]
+    base = os.path.basename(urlsplit(entry["url"]).path)
+    return base if "." in base else f"imported_{index + 1}.mp4"
+
+class NameTaken(Exception):
+    """The object name is already used in the bucket"""
+
+class HashingReader:
+    """File-like view of a streaming download that hashes and counts the bytes read through it"""
+
+    def __init__(self, raw, length, chunk_size):
+        self.raw = raw
+        self.length = length
+        self.chunk_size = chunk_size
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def __len__(self):
+        return self.length
+
+    def read(self, n=-1):
+        data = self.raw.read(self.chunk_size if n is None or n < 0 else min(n, self.chunk_size),
+                             decode_content=False)
+        self.hash.update(data)
+        self.size += len(data)
+        return data
+
+    def chunks(self):
+        while True:
+            data = self.read()
+            if not data:
+                return
+            yield data
+
+class Importer:
+    """Concurrent, resumable, deduplicating copy of source URLs into Supabase"""
+
+    def __init__(self, base_url, key, bucket="videos", workers=4, batch_size=50, checkpoint=None,
+                 retries=3, chunk_size=1024 * 1024):
+        self.base_url = base_url.rstrip("/")
+        self.key = key
+        self.bucket = bucket
+        self.workers = workers
+        self.batch_size = batch_size
+        self.checkpoint_path = checkpoint
+        self.retries = retries
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._batch = []
+        self.known = {}  # sha256 -> object name holding that content
+        self.done = set()  # source URLs finished in an earlier run
+        self.claimed = {}  # source URL -> object name an earlier, interrupted run uploaded it to
+        self.filenames = set()  # names that have a row in the table
+        self.taken = set()  # names no new entry may use: rows, and names claimed by any run
+        self.stats = {"imported": 0, "duplicates": 0, "resumed": 0, "renamed": 0, "failed": 0, "bytes": 0,
+                      "batches": 0}
+
+    def session(self):
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+            self._local.session.headers.update({"Authorization": f"Bearer {self.key}", "apikey": self.key})
+        return self._local.session
+
+    def public_url(self, name):
+        return f"{self.base_url}/storage/v1/object/public/{self.bucket}/{quote(name)}"
+
+    def with_retries(self, what, fn, *args):
+        for attempt in range(1, self.retries + 1):
+            try:
+                return fn(*args)
+            except NameTaken:
+                raise  # Retrying the same name can't help
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                delay = min(30, 2 ** attempt)
+                print(f"⚠️ {what} failed ({e}), retrying in {delay}s")
+                time.sleep(delay)
+
+    # ---- state ----
+
+    def load_checkpoint(self):
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return
+        with open(self.checkpoint_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Torn last line from an interrupted run
+                if record.get("status") == "claimed":
+                    self.claimed[record["url"]] = record["name"]
+                elif record.get("status") in ("imported", "duplicate"):
+                    self.done.add(record["url"])
+                    self.taken.add(record.get("name"))
+                    if record.get("sha256"):
+                        self.known.setdefault(record["sha256"], record.get("name"))
+
+    def load_existing_rows(self, page=1000):
+        """Read the content hashes and file names already in the table"""
+        offset = 0
+        while True:
+            r = self.session().get(f"{self.base_url}/rest/v1/videos", params={
+                "select": "content_hash,filename", "limit": page, "offset": offset
+            }, timeout=30)
+            r.raise_for_status()
+            rows = r.json()
+            for row in rows:
+                self.filenames.add(row["filename"])
+                if row["content_hash"]:
+                    self.known.setdefault(row["content_hash"], row["filename"])
+            if len(rows) < page:
+                self.taken |= self.filenames
+                return
+            offset += page
+
+    def write_checkpoint(self, records):
+        if not self.checkpoint_path:
+            return
+        with self._lock:
+            with open(self.checkpoint_path, "a") as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+
+    # ---- transfer ----
+
+    def run(self, entries):
+        pending = self.assign_names(entries)
+        self.stats["resumed"] = len(entries) - len(pending)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for _ in pool.map(lambda item: self.import_one(*item), pending):
+                pass
+        self.flush()
+        return self.stats
+
+    def assign_names(self, entries):
+        """Give each entry still to do a name of its own; returns [(entry, name, upsert)].
+
+        An entry keeps the name an interrupted run claimed for it, and may
+        overwrite the object there, which is its own partial upload. Every
+        other entry gets a name that no row, claim or earlier entry uses.
+        """
+        todo = [(i, e) for i, e in enumerate(entries) if e["url"] not in self.done]
+        self.taken |= {self.claimed[e["url"]] for _, e in todo if e["url"] in self.claimed}
+        pending = []
+        for index, entry in todo:
+            name = self.claimed.get(entry["url"])
+            if name in self.filenames:
+                continue  # Its row went in just before the interruption; only the checkpoint line is missing
+            if name:
+                pending.append((entry, name, True))
+                continue
+            base = object_name(entry, index)
+            name = self.unique_name(base)
+            if name != base:
+                print(f"⚠️ {base} is already used, importing {entry['url']} as {name}")
+            pending.append((entry, name, False))
+        return pending
+
+    def unique_name(self, base):
+        """base, or the first free base_2, base_3...; reserves the name it returns"""
+        root, ext = os.path.splitext(base)
+        with self._lock:
+            name, n = base, 1
+            while name in self.taken:
+                n += 1
+                name = f"{root}_{n}{ext}"
+            self.taken.add(name)
+            if name != base:
+                self.stats["renamed"] += 1
+            return name
+
+    def import_one(self, entry, name, upsert):
+        url = entry["url"]
+        declared = entry.get("sha256")
+        with self._lock:
+            owner = self.known.get(declared) if declared else None
+        if owner is not None:
+            return self.duplicate(url, name, declared, owner)
+
+        print(f"⬇⬆ {name}")
+        try:
+            while True:
+                # Recorded first, so a resumed run knows the object at this name is this entry's
+                self.write_checkpoint([{"url": url, "status": "claimed", "name": name}])
+                try:
+                    sha256, size = self.with_retries(name, self.transfer, url, name, upsert)
+                    break
+                except NameTaken:
+                    renamed = self.unique_name(name)
+                    print(f"⚠️ {name} already exists in the bucket, importing as {renamed}")
+                    name = renamed
+        except Exception as e:
+            return self.failed(url, name, e)
+
+        with self._lock:
+            owner = self.known.setdefault(sha256, name)
+            if owner == name:
+                self.stats["bytes"] += size
+        if owner != name:
+            try:
+                self.with_retries(f"delete {name}", self.delete, name)
+            except Exception as e:
+                return self.failed(url, name, e)  # Same content as owner, but its copy is still stored
+            return self.duplicate(url, name, sha256, owner)
+
+        self.add_row({"url": url, "status": "imported", "name": name, "sha256": sha256}, {
+            "filename": name,
+            "url": self.public_url(name),
+            "timestamp": entry.get("timestamp") or int(time.time() * 1000),
+            "size": size,
+            "device_id": entry.get("device_id") or "imported",
+            "content_hash": sha256
+        })
+        print(f"✅ {name} ({size / 1024 / 1024:.1f} MB)")
+
+    def transfer(self, url, name, upsert=False):
+        """Stream one source URL into storage; returns (sha256, size)"""
+        session = self.session()
+        with session.get(url, stream=True, timeout=(10, 60)) as source:
+            source.raise_for_status()
+            length = source.headers.get("Content-Length")
+            content_type = source.headers.get("Content-Type", "").split(";")[0]
+            if not content_type.startswith("video/"):
+                content_type = "video/mp4"
+            reader = HashingReader(source.raw, int(length) if length else None, self.chunk_size)
+            r = session.post(
+                f"{self.base_url}/storage/v1/object/{self.bucket}/{quote(name)}",
+                data=reader if length else reader.chunks(),
+                headers={"Content-Type": content_type, "x-upsert": "true" if upsert else "false"},
+                timeout=(10, 300)
+            )
+            if r.status_code in (400, 409) and "Duplicate" in r.text:
+                raise NameTaken(name)
+            r.raise_for_status()
+        if length and reader.size != int(length):
+            raise IOError(f"source ended after {reader.size} of {length} bytes")
+        return reader.hash.hexdigest(), reader.size
+
+    def delete(self, name):
+        r = self.session().delete(f"{self.base_url}/storage/v1/object/{self.bucket}/{quote(name)}", timeout=30)
+        if r.status_code not in (200, 404):
+            r.raise_for_status()
+
+    def failed(self, url, name, error):
+        print(f"❌ {name}: {error}")
+        with self._lock:
+            self.stats["failed"] += 1
+        self.write_checkpoint([{"url": url, "status": "failed", "name": name, "error": str(error)}])
+
+    def duplicate(self, url, name, sha256, owner):
+        print(f"♻️ {name}: same content as {owner}")
+        with self._lock:
+            self.stats["duplicates"] += 1
+        self.write_checkpoint([{"url": url, "status": "duplicate", "name": owner, "sha256": sha256}])
+
+    # ---- rows ----
+
+    def add_row(self, record, row):
+        with self._lock:
+            self._batch.append((record, row))
+            if len(self._batch) < self.batch_size:
+                return
+            batch, self._batch = self._batch, []
+        self.insert(batch)
+
+    def flush(self):
+        with self._lock:
+            batch, self._batch = self._batch, []
+        if batch:
+            self.insert(batch)
+
+    def insert(self, batch):
+        def post():
+            r = self.session().post(f"{self.base_url}/rest/v1/videos", json=[row for _, row in batch],
+                                    headers={"Prefer": "return=minimal"}, timeout=60)
+            r.raise_for_status()
+
+        try:
+            self.with_retries("videos insert", post)
+        except Exception as e:
+            # The objects are stored but have no rows: later entries with the same content mustn't point at them
+            with self._lock:
+                for record, _ in batch:
+                    if self.known.get(record["sha256"]) == record["name"]:
+                        del self.known[record["sha256"]]
+            for record, _ in batch:
+                self.failed(record["url"], record["name"], f"videos insert: {e}")
+            return
+        # Only rows that are in the table count as done; anything else is redone on resume
+        self.write_checkpoint([record for record, _ in batch])
+        with self._lock:
+            self.stats["imported"] += len(batch)
+            self.stats["batches"] += 1
+
+def main(argv: Optional[list] = None) -> int:
+    p = argparse.ArgumentParser()
+    p.add_argument("--manifest", help="File listing the videos to import (default: VIDEO_LINKS)")
+    p.add_argument("--workers", type=int, default=4, help="Concurrent transfers")
+    p.add_argument("--batch-size", type=int, default=50, help="videos rows per insert")
+    p.add_argument("--checkpoint", help="Progress file (default: <manifest>.checkpoint.jsonl)")
+    p.add_argument("--retries", type=int, default=3, help="Attempts per transfer")
+    p.add_argument("--chunk-kb", type=int, default=1024, help="Streaming chunk size")
+    p.add_argument("--bucket", default="videos")
+    p.add_argument("--supabase-url", default=SUPABASE_URL, help="Defaults to NEXT_PUBLIC_SUPABASE_URL")
+    args = p.parse_args(argv)
+
+    if not args.supabase_url:
+        print("Set NEXT_PUBLIC_SUPABASE_URL (and SUPABASE_SERVICE_ROLE_KEY) or pass --supabase-url")
+        return 2
+    if args.manifest:
+        entries = read_manifest(args.manifest)
+        checkpoint = args.checkpoint or args.manifest + ".checkpoint.jsonl"
+    else:
+        entries = [{"url": url} for url in VIDEO_LINKS]
+        checkpoint = args.checkpoint or "import_videos.checkpoint.jsonl"
+
+    importer = Importer(args.supabase_url, SUPABASE_KEY or "", args.bucket, args.workers, args.batch_size,
+                        checkpoint, args.retries, args.chunk_kb * 1024)
+    importer.load_checkpoint()
+    importer.load_existing_rows()
+    started = time.perf_counter()
+    stats = importer.run(entries)
+    elapsed = time.perf_counter() - started
+
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"Imported {stats['imported']} ({stats['renamed']} renamed), duplicates {stats['duplicates']}, "
+          f"already done {stats['resumed']}, failed {stats['failed']} - {stats['bytes'] / 1024 / 1024:.1f} MB in {elapsed:.1f}s "
+          f"({stats['bytes'] / 1024 / 1024 / max(elapsed, 1e-6):.1f} MB/s), {stats['batches']} inserts, "
+          f"peak RSS {peak_mb:.0f} MB")
+    return 1 if stats["failed"] else 0
 
 if __name__ == "__main__":
-    for i, link in enumerate(VIDEO_LINKS):
-        download_and_upload(link, f"imported_{i+1}.mp4")
-        time.sleep(1)
\ No newline at end of file
+    sys.exit(main())
@@ -118,4 +118,48 @@ CREATE INDEX idx_videos_timestamp ON videos(timestamp DESC);
 CREATE INDEX idx_guardians_user_id ON guardians(user_id);
 CREATE INDEX idx_locations_user_id_timestamp ON locations(user_id, timestamp DESC);
 CREATE INDEX idx_devices_user_id ON devices(user_id);
-CREATE INDEX idx_devices_last_seen ON devices(last_seen DESC);
\ No newline at end of file
+CREATE INDEX idx_devices_last_seen ON devices(last_seen DESC);
+
+-- 14. Segmented recordings: segments of one session share a session_id
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS session_id TEXT;
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS segment_index INTEGER;
+CREATE INDEX IF NOT EXISTS idx_videos_session ON videos(device_id, session_id, segment_index);
+
+-- 15. Resumable device uploads (chunks live in the private upload-chunks bucket until complete)
+CREATE TABLE IF NOT EXISTS upload_sessions (
+  id UUID DEFAULT uuid_generate_v4() PRIMARY KEY,
+  device_id TEXT NOT NULL,
+  user_id UUID REFERENCES auth.users(id) ON DELETE CASCADE,
+  filename TEXT NOT NULL,
+  content_type TEXT NOT NULL,
+  size BIGINT NOT NULL,
+  sha256 TEXT NOT NULL,
+  received BIGINT NOT NULL DEFAULT 0,
+  fields JSONB DEFAULT '{}'::jsonb,
+  url TEXT,
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+ALTER TABLE upload_sessions ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Service role can manage upload sessions" ON upload_sessions
+FOR ALL TO service_role
+USING (true);
+
+INSERT INTO storage.buckets (id, name, public)
+VALUES ('upload-chunks', 'upload-chunks', false)
+ON CONFLICT (id) DO NOTHING;
+
+-- 16. SOS incident tracing: every clip carries the device-side incident ID of its trigger
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS incident_id TEXT;
+CREATE INDEX IF NOT EXISTS idx_videos_incident ON videos(incident_id);
+
+-- 17. Device-rendered thumbnails, matched to their clip by the file name it had on the device
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS source_name TEXT;
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS poster_url TEXT;
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS sprite_url TEXT;
+CREATE INDEX IF NOT EXISTS idx_videos_source ON videos(device_id, source_name);
+
+-- 18. Bulk imports: SHA-256 of the stored bytes, so re-imports and duplicate sources are skipped
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS content_hash TEXT;
+CREATE INDEX IF NOT EXISTS idx_videos_content_hash ON videos(content_hash);
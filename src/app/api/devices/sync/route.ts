@@ -1,11 +1,12 @@
 import { NextResponse } from 'next/server';
 import { createClient } from '@/utils/supabase/server';
+import { readJson } from '@/lib/request-body';
 
 export const runtime = 'nodejs';
 
 export async function POST(req: Request) {
   try {
-    const body = await req.json();
+    const body = await readJson(req);
     const { user_id, device_id, name, type = 'rpi', is_online = true, location, ip_address, port } = body;
 
     if (!user_id || !device_id) {
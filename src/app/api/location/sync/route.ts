@@ -1,14 +1,20 @@
 import { NextResponse } from 'next/server';
 import { createClient } from '@/utils/supabase/server';
+import { readJson } from '@/lib/request-body';
 
 export const runtime = 'nodejs';
 
 export async function POST(req: Request) {
   try {
-    const body = await req.json();
-    const { user_id, device_id, latitude, longitude, timestamp, method = 'ip' } = body;
+    const body = await readJson(req);
+    const { user_id, device_id } = body;
 
-    if (!user_id || !device_id || latitude === undefined || longitude === undefined || !timestamp) {
+    // Devices send buffered points in bulk as `points`; a single point at the top level is still accepted
+    const points: any[] = Array.isArray(body.points) ? body.points : [body];
+
+    if (!user_id || !device_id || points.length === 0 || points.some(
+      (p) => p.latitude === undefined || p.longitude === undefined || !p.timestamp
+    )) {
       return NextResponse.json({ error: 'Missing required fields' }, { status: 400 });
     }
 
@@ -16,20 +22,20 @@ export async function POST(req: Request) {
 
     const { error } = await supabase
       .from('locations')
-      .insert({
+      .insert(points.map(({ latitude, longitude, timestamp, method = 'ip' }) => ({
         user_id,
         device_id,
         latitude,
         longitude,
         timestamp,
         method
-      });
+      })));
 
     if (error) throw error;
 
-    return NextResponse.json({ success: true });
+    return NextResponse.json({ success: true, count: points.length });
   } catch (e: any) {
     console.error('Location sync failed', e);
     return NextResponse.json({ error: e?.message || 'Sync failed' }, { status: 500 });
   }
-}
\ No newline at end of file
+}
@@ -1,8 +1,5 @@
 import { NextResponse } from 'next/server';
-import { createClient } from '@/utils/supabase/server';
-import { put } from '@vercel/blob';
-import ffmpeg from 'fluent-ffmpeg';
-import { PassThrough } from 'stream';
+import { ingestRecording, storeManifest, storeThumbnail } from '@/lib/ingest';
 
 export const runtime = 'nodejs';
 
@@ -14,53 +11,37 @@ export async function POST(req: Request) {
       return NextResponse.json({ error: 'No file' }, { status: 400 });
     }
 
+    const deviceId = form.get('device_id') as string || 'rpi';
+    const sessionId = form.get('session_id') as string | null;
+    const segmentIndex = form.get('segment_index') as string | null;
+    const incidentId = form.get('incident_id') as string | null;
+    const thumbnailFor = form.get('thumbnail_for') as string | null;
+    const codec = form.get('codec') as string | null;
+    const faststart = form.get('faststart') as string | null;
+
+    // Segmented recordings finish with a JSON manifest listing their segments
+    if (sessionId && file.type === 'application/json') {
+      const url = await storeManifest(deviceId, sessionId, await file.text());
+      return NextResponse.json({ success: true, url });
+    }
+
+    // Poster frames and sprite strips follow their clip once it has been ingested
+    if (thumbnailFor && file.type === 'image/jpeg') {
+      const kind = form.get('thumbnail_kind') === 'sprite' ? 'sprite' : 'poster';
+      const url = await storeThumbnail(deviceId, thumbnailFor, kind, Buffer.from(await file.arrayBuffer()));
+      return NextResponse.json({ success: true, url });
+    }
+
     if (!file.type.startsWith('video/')) {
       return NextResponse.json({ error: 'File must be a video' }, { status: 400 });
     }
 
-    // Convert to MP4
-    const buffer = await file.arrayBuffer();
-    const inputStream = new PassThrough();
-    inputStream.end(Buffer.from(buffer));
-
-    const outputBuffer = await new Promise<Buffer>((resolve, reject) => {
-      const chunks: Buffer[] = [];
-      ffmpeg(inputStream)
-        .inputFormat(file.type.split('/')[1]) // e.g., 'webm'
-        .toFormat('mp4')
-        .videoCodec('libx264')
-        .audioCodec('aac')
-        .on('error', (err) => reject(err))
-        .pipe(new PassThrough())
-        .on('data', (chunk) => chunks.push(chunk))
-        .on('end', () => resolve(Buffer.concat(chunks)));
+    const buffer = Buffer.from(await file.arrayBuffer());
+    const url = await ingestRecording(buffer, file.type, {
+      deviceId, sessionId, segmentIndex, incidentId, sourceName: file.name || null, codec, faststart
     });
 
-    const deviceId = form.get('device_id') as string || 'rpi';
-    const filename = `recording-${Date.now()}.mp4`;
-
-    // Upload to Vercel Blob
-    const blob = await put(
-      `videos/${deviceId}/${filename}`,
-      outputBuffer,
-      { access: 'public' }
-    );
-
-    // Store metadata in Supabase
-    const supabase = createClient();
-    const { error } = await supabase
-      .from('videos')
-      .insert({
-        filename,
-        url: blob.url,
-        timestamp: Date.now(),
-        size: outputBuffer.length,
-        device_id: deviceId
-      });
-
-    if (error) throw error;
-
-    return NextResponse.json({ success: true, url: blob.url });
+    return NextResponse.json({ success: true, url });
   } catch (e: any) {
     console.error('Upload failed', e);
     return NextResponse.json({ error: e?.message || 'Upload failed' }, { status: 500 });
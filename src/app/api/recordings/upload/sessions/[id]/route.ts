@@ -0,0 +1,160 @@
+import { NextResponse } from 'next/server';
+import { createHash } from 'crypto';
+import { createClient } from '@/utils/supabase/server';
+import { ingestRecording, storeManifest, storeThumbnail } from '@/lib/ingest';
+
+export const runtime = 'nodejs';
+
+const CHUNK_BUCKET = 'upload-chunks';
+
+type Params = { params: Promise<{ id: string }> };
+
+// "bytes 0-262143/1048576" -> start 0; "bytes */1048576" -> start null (finalize only)
+function parseContentRange(header: string | null) {
+  const match = header?.match(/^bytes (?:(\d+)-(\d+)|\*)\/(\d+)$/);
+  if (!match) return null;
+  return { start: match[1] !== undefined ? Number(match[1]) : null, total: Number(match[3]) };
+}
+
+export async function GET(_req: Request, { params }: Params) {
+  try {
+    const { id } = await params;
+    const supabase = createClient();
+    const { data, error } = await supabase
+      .from('upload_sessions')
+      .select('size, received, url')
+      .eq('id', id)
+      .maybeSingle();
+
+    if (error) throw error;
+    if (!data) {
+      return NextResponse.json({ error: 'Unknown upload' }, { status: 404 });
+    }
+
+    return NextResponse.json({ offset: data.received, size: data.size, url: data.url });
+  } catch (e: any) {
+    console.error('Upload status failed', e);
+    return NextResponse.json({ error: e?.message || 'Upload status failed' }, { status: 500 });
+  }
+}
+
+export async function PUT(req: Request, { params }: Params) {
+  try {
+    const { id } = await params;
+    const range = parseContentRange(req.headers.get('content-range'));
+    if (!range) {
+      return NextResponse.json({ error: 'Bad Content-Range' }, { status: 400 });
+    }
+    const chunk = Buffer.from(await req.arrayBuffer());
+
+    const supabase = createClient();
+    const { data: session, error } = await supabase
+      .from('upload_sessions')
+      .select('*')
+      .eq('id', id)
+      .maybeSingle();
+
+    if (error) throw error;
+    if (!session) {
+      return NextResponse.json({ error: 'Unknown upload' }, { status: 404 });
+    }
+    if (session.url) {
+      return NextResponse.json({ offset: session.size, url: session.url });
+    }
+
+    const start = range.start ?? session.size;
+    if (start !== session.received || range.total !== session.size || start + chunk.length > session.size) {
+      return NextResponse.json({ offset: session.received }, { status: 409 });
+    }
+
+    if (chunk.length) {
+      const digest = createHash('sha256').update(chunk).digest('hex');
+      if (digest !== req.headers.get('x-chunk-sha256')) {
+        return NextResponse.json({ error: 'Chunk checksum mismatch', offset: session.received }, { status: 422 });
+      }
+
+      const { error: uploadError } = await supabase.storage
+        .from(CHUNK_BUCKET)
+        .upload(`${id}/${String(start).padStart(12, '0')}`, chunk, {
+          contentType: 'application/octet-stream',
+          upsert: true
+        });
+      if (uploadError) throw uploadError;
+
+      // Only advance if no concurrent request moved the offset in the meantime
+      const { data: updated, error: updateError } = await supabase
+        .from('upload_sessions')
+        .update({ received: start + chunk.length })
+        .eq('id', id)
+        .eq('received', start)
+        .select('received');
+      if (updateError) throw updateError;
+      if (!updated?.length) {
+        return NextResponse.json({ offset: session.received }, { status: 409 });
+      }
+    }
+
+    const received = start + chunk.length;
+    if (received < session.size) {
+      return NextResponse.json({ offset: received });
+    }
+
+    const url = await finalize(session);
+    return NextResponse.json({ offset: received, url });
+  } catch (e: any) {
+    console.error('Chunk upload failed', e);
+    return NextResponse.json({ error: e?.message || 'Chunk upload failed' }, { status: 500 });
+  }
+}
+
+// Reassemble the chunks, verify the whole-file checksum and hand off to the normal ingest path
+async function finalize(session: any): Promise<string> {
+  const supabase = createClient();
+  const bucket = supabase.storage.from(CHUNK_BUCKET);
+
+  const { data: objects, error } = await bucket.list(session.id, {
+    limit: 10000,
+    sortBy: { column: 'name', order: 'asc' }
+  });
+  if (error) throw error;
+  const paths = (objects || []).map((o) => `${session.id}/${o.name}`);
+
+  const parts: Buffer[] = [];
+  for (const path of paths) {
+    const { data, error: downloadError } = await bucket.download(path);
+    if (downloadError) throw downloadError;
+    parts.push(Buffer.from(await data.arrayBuffer()));
+  }
+  const file = Buffer.concat(parts);
+
+  if (createHash('sha256').update(file).digest('hex') !== session.sha256) {
+    // Start over rather than ingest a corrupt file
+    await bucket.remove(paths);
+    await supabase.from('upload_sessions').update({ received: 0 }).eq('id', session.id);
+    throw new Error('File checksum mismatch');
+  }
+
+  // Ingest is idempotent, so a finalize repeated after a lost reply gets the stored URL back
+  const fields = session.fields || {};
+  const url = fields.session_id && session.content_type === 'application/json'
+    ? await storeManifest(session.device_id, fields.session_id, file.toString('utf8'))
+    : fields.thumbnail_for && session.content_type === 'image/jpeg'
+    ? await storeThumbnail(session.device_id, fields.thumbnail_for,
+        fields.thumbnail_kind === 'sprite' ? 'sprite' : 'poster', file)
+    : await ingestRecording(file, session.content_type, {
+        deviceId: session.device_id,
+        sessionId: fields.session_id ?? null,
+        segmentIndex: fields.segment_index != null ? String(fields.segment_index) : null,
+        incidentId: fields.incident_id ?? null,
+        sourceName: session.filename,
+        codec: fields.codec ?? null,
+        faststart: fields.faststart ?? null
+      });
+
+  // Once the URL is recorded, PUT answers from it without finalizing again; keep the chunks until then
+  const { error: urlError } = await supabase.from('upload_sessions').update({ url }).eq('id', session.id);
+  if (urlError) throw urlError;
+  await bucket.remove(paths);
+
+  return url;
+}
@@ -0,0 +1,40 @@
+import { NextResponse } from 'next/server';
+import { createClient } from '@/utils/supabase/server';
+
+export const runtime = 'nodejs';
+
+// Start a resumable upload; chunks are then PUT to /api/recordings/upload/sessions/<upload_id>
+export async function POST(req: Request) {
+  try {
+    const body = await req.json();
+    const { filename, size, sha256, content_type, device_id, user_id, fields = {} } = body;
+
+    if (!filename || !size || !sha256 || !content_type || !device_id) {
+      return NextResponse.json({ error: 'Missing required fields' }, { status: 400 });
+    }
+
+    const supabase = createClient();
+
+    const { data, error } = await supabase
+      .from('upload_sessions')
+      .insert({
+        filename,
+        size,
+        sha256,
+        content_type,
+        device_id,
+        user_id: user_id || null,
+        fields,
+        received: 0
+      })
+      .select('id')
+      .single();
+
+    if (error) throw error;
+
+    return NextResponse.json({ upload_id: data.id, offset: 0 });
+  } catch (e: any) {
+    console.error('Upload session failed', e);
+    return NextResponse.json({ error: e?.message || 'Upload session failed' }, { status: 500 });
+  }
+}
@@ -18,13 +18,20 @@ type Video = {
   isLocal?: boolean;
   id?: string;
   url?: string;
+  poster?: string;
 };
 
-function VideoThumbnail({ filename, isLocal, blob, url }: { filename: string; isLocal?: boolean; blob?: Blob; url?: string }) {
+function VideoThumbnail({ filename, isLocal, blob, url, poster }: { filename: string; isLocal?: boolean; blob?: Blob; url?: string; poster?: string }) {
   const [src, setSrc] = useState<string | null>(null);
 
   useEffect(() => {
     const loadVideo = async () => {
+      // The device renders poster frames, so there is no need to fetch the clip itself
+      if (poster) {
+        setSrc(poster);
+        return;
+      }
+
       let videoUrl: string;
       if (isLocal && blob) {
         videoUrl = URL.createObjectURL(blob);
@@ -56,7 +63,7 @@ function VideoThumbnail({ filename, isLocal, blob, url }: { filename: string; is
     };
 
     loadVideo();
-  }, [filename, isLocal, blob, url]);
+  }, [filename, isLocal, blob, url, poster]);
 
   if (!src) return <div className="w-30 h-20 bg-muted rounded" />;
   return <img src={src} className="w-30 h-20 object-cover rounded" alt="thumbnail" />;
@@ -132,6 +139,7 @@ export default function VideosPage() {
           timestamp: v.timestamp,
           isLocal: false,
           url: v.url,
+          poster: v.poster_url ?? undefined,
           id: v.id
         })));
       }
@@ -329,7 +337,7 @@ export default function VideosPage() {
             <div className={`grid gap-4 ${isMobile ? 'grid-cols-1' : 'grid-cols-2 lg:grid-cols-3'}`}>
               {videos.map((v) => (
                 <div key={v.filename} className="p-4 border rounded-md bg-card">
-                  <VideoThumbnail filename={v.filename} isLocal={v.isLocal} url={v.url} />
+                  <VideoThumbnail filename={v.filename} isLocal={v.isLocal} url={v.url} poster={v.poster} />
                   <div className="mt-2">
                     <div className="font-medium">{v.filename} {v.isLocal && <span className="text-xs text-muted">(Local)</span>}</div>
                     <div className="text-sm text-muted-foreground">
@@ -0,0 +1,76 @@
+// @vitest-environment node
+import { describe, it, expect, vi } from 'vitest';
+
+vi.mock('@/utils/supabase/server', () => ({ createClient: vi.fn() }));
+vi.mock('@vercel/blob', () => ({ put: vi.fn() }));
+
+import { createClient } from '@/utils/supabase/server';
+import { put } from '@vercel/blob';
+import { ingestMode, ingestRecording, mp4TopLevelBoxes } from '@/lib/ingest';
+
+function box(kind: string, payload = 8): Buffer {
+  const buf = Buffer.alloc(8 + payload);
+  buf.writeUInt32BE(8 + payload, 0);
+  buf.write(kind, 4, 'latin1');
+  return buf;
+}
+
+const faststart = Buffer.concat([box('ftyp'), box('moov', 32), box('mdat', 64)]);
+const moovLast = Buffer.concat([box('ftyp'), box('mdat', 64), box('moov', 32)]);
+const meta = { deviceId: 'raspi', codec: 'avc1.640028', faststart: 'true' };
+
+describe('mp4TopLevelBoxes', () => {
+  it('lists the top-level boxes in file order', () => {
+    expect(mp4TopLevelBoxes(moovLast)).toEqual(['ftyp', 'mdat', 'moov']);
+  });
+});
+
+describe('ingestMode', () => {
+  it('stores faststart H.264 MP4s as uploaded', () => {
+    expect(ingestMode(faststart, 'video/mp4', meta)).toBe('store');
+  });
+
+  it('remuxes when the index is at the end, whatever the device declared', () => {
+    expect(ingestMode(moovLast, 'video/mp4', meta)).toBe('remux');
+    expect(ingestMode(faststart, 'video/mp4', { ...meta, faststart: 'false' })).toBe('remux');
+  });
+
+  it('transcodes undeclared, unplayable or non-MP4 uploads', () => {
+    expect(ingestMode(faststart, 'video/mp4', { deviceId: 'raspi' })).toBe('transcode');
+    expect(ingestMode(faststart, 'video/mp4', { ...meta, codec: 'hvc1.1.6.L93.B0' })).toBe('transcode');
+    expect(ingestMode(faststart, 'video/webm', meta)).toBe('transcode');
+  });
+});
+
+// Chainable stand-in for the Supabase query builder; maybeSingle() resolves to the given row
+function supabaseWith(row: { url: string } | null) {
+  const query: any = {};
+  for (const method of ['select', 'eq', 'limit']) query[method] = vi.fn(() => query);
+  query.maybeSingle = vi.fn(async () => ({ data: row, error: null }));
+  query.insert = vi.fn(async () => ({ error: null }));
+  return { from: vi.fn(() => query), query };
+}
+
+describe('ingestRecording', () => {
+  const segment = { ...meta, sessionId: 'video_20250101_120000', segmentIndex: '2' };
+
+  it('returns the stored segment on a retry instead of writing it again', async () => {
+    const supabase = supabaseWith({ url: 'https://blob/segment-002.mp4' });
+    vi.mocked(createClient).mockReturnValue(supabase as any);
+    vi.mocked(put).mockClear();
+
+    await expect(ingestRecording(faststart, 'video/mp4', segment)).resolves.toBe('https://blob/segment-002.mp4');
+    expect(put).not.toHaveBeenCalled();
+    expect(supabase.query.insert).not.toHaveBeenCalled();
+  });
+
+  it('overwrites a segment blob whose row never landed', async () => {
+    const supabase = supabaseWith(null);
+    vi.mocked(createClient).mockReturnValue(supabase as any);
+    vi.mocked(put).mockResolvedValue({ url: 'https://blob/new.mp4' } as any);
+
+    await expect(ingestRecording(faststart, 'video/mp4', segment)).resolves.toBe('https://blob/new.mp4');
+    expect(put).toHaveBeenCalledWith('videos/raspi/video_20250101_120000/segment-002.mp4', faststart,
+      expect.objectContaining({ allowOverwrite: true }));
+  });
+});
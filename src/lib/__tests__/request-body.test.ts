@@ -0,0 +1,22 @@
+// @vitest-environment node
+import { describe, it, expect } from 'vitest';
+import { gzipSync } from 'zlib';
+import { readJson } from '@/lib/request-body';
+
+const payload = { device_id: 'raspi', latitude: 37.7, longitude: -121.4 };
+
+describe('readJson', () => {
+  it('parses a plain JSON body', async () => {
+    const req = new Request('http://localhost/api', { method: 'POST', body: JSON.stringify(payload) });
+    expect(await readJson(req)).toEqual(payload);
+  });
+
+  it('parses a gzip-encoded JSON body', async () => {
+    const req = new Request('http://localhost/api', {
+      method: 'POST',
+      headers: { 'Content-Encoding': 'gzip' },
+      body: gzipSync(JSON.stringify(payload))
+    });
+    expect(await readJson(req)).toEqual(payload);
+  });
+});
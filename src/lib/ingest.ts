@@ -0,0 +1,207 @@
+// Server-side ingest shared by the single-shot and resumable upload routes
+
+import { createClient } from '@/utils/supabase/server';
+import { put } from '@vercel/blob';
+import ffmpeg from 'fluent-ffmpeg';
+import { PassThrough } from 'stream';
+import { promises as fs } from 'fs';
+import os from 'os';
+import path from 'path';
+
+export type RecordingMeta = {
+  deviceId: string;
+  sessionId?: string | null;
+  segmentIndex?: string | null;
+  incidentId?: string | null;
+  sourceName?: string | null;
+  codec?: string | null;      // declared by the device, e.g. avc1.640028
+  faststart?: string | null;  // 'true' when the device says moov precedes mdat
+};
+
+export type IngestMode = 'store' | 'remux' | 'transcode';
+
+// H.264 baseline (42), main (4D) and high (64) play in every browser we support
+const PLAYABLE_CODEC = /^avc1\.(42|4D|64)[0-9A-F]{4}$/i;
+
+// Top-level MP4 box types in file order, read from the headers only
+export function mp4TopLevelBoxes(buf: Buffer): string[] {
+  const kinds: string[] = [];
+  let pos = 0;
+  while (pos + 8 <= buf.length) {
+    let size = buf.readUInt32BE(pos);
+    const kind = buf.toString('latin1', pos + 4, pos + 8);
+    if (size === 1) {
+      if (pos + 16 > buf.length) break;
+      size = Number(buf.readBigUInt64BE(pos + 8));
+    } else if (size === 0) {
+      size = buf.length - pos;
+    }
+    if (size < 8) break;
+    kinds.push(kind);
+    pos += size;
+  }
+  return kinds;
+}
+
+// Store device MP4s that are already playable; fix the layout if needed; transcode everything else
+export function ingestMode(input: Buffer, type: string, meta: RecordingMeta): IngestMode {
+  if (type !== 'video/mp4' || !meta.codec || !PLAYABLE_CODEC.test(meta.codec)) return 'transcode';
+  const boxes = mp4TopLevelBoxes(input);
+  if (boxes[0] !== 'ftyp') return 'transcode';
+  const moov = boxes.indexOf('moov');
+  const mdat = boxes.indexOf('mdat');
+  if (moov === -1 || mdat === -1) return 'transcode';
+  // Don't take the device's word for the layout; it only costs a header scan to check
+  return meta.faststart === 'true' && moov < mdat ? 'store' : 'remux';
+}
+
+// Stream-copy into a faststart MP4 (needs seekable output, so it goes through temp files)
+export async function remuxFaststart(input: Buffer): Promise<Buffer> {
+  const dir = await fs.mkdtemp(path.join(os.tmpdir(), 'remux-'));
+  const src = path.join(dir, 'in.mp4');
+  const dst = path.join(dir, 'out.mp4');
+  try {
+    await fs.writeFile(src, input);
+    await new Promise<void>((resolve, reject) => {
+      ffmpeg(src)
+        .outputOptions(['-c', 'copy', '-movflags', '+faststart'])
+        .on('error', (err) => reject(err))
+        .on('end', () => resolve())
+        .save(dst);
+    });
+    return await fs.readFile(dst);
+  } finally {
+    await fs.rm(dir, { recursive: true, force: true });
+  }
+}
+
+export function transcodeToMp4(input: Buffer, type: string): Promise<Buffer> {
+  const inputStream = new PassThrough();
+  inputStream.end(input);
+
+  return new Promise<Buffer>((resolve, reject) => {
+    const chunks: Buffer[] = [];
+    ffmpeg(inputStream)
+      .inputFormat(type.split('/')[1]) // e.g., 'webm'
+      .toFormat('mp4')
+      .videoCodec('libx264')
+      .audioCodec('aac')
+      .on('error', (err) => reject(err))
+      .pipe(new PassThrough())
+      .on('data', (chunk) => chunks.push(chunk))
+      .on('end', () => resolve(Buffer.concat(chunks)));
+  });
+}
+
+// A segment that is already indexed (a retry after a lost response); returns its URL or null
+async function existingSegmentUrl(deviceId: string, sessionId: string, segmentIndex: string): Promise<string | null> {
+  const supabase = createClient();
+  const { data, error } = await supabase
+    .from('videos')
+    .select('url')
+    .eq('device_id', deviceId)
+    .eq('session_id', sessionId)
+    .eq('segment_index', Number(segmentIndex))
+    .limit(1)
+    .maybeSingle();
+
+  if (error) throw error;
+  return data?.url ?? null;
+}
+
+// Convert, store and index one recording (or one segment of a session); returns its URL.
+// Segments are idempotent: a retry returns the stored segment, or overwrites a blob whose row never landed.
+export async function ingestRecording(input: Buffer, type: string, meta: RecordingMeta): Promise<string> {
+  if (meta.sessionId && meta.segmentIndex != null) {
+    const url = await existingSegmentUrl(meta.deviceId, meta.sessionId, meta.segmentIndex);
+    if (url) return url;
+  }
+
+  const mode = ingestMode(input, type, meta);
+  const outputBuffer = mode === 'store'
+    ? input
+    : mode === 'remux'
+    ? await remuxFaststart(input)
+    : await transcodeToMp4(input, type);
+
+  const { deviceId, sessionId, segmentIndex, incidentId, sourceName } = meta;
+  const segmented = Boolean(sessionId && segmentIndex != null);
+  const filename = segmented
+    ? `${sessionId}/segment-${segmentIndex!.padStart(3, '0')}.mp4`
+    : `recording-${Date.now()}.mp4`;
+
+  // Upload to Vercel Blob; a segment's pathname is fixed, so a retry may replace an orphaned blob
+  const blob = await put(
+    `videos/${deviceId}/${filename}`,
+    outputBuffer,
+    { access: 'public', allowOverwrite: segmented }
+  );
+
+  // Store metadata in Supabase
+  const supabase = createClient();
+  const { error } = await supabase
+    .from('videos')
+    .insert({
+      filename,
+      url: blob.url,
+      timestamp: Date.now(),
+      size: outputBuffer.length,
+      device_id: deviceId,
+      ...(sessionId ? { session_id: sessionId, segment_index: Number(segmentIndex) } : {}),
+      ...(incidentId ? { incident_id: incidentId } : {}),
+      ...(sourceName ? { source_name: sourceName } : {})
+    });
+
+  if (error) throw error;
+
+  return blob.url;
+}
+
+// Segmented recordings finish with a JSON manifest; store it with each segment's URL filled in
+export async function storeManifest(deviceId: string, sessionId: string, body: string): Promise<string> {
+  const manifest = JSON.parse(body);
+
+  const supabase = createClient();
+  const { data: rows, error } = await supabase
+    .from('videos')
+    .select('segment_index, url')
+    .eq('device_id', deviceId)
+    .eq('session_id', sessionId)
+    .order('segment_index', { ascending: true });
+
+  if (error) throw error;
+
+  const urls = new Map((rows || []).map((r: any) => [r.segment_index, r.url]));
+  manifest.segments = (manifest.segments || []).map((seg: any) => ({
+    ...seg,
+    url: urls.get(seg.index) ?? null
+  }));
+
+  const blob = await put(
+    `videos/${deviceId}/${sessionId}/manifest.json`,
+    JSON.stringify(manifest),
+    { access: 'public', contentType: 'application/json', allowOverwrite: true }
+  );
+
+  return blob.url;
+}
+
+// Device-rendered poster frame or sprite strip for a clip, matched to its row by the device-side file name
+export async function storeThumbnail(deviceId: string, sourceName: string, kind: 'poster' | 'sprite', image: Buffer): Promise<string> {
+  const blob = await put(
+    `videos/${deviceId}/thumbs/${sourceName}.${kind}.jpg`,
+    image,
+    { access: 'public', contentType: 'image/jpeg', allowOverwrite: true }
+  );
+
+  const supabase = createClient();
+  const { error } = await supabase
+    .from('videos')
+    .update({ [`${kind}_url`]: blob.url })
+    .eq('device_id', deviceId)
+    .eq('source_name', sourceName);
+
+  if (error) throw error;
+
+  return blob.url;
+}
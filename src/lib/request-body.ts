@@ -0,0 +1,8 @@
+import { gunzipSync } from 'zlib';
+
+// Parse a JSON request body, accepting gzip-compressed bodies sent by devices
+export async function readJson(req: Request): Promise<any> {
+  const raw = Buffer.from(await req.arrayBuffer());
+  const body = req.headers.get('content-encoding') === 'gzip' ? gunzipSync(raw) : raw;
+  return JSON.parse(body.toString('utf8'));
+}